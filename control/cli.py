@@ -277,7 +277,7 @@ class GatewayClient:
             errmsg = "Can't get CLI version"
         else:
             rc = 0
-            errmsg = os.strerror(0)
+            errmsg = GatewayUtils.STRERROR_OK
         if args.format == "text" or args.format == "plain":
             if not ver:
                 err_func(errmsg)
@@ -10,17 +10,21 @@
 import socket
 import grpc
 import json
+import re
 import uuid
-import random
+import secrets
 import os
 import errno
 import contextlib
 import threading
+import queue
+import heapq
 import time
 import hashlib
 import tempfile
 from pathlib import Path
 from typing import Callable
+from concurrent.futures import Future
 from collections import defaultdict
 import logging
 import shutil
@@ -29,7 +33,7 @@ import spdk.rpc.bdev as rpc_bdev
 import spdk.rpc.nvmf as rpc_nvmf
 import spdk.rpc.keyring as rpc_keyring
 import spdk.rpc.log as rpc_log
-from spdk.rpc.client import JSONRPCException
+from spdk.rpc.client import JSONRPCClient, JSONRPCException
 
 from google.protobuf import json_format
 from google.protobuf.empty_pb2 import Empty
@@ -41,12 +45,175 @@ from .config import GatewayConfig
 from .utils import GatewayEnumUtils
 from .utils import GatewayUtils
 from .utils import GatewayLogger
-from .state import GatewayState, GatewayStateHandler, OmapLock
+from .state import GatewayState, GatewayStateHandler, OmapLock, json_loads, json_dumps
 from .cephutils import CephUtils
 
 # Assuming max of 32 gateways and protocol min 1 max 65519
 CNTLID_RANGE_SIZE = 2040
 DEFAULT_MODEL_NUMBER = "Ceph bdev Controller"
+# Namespace description used in messages, indexed by (NSID was given, UUID was given)
+NSID_MSGS = {
+    (True, True): "namespace with NSID {nsid} and UUID {uuid}",
+    (True, False): "namespace with NSID {nsid}",
+    (False, True): "namespace with UUID {uuid}",
+    (False, False): "all namespaces",
+}
+
+# Error object in the message of JSON-RPC exceptions
+JSON_ERROR_RESPONSE_RE = re.compile(r"Got JSON-RPC error response.*?response:(.*)", re.DOTALL)
+
+# Gateway and CLI versions, as major.minor.patch
+VERSION_RE = re.compile(r"(\d+)\.(\d+)\.(\d+)")
+
+# Error message of successful requests
+STRERROR_OK = GatewayUtils.STRERROR_OK
+
+# QOS limit fields in requests, with their description
+QOS_LIMITS = {
+    "rw_ios_per_second": "R/W IOs per second",
+    "rw_mbytes_per_second": "R/W megabytes per second",
+    "r_mbytes_per_second": "Read megabytes per second",
+    "w_mbytes_per_second": "Write megabytes per second",
+}
+
+# Address family names, as used by SPDK, by pb2.AddressFamily value
+ADRFAM_VALUE_TO_NAME = {v.number: v.name for v in pb2.AddressFamily.DESCRIPTOR.values}
+
+# bdev_get_iostat() counters, named the same in namespace_io_stats_info
+IOSTAT_KEYS = (
+    "bytes_read", "num_read_ops", "bytes_written", "num_write_ops", "bytes_unmapped", "num_unmap_ops",
+    "read_latency_ticks", "max_read_latency_ticks", "min_read_latency_ticks",
+    "write_latency_ticks", "max_write_latency_ticks", "min_write_latency_ticks",
+    "unmap_latency_ticks", "max_unmap_latency_ticks", "min_unmap_latency_ticks",
+    "copy_latency_ticks", "max_copy_latency_ticks", "min_copy_latency_ticks",
+)
+
+class SpdkJsonRpcError(JSONRPCException):
+    """A JSON-RPC error response from SPDK, carrying the error code and message as returned."""
+
+    def __init__(self, message, code, spdk_message):
+        super().__init__(message)
+        self.code = code
+        self.spdk_message = spdk_message
+
+class SpdkRpcClient(JSONRPCClient):
+    """SPDK JSON-RPC client raising SpdkJsonRpcError on error responses.
+
+    This saves parsing the error code and message back out of the exception text.
+    It also counts the calls which might modify SPDK's state, so cached query results
+    can tell whether they are still valid. The count is bumped both when such a call is
+    sent and when its response is read, so a result fetched while the call was in flight,
+    on another connection, is not valid either.
+    """
+
+    modify_count = 0
+
+    def __init__(self, addr, port=None, timeout=None, **kwargs):
+        # Kept to connect again after a batch whose responses weren't all read
+        self.addr = addr
+        self.port = port
+        super().__init__(addr, port, timeout, **kwargs)
+
+    def reconnect(self):
+        """Drops the connection, along with any responses still unread on it, and connects again."""
+        self.close()
+        self._recv_buf = ""
+        self._connect(self.addr, self.port)
+
+    # SPDK methods known not to change SPDK's state. Any other method, including ones added
+    # later, counts as a modification, so a missing entry only costs a cache refresh.
+    QUERY_METHODS = frozenset([
+        "bdev_get_bdevs", "bdev_get_iostat", "keyring_get_keys", "log_get_flags", "log_get_level",
+        "log_get_print_level", "nvmf_get_subsystems", "nvmf_subsystem_get_controllers",
+        "nvmf_subsystem_get_listeners", "nvmf_subsystem_get_qpairs", "spdk_get_version",
+    ])
+
+    @staticmethod
+    def is_query_method(method):
+        return method in SpdkRpcClient.QUERY_METHODS
+
+    def call(self, method, params=None):
+        self._logger.debug("call('%s')" % method)
+        is_query = SpdkRpcClient.is_query_method(method)
+        if not is_query:
+            self.modify_count += 1
+        params = {} if params is None else params
+        try:
+            req_id = self.send(method, params)
+            try:
+                response = self.recv()
+            except JSONRPCException as e:
+                # Don't expect a response to kill
+                if not self._sock and method == "spdk_kill_instance":
+                    self._logger.info("Connection terminated but ignoring since method is '%s'" % method)
+                    return {}
+                raise e
+        finally:
+            if not is_query:
+                self.modify_count += 1
+
+        if "error" in response:
+            raise SpdkRpcClient.error_from_response(method, params, req_id, response["error"])
+
+        return response["result"]
+
+    def batch_call(self, calls):
+        """Send several requests to SPDK in one write and return their results, in the same order.
+
+        An error response doesn't fail the whole batch, a SpdkJsonRpcError is returned in place
+        of its result.
+        """
+        req_ids = []
+        modifies = False
+        for method, params in calls:
+            self._logger.debug("batch_call('%s')" % method)
+            if not SpdkRpcClient.is_query_method(method):
+                modifies = True
+                self.modify_count += 1
+            req_ids.append(self.add_request(method, params))
+
+        try:
+            responses = self.read_batch_responses(len(req_ids))
+        finally:
+            if modifies:
+                self.modify_count += 1
+
+        results = []
+        for (method, params), req_id in zip(calls, req_ids):
+            response = responses[req_id]
+            if "error" in response:
+                results.append(SpdkRpcClient.error_from_response(method, dict(params or {}), req_id, response["error"]))
+            else:
+                results.append(response["result"])
+        return results
+
+    def read_batch_responses(self, count):
+        """Flushes the pending requests and reads their count responses, by request id"""
+        self.flush()
+        responses = {}
+        try:
+            while len(responses) < count:
+                response = self.recv()
+                responses[response.get("id")] = response
+        except Exception:
+            # The rest of the responses would be read by the next requests instead of their own
+            self._logger.error("Failed reading the responses of a batch of %d requests, reconnecting", count)
+            try:
+                self.reconnect()
+            except Exception:
+                self._logger.exception("Failed to reconnect")
+            raise
+        return responses
+
+    @staticmethod
+    def error_from_response(method, params, req_id, error):
+        params["method"] = method
+        params["req_id"] = req_id
+        msg = "\n".join(["request:", "%s" % json.dumps(params, indent=2),
+                         "Got JSON-RPC error response",
+                         "response:",
+                         json.dumps(error, indent=2)])
+        return SpdkJsonRpcError(msg, error.get("code"), error.get("message"))
 
 class BdevStatus:
     def __init__(self, status, error_message, bdev_name = ""):
@@ -119,6 +286,8 @@ class SubsystemHostAuth:
         return subsys in self.subsys_allow_any_hosts
 
 class NamespaceInfo:
+    __slots__ = ("nsid", "bdev", "uuid", "no_auto_visible", "anagrpid", "host_list")
+
     def __init__(self, nsid, bdev, uuid, anagrpid, no_auto_visible):
         self.nsid = nsid
         self.bdev = bdev
@@ -156,46 +325,59 @@ class NamespacesLocalList:
 
     def __init__(self):
         self.namespace_list = defaultdict(dict)
+        # nqn -> {uuid: nsid}, to find namespaces by UUID without scanning the subsystem
+        self.namespace_uuid_index = defaultdict(dict)
 
     def remove_namespace(self, nqn, nsid=None):
-        if nqn in self.namespace_list:
-            if nsid:
-                if nsid in self.namespace_list[nqn]:
-                    self.namespace_list[nqn].pop(nsid, None)
-                    if len(self.namespace_list[nqn]) == 0:
-                        self.namespace_list.pop(nqn, None)    # last namespace of subsystem was removed
-            else:
-                self.namespace_list.pop(nqn, None)
+        subsys_namespaces = self.namespace_list.get(nqn)
+        if subsys_namespaces is None:
+            return
+        if nsid:
+            ns = subsys_namespaces.pop(nsid, None)
+            if ns is not None:
+                subsys_uuids = self.namespace_uuid_index.get(nqn)
+                if subsys_uuids and subsys_uuids.get(ns.uuid) == nsid:
+                    subsys_uuids.pop(ns.uuid, None)
+                if not subsys_namespaces:
+                    self.namespace_list.pop(nqn, None)    # last namespace of subsystem was removed
+                    self.namespace_uuid_index.pop(nqn, None)
+        else:
+            self.namespace_list.pop(nqn, None)
+            self.namespace_uuid_index.pop(nqn, None)
 
     def add_namespace(self, nqn, nsid, bdev, uuid, anagrpid, no_auto_visible):
         if not bdev:
             bdev = GatewayService.find_unique_bdev_name(uuid)
+        old_ns = self.namespace_list[nqn].get(nsid)
+        if old_ns is not None and old_ns.uuid != uuid and self.namespace_uuid_index[nqn].get(old_ns.uuid) == nsid:
+            self.namespace_uuid_index[nqn].pop(old_ns.uuid, None)
         self.namespace_list[nqn][nsid] = NamespaceInfo(nsid, bdev, uuid, anagrpid, no_auto_visible)
+        if uuid:
+            self.namespace_uuid_index[nqn][uuid] = nsid
 
     def find_namespace(self, nqn, nsid, uuid = None) -> NamespaceInfo:
-        if nqn not in self.namespace_list:
+        subsys_namespaces = self.namespace_list.get(nqn)
+        if not subsys_namespaces:
             return NamespacesLocalList.EMPTY_NAMESPACE
 
         # if we have nsid, use it as the key
         if nsid:
-            if nsid in self.namespace_list[nqn]:
-                return self.namespace_list[nqn][nsid]
-            return NamespacesLocalList.EMPTY_NAMESPACE
+            return subsys_namespaces.get(nsid, NamespacesLocalList.EMPTY_NAMESPACE)
 
         if uuid:
-            for ns in self.namespace_list[nqn]:
-                if uuid == self.namespace_list[nqn][ns].uuid:
-                    return self.namespace_list[nqn][ns]
+            subsys_uuids = self.namespace_uuid_index.get(nqn)
+            if subsys_uuids and uuid in subsys_uuids:
+                return subsys_namespaces.get(subsys_uuids[uuid], NamespacesLocalList.EMPTY_NAMESPACE)
 
         return NamespacesLocalList.EMPTY_NAMESPACE
 
     def get_namespace_count(self, nqn, no_auto_visible = None, min_hosts = 0) -> int:
-        if nqn not in self.namespace_list:
+        subsys_namespaces = self.namespace_list.get(nqn)
+        if not subsys_namespaces:
             return 0
 
         ns_count = 0
-        for nsid in self.namespace_list[nqn]:
-            ns = self.namespace_list[nqn][nsid]
+        for ns in subsys_namespaces.values():
             if ns.empty():
                 continue
             if no_auto_visible is not None:
@@ -209,11 +391,11 @@ class NamespacesLocalList:
 
     def get_namespaces_using_ana_group_id(self, nqn, anagrpid):
         ns_list = []
-        if nqn not in self.namespace_list:
+        subsys_namespaces = self.namespace_list.get(nqn)
+        if not subsys_namespaces:
             return ns_list
 
-        for nsid in self.namespace_list[nqn]:
-            ns = self.namespace_list[nqn][nsid]
+        for ns in subsys_namespaces.values():
             if ns.empty():
                 continue
             if ns.anagrpid == anagrpid:
@@ -234,17 +416,24 @@ class GatewayService(pb2_grpc.GatewayServicer):
         spdk_rpc_client: Client of SPDK RPC server
         spdk_rpc_subsystems_client: Client of SPDK RPC server for get_subsystems
         spdk_rpc_subsystems_lock: Mutex to hold while using get subsystems SPDK client
-        shared_state_lock: guard mutex for bdev_cluster and cluster_nonce
+        spdk_rpc_stats_pool: Queue of idle clients of SPDK RPC server for IO stats
+        shared_state_lock: guard mutex for bdev_cluster, bdev_nonce and cluster_nonce
         subsystem_nsid_bdev_and_uuid: map of nsid to bdev
         cluster_nonce: cluster context nonce map
+        bdev_nonce: map of bdev to the nonce of its cluster context
     """
 
+    BDEV_PREFIX = "bdev_"
+    # from this number of bdevs on, get all the bdevs from SPDK rather than asking for each one
+    BULK_BDEV_LIST_THRESHOLD = 4
     PSK_PREFIX = "psk"
     DHCHAP_PREFIX = "dhchap"
     DHCHAP_CONTROLLER_PREFIX = "dhchap_ctrlr"
     KEYS_DIR = "/var/tmp"
+    # set once the huge pages counts were checked and logged by this process
+    huge_pages_checked = False
 
-    def __init__(self, config: GatewayConfig, gateway_state: GatewayStateHandler, rpc_lock, omap_lock: OmapLock, group_id: int, spdk_rpc_client, spdk_rpc_subsystems_client, ceph_utils: CephUtils) -> None:
+    def __init__(self, config: GatewayConfig, gateway_state: GatewayStateHandler, rpc_lock, omap_lock: OmapLock, group_id: int, spdk_rpc_client, spdk_rpc_subsystems_client, spdk_rpc_stats_clients, ceph_utils: CephUtils) -> None:
         """Constructor"""
         self.gw_logger_object = GatewayLogger(config)
         self.logger = self.gw_logger_object.logger
@@ -252,44 +441,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
         config.display_environment_info(self.logger)
         self.ceph_utils = ceph_utils
         self.ceph_utils.fetch_and_display_ceph_version()
-        requested_hugepages_val = os.getenv("HUGEPAGES", "")
-        if not requested_hugepages_val:
-            self.logger.warning("Can't get requested huge pages count")
-        else:
-            requested_hugepages_val = requested_hugepages_val.strip()
-            try:
-                requested_hugepages_val = int(requested_hugepages_val)
-                self.logger.info(f"Requested huge pages count is {requested_hugepages_val}")
-            except ValueError:
-                self.logger.warning(f"Requested huge pages count value {requested_hugepages_val} is not numeric")
-                requested_hugepages_val = None
-        hugepages_file = os.getenv("HUGEPAGES_DIR", "")
-        if not hugepages_file:
-            hugepages_file = "/sys/kernel/mm/hugepages/hugepages-2048kB/nr_hugepages"
-            self.logger.warning("No huge pages file defined, will use /sys/kernel/mm/hugepages/hugepages-2048kB/nr_hugepages")
-        else:
-            hugepages_file = hugepages_file.strip()
-        if os.access(hugepages_file, os.F_OK):
-            try:
-                hugepages_val = ""
-                with open(hugepages_file) as f:
-                    hugepages_val = f.readline()
-                hugepages_val = hugepages_val.strip()
-                if hugepages_val:
-                    try:
-                        hugepages_val = int(hugepages_val)
-                        self.logger.info(f"Actual huge pages count is {hugepages_val}")
-                    except ValueError:
-                        self.logger.warning(f"Actual huge pages count value {hugepages_val} is not numeric")
-                        hugepages_val = ""
-                    if requested_hugepages_val and hugepages_val != "" and requested_hugepages_val > hugepages_val:
-                        self.logger.warning(f"The actual huge page count {hugepages_val} is smaller than the requested value of {requested_hugepages_val}")
-                else:
-                    self.logger.warning(f"Can't read actual huge pages count value from {hugepages_file}")
-            except Exception as ex:
-                self.logger.exception(f"Can't read actual huge pages count value from {hugepages_file}")
-        else:
-            self.logger.warning(f"Can't find huge pages file {hugepages_file}")
+        self.check_huge_pages()
         self.config = config
         config.dump_config_file(self.logger)
         self.rpc_lock = rpc_lock
@@ -299,6 +451,9 @@ class GatewayService(pb2_grpc.GatewayServicer):
         self.spdk_rpc_client = spdk_rpc_client
         self.spdk_rpc_subsystems_client = spdk_rpc_subsystems_client
         self.spdk_rpc_subsystems_lock = threading.Lock()
+        self.spdk_rpc_stats_pool = queue.Queue()
+        for stats_client in spdk_rpc_stats_clients:
+            self.spdk_rpc_stats_pool.put(stats_client)
         self.shared_state_lock = threading.Lock()
         self.gateway_name = self.config.get("gateway", "name")
         if not self.gateway_name:
@@ -310,18 +465,52 @@ class GatewayService(pb2_grpc.GatewayServicer):
         else:
             self.host_name = socket.gethostname()
         self.verify_nqns = self.config.getboolean_with_default("gateway", "verify_nqns", True)
+        self.namespace_state_binary_format = self.config.getboolean_with_default("gateway", "namespace_state_binary_format", False)
+        self.subsystem_state_binary_format = self.config.getboolean_with_default("gateway", "subsystem_state_binary_format", False)
+        self.subsystems_cache_max_age = self.config.getint_with_default("gateway", "subsystems_cache_ttl_ms", 250) / 1000.0
         self.gateway_group = self.config.get_with_default("gateway", "group", "")
+        self.gateway_addr = self.config.get_with_default("gateway", "addr", "")
+        self.gateway_port = self.config.get_with_default("gateway", "port", "")
+        self.gateway_version = os.getenv("NVMEOF_VERSION")
+        self.gateway_parsed_version = self.parse_version(self.gateway_version)
+        self.spdk_version = os.getenv("NVMEOF_SPDK_VERSION")
         self.max_hosts_per_namespace = self.config.getint_with_default("gateway", "max_hosts_per_namespace", 1)
         self.max_namespaces_with_netmask = self.config.getint_with_default("gateway", "max_namespaces_with_netmask", 1000)
         self.gateway_pool = self.config.get_with_default("ceph", "pool", "")
         self.ana_map = defaultdict(dict)
         self.cluster_nonce = {}
         self.bdev_cluster = {}
+        self.bdev_nonce = {}
         self.bdev_params  = {}
         self.subsystem_nsid_bdev_and_uuid = NamespacesLocalList()
+        # nqn -> set of (adrfam, traddr, trsvcid, secure)
         self.subsystem_listeners = defaultdict(set)
         self._init_cluster_context()
         self.subsys_max_ns = {}
+        # (nqn, nsid) -> (namespace state value, the namespace_add_req it was serialized from)
+        self.namespace_state_cache = {}
+        # nqn -> (time fetched, SPDK client modify count, nvmf_get_subsystems() result)
+        self.subsystems_cache = {}
+        # nqn -> (JSON of the get_subsystems() entry, pb2.subsystem built from it), guarded by spdk_rpc_subsystems_lock
+        self.subsystem_pb_cache = {}
+        # (time fetched, SPDK client modify count, get_subsystems() result), guarded by spdk_rpc_subsystems_lock
+        self.get_subsystems_cache = None
+        # Names of SPDK's nvmf log flags, they're fixed for the SPDK process
+        self.nvmf_log_flag_names = None
+        # nqn -> count of changes which might affect the subsystem's connections, guarded by connections_changed.
+        # Only successful changes of existing subsystems are counted, and the entry is dropped with the subsystem.
+        self.connections_generation = {}
+        # Number of active watch_connections() streams, guarded by connections_changed
+        self.connection_watchers = 0
+        # (method name, request arguments) -> Future of a list request which is being executed
+        self.inflight_requests = {}
+        self.inflight_requests_lock = threading.Lock()
+        self.connections_changed = threading.Condition()
+        self.watch_connections_interval = self.config.getint_with_default("gateway", "watch_connections_interval", 5)
+        # Each watcher holds a gRPC server worker thread, so both their number and their duration are limited
+        self.max_connection_watchers = self.config.getint_with_default("gateway", "max_connection_watchers", 4)
+        self.watch_connections_timeout = self.config.getint_with_default("gateway", "watch_connections_timeout", 300)
+        self.namespace_add_stream_batch_size = max(self.config.getint_with_default("gateway", "namespace_add_stream_batch_size", 16), 1)
         self.host_info = SubsystemHostAuth()
 
     def get_directories_for_key_file(self, key_type : str, subsysnqn : str, create_dir : bool = False) -> []:
@@ -486,27 +675,27 @@ class GatewayService(pb2_grpc.GatewayServicer):
     @staticmethod
     def is_valid_host_nqn(nqn):
         if nqn == "*":
-            return pb2.req_status(status=0, error_message=os.strerror(0))
+            return pb2.req_status(status=0, error_message=STRERROR_OK)
         rc = GatewayUtils.is_valid_nqn(nqn)
+        if rc[0] == 0:
+            return pb2.req_status(status=0, error_message=STRERROR_OK)
         return pb2.req_status(status=rc[0], error_message=rc[1])
 
-    def parse_json_exeption(self, ex):
-        if type(ex) != JSONRPCException:
+    def parse_json_exception(self, ex):
+        if type(ex) == SpdkJsonRpcError and ex.code is not None:
+            return {"code": abs(ex.code), "message": ex.spdk_message}
+
+        if not isinstance(ex, JSONRPCException):
             return None
 
-        json_error_text = "Got JSON-RPC error response"
         resp = None
         try:
-            resp_index = ex.message.find(json_error_text)
-            if resp_index >= 0:
-                resp_str = ex.message[resp_index + len(json_error_text) :]
-                resp_index = resp_str.find("response:")
-                if resp_index >= 0:
-                    resp_str = resp_str[resp_index + len("response:") :]
-                    resp = json.loads(resp_str)
-        except Exception:
-            self.logger.exception(f"Got exception parsing JSON exception")
-            pass
+            resp_match = JSON_ERROR_RESPONSE_RE.search(ex.message)
+            if resp_match:
+                resp = json_loads(resp_match.group(1))
+        except Exception as parse_ex:
+            # We fall back to the exception's message, no need for a traceback
+            self.logger.error("Got exception parsing JSON exception: %r", parse_ex)
         if resp:
             if resp["code"] < 0:
                 resp["code"] = -resp["code"]
@@ -523,6 +712,15 @@ class GatewayService(pb2_grpc.GatewayServicer):
     def _init_cluster_context(self) -> None:
         """Init cluster context management variables"""
         self.clusters = defaultdict(dict)
+        # anagrp -> cluster names with room for more bdevs, a dict is used as an insertion ordered set
+        self.clusters_with_capacity = defaultdict(dict)
+        # cluster name -> anagrp
+        self.cluster_anagrp = {}
+        # anagrp -> number of bdevs in all of its cluster contexts
+        self.anagrp_bdev_count = defaultdict(int)
+        # anagrp -> next never used cluster name index, and a heap of the indexes of freed cluster contexts
+        self.next_cluster_index = defaultdict(int)
+        self.free_cluster_indexes = defaultdict(list)
         self.bdevs_per_cluster = self.config.getint_with_default("spdk", "bdevs_per_cluster", 32)
         if self.bdevs_per_cluster < 1:
             raise Exception(f"invalid configuration: spdk.bdevs_per_cluster_contexts {self.bdevs_per_cluster} < 1")
@@ -534,61 +732,74 @@ class GatewayService(pb2_grpc.GatewayServicer):
 
     def _get_cluster(self, anagrp: int) -> str:
         """Returns cluster name, enforcing bdev per cluster context"""
-        cluster_name = None
-        for name in self.clusters[anagrp]:
-            if self.clusters[anagrp][name] < self.bdevs_per_cluster:
-                cluster_name = name
-                break
+        with_capacity = self.clusters_with_capacity[anagrp]
+        cluster_name = next(iter(with_capacity), None)
 
         if not cluster_name:
             cluster_name = self._alloc_cluster(anagrp)
             self.clusters[anagrp][cluster_name] = 1
+            with_capacity[cluster_name] = None
         else:
             self.clusters[anagrp][cluster_name] += 1
-        self.logger.info(f"get_cluster {cluster_name=} number bdevs: {self.clusters[anagrp][cluster_name]}")
+        self.anagrp_bdev_count[anagrp] += 1
+        if self.clusters[anagrp][cluster_name] >= self.bdevs_per_cluster:
+            with_capacity.pop(cluster_name, None)
+        self.logger.info("get_cluster cluster_name=%r number bdevs: %s", cluster_name, self.clusters[anagrp][cluster_name])
         return cluster_name
 
     def _put_cluster(self, name: str) -> None:
-        for anagrp in self.clusters:
-            if name in self.clusters[anagrp]:
-                self.clusters[anagrp][name] -= 1
-                assert self.clusters[anagrp][name] >= 0
-                # free the cluster context if no longer used by any bdev
-                if self.clusters[anagrp][name] == 0:
-                    ret = rpc_bdev.bdev_rbd_unregister_cluster(
-                        self.spdk_rpc_client,
-                        name = name
-                    )
-                    self.logger.info(f"Free cluster {name=} {ret=}")
-                    assert ret
-                    self.clusters[anagrp].pop(name)
-                else :
-                   self.logger.info(f"put_cluster {name=} number bdevs: {self.clusters[anagrp][name]}")
-                return
-
-        assert False, f"Cluster {name} is not found"  # we should find the cluster in our state
+        anagrp = self.cluster_anagrp.get(name)
+        # we should find the cluster in our state
+        assert anagrp is not None and name in self.clusters[anagrp], f"Cluster {name} is not found"
+        self.clusters[anagrp][name] -= 1
+        assert self.clusters[anagrp][name] >= 0
+        self.anagrp_bdev_count[anagrp] -= 1
+        # free the cluster context if no longer used by any bdev
+        if self.clusters[anagrp][name] == 0:
+            ret = rpc_bdev.bdev_rbd_unregister_cluster(
+                self.spdk_rpc_client,
+                name = name
+            )
+            self.logger.info("Free cluster name=%r ret=%r", name, ret)
+            assert ret
+            self.clusters[anagrp].pop(name)
+            self.clusters_with_capacity[anagrp].pop(name, None)
+            self.cluster_anagrp.pop(name)
+            heapq.heappush(self.free_cluster_indexes[anagrp], int(name.rsplit("_", 1)[1]))
+        else :
+           self.clusters_with_capacity[anagrp][name] = None
+           self.logger.info("put_cluster name=%r number bdevs: %s", name, self.clusters[anagrp][name])
 
     def _alloc_cluster_name(self, anagrp: int) -> str:
-        """Allocates a new cluster name for ana group"""
-        x = 0
-        while True:
-            name = f"cluster_context_{anagrp}_{x}"
-            if name not in self.clusters[anagrp]:
-                return name
-            x += 1
+        """Allocates a new cluster name for ana group, reusing the lowest index of a freed one first"""
+        free_indexes = self.free_cluster_indexes[anagrp]
+        if free_indexes:
+            x = heapq.heappop(free_indexes)
+        else:
+            x = self.next_cluster_index[anagrp]
+            self.next_cluster_index[anagrp] += 1
+        name = f"cluster_context_{anagrp}_{x}"
+        assert name not in self.clusters[anagrp], f"Cluster {name} is already in use"
+        return name
 
     def _alloc_cluster(self, anagrp: int) -> str:
         """Allocates a new Rados cluster context"""
         name = self._alloc_cluster_name(anagrp)
-        nonce = rpc_bdev.bdev_rbd_register_cluster(
-            self.spdk_rpc_client,
-            name = name,
-            user_id = self.rados_id,
-            core_mask = self.librbd_core_mask,
-        )
+        try:
+            nonce = rpc_bdev.bdev_rbd_register_cluster(
+                self.spdk_rpc_client,
+                name = name,
+                user_id = self.rados_id,
+                core_mask = self.librbd_core_mask,
+            )
+        except Exception:
+            # the name wasn't used, let the next allocation take it
+            heapq.heappush(self.free_cluster_indexes[anagrp], int(name.rsplit("_", 1)[1]))
+            raise
         with self.shared_state_lock:
-            self.logger.info(f"Allocated cluster {name=} {nonce=} {anagrp=}")
+            self.logger.info("Allocated cluster name=%r nonce=%r anagrp=%r", name, nonce, anagrp)
             self.cluster_nonce[name] = nonce
+        self.cluster_anagrp[name] = anagrp
         return name
 
     def _grpc_function_with_lock(self, func, request, context):
@@ -606,17 +817,153 @@ class GatewayService(pb2_grpc.GatewayServicer):
         """
         return self.omap_lock.execute_omap_locking_function(self._grpc_function_with_lock, func, request, context)
 
+    def check_huge_pages(self):
+        """Logs the requested and actual huge pages counts, only once per process, as they don't change"""
+        if GatewayService.huge_pages_checked:
+            return
+        GatewayService.huge_pages_checked = True
+
+        requested_hugepages_val = os.getenv("HUGEPAGES", "")
+        if not requested_hugepages_val:
+            self.logger.warning("Can't get requested huge pages count")
+        else:
+            requested_hugepages_val = requested_hugepages_val.strip()
+            try:
+                requested_hugepages_val = int(requested_hugepages_val)
+                self.logger.info(f"Requested huge pages count is {requested_hugepages_val}")
+            except ValueError:
+                self.logger.warning(f"Requested huge pages count value {requested_hugepages_val} is not numeric")
+                requested_hugepages_val = None
+        hugepages_file = os.getenv("HUGEPAGES_DIR", "")
+        if not hugepages_file:
+            hugepages_file = "/sys/kernel/mm/hugepages/hugepages-2048kB/nr_hugepages"
+            self.logger.warning("No huge pages file defined, will use /sys/kernel/mm/hugepages/hugepages-2048kB/nr_hugepages")
+        else:
+            hugepages_file = hugepages_file.strip()
+        if os.access(hugepages_file, os.F_OK):
+            try:
+                hugepages_val = ""
+                with open(hugepages_file) as f:
+                    hugepages_val = f.readline()
+                hugepages_val = hugepages_val.strip()
+                if hugepages_val:
+                    try:
+                        hugepages_val = int(hugepages_val)
+                        self.logger.info(f"Actual huge pages count is {hugepages_val}")
+                    except ValueError:
+                        self.logger.warning(f"Actual huge pages count value {hugepages_val} is not numeric")
+                        hugepages_val = ""
+                    if requested_hugepages_val and hugepages_val != "" and requested_hugepages_val > hugepages_val:
+                        self.logger.warning(f"The actual huge page count {hugepages_val} is smaller than the requested value of {requested_hugepages_val}")
+                else:
+                    self.logger.warning(f"Can't read actual huge pages count value from {hugepages_file}")
+            except Exception as ex:
+                self.logger.exception(f"Can't read actual huge pages count value from {hugepages_file}")
+        else:
+            self.logger.warning(f"Can't find huge pages file {hugepages_file}")
+
+    @contextlib.contextmanager
+    def spdk_rpc_stats_client(self):
+        """Checks out an idle IO stats SPDK client, waiting for one if they're all in use"""
+        stats_client = self.spdk_rpc_stats_pool.get()
+        try:
+            yield stats_client
+        finally:
+            self.spdk_rpc_stats_pool.put(stats_client)
+
+    def execute_grpc_function_once(self, key, func, request, context):
+        """Like execute_grpc_function(), but when a call with the same key is already being
+           executed, waits for it and returns its result instead. Only for read-only functions,
+           the result is shared by all the callers and shouldn't be modified.
+        """
+        with self.inflight_requests_lock:
+            future = self.inflight_requests.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.inflight_requests[key] = future
+
+        if leader:
+            try:
+                future.set_result(self.execute_grpc_function(func, request, context))
+            except BaseException as ex:
+                future.set_exception(ex)
+            finally:
+                with self.inflight_requests_lock:
+                    del self.inflight_requests[key]
+        return future.result()
+
     def create_bdev(self, anagrp: int, name, uuid, rbd_pool_name, rbd_image_name, block_size, create_image, rbd_image_size, context, peer_msg = ""):
         """Creates a bdev from an RBD image."""
 
+        bdev_req = {"anagrp": anagrp, "name": name, "uuid": uuid, "rbd_pool_name": rbd_pool_name,
+                    "rbd_image_name": rbd_image_name, "block_size": block_size, "create_image": create_image,
+                    "rbd_image_size": rbd_image_size}
+        return self.create_bdevs_batch([bdev_req], context, peer_msg)[0]
+
+    def create_bdevs_batch(self, bdev_reqs, context, peer_msg = ""):
+        """Creates bdevs from RBD images, sending all the bdev_rbd_create calls to SPDK in one batch.
+
+        Each item of bdev_reqs is a dictionary of create_bdev()'s arguments. Returns a BdevStatus for each item."""
+
+        # With many bdevs, log a single line at info level and the details of each bdev at debug level
+        log_level = logging.INFO
+        if len(bdev_reqs) > 1:
+            self.logger.info("Received request to create %d bdevs, context=%s%s", len(bdev_reqs), context, peer_msg)
+            log_level = logging.DEBUG
+
+        statuses = [None] * len(bdev_reqs)
+        created = []
+        calls = []
+        for i, bdev_req in enumerate(bdev_reqs):
+            ret = self.prepare_bdev_image(bdev_req, log_level, context, peer_msg)
+            if ret is not None:
+                statuses[i] = ret
+                continue
+            name = bdev_req["name"]
+            try:
+                cluster_name = self._get_cluster(bdev_req["anagrp"])
+            except Exception as ex:
+                errmsg = f"Can't allocate a cluster context for bdev {name}"
+                self.logger.exception(errmsg)
+                statuses[i] = BdevStatus(status=errno.ENODEV, error_message=f"Failure creating bdev {name}: {errmsg}:\n{ex}")
+                continue
+            params = {"name": name, "cluster_name": cluster_name, "pool_name": bdev_req["rbd_pool_name"],
+                      "rbd_name": bdev_req["rbd_image_name"], "block_size": bdev_req["block_size"]}
+            if bdev_req["uuid"] is not None:
+                params["uuid"] = bdev_req["uuid"]
+            created.append((i, cluster_name))
+            calls.append(("bdev_rbd_create", params))
+
+        if calls:
+            try:
+                results = self.spdk_rpc_client.batch_call(calls)
+            except Exception as ex:
+                results = [ex] * len(calls)
+            for (i, cluster_name), result in zip(created, results):
+                statuses[i] = self.bdev_rbd_create_done(bdev_reqs[i], cluster_name, result)
+
+        return statuses
+
+    def prepare_bdev_image(self, bdev_req, log_level, context, peer_msg):
+        """Checks the parameters of a bdev and creates its RBD image if needed.
+
+        Returns a BdevStatus on failure, None otherwise."""
+
+        name = bdev_req["name"]
+        rbd_pool_name = bdev_req["rbd_pool_name"]
+        rbd_image_name = bdev_req["rbd_image_name"]
+        block_size = bdev_req["block_size"]
+        create_image = bdev_req["create_image"]
+        rbd_image_size = bdev_req["rbd_image_size"]
         if create_image:
             cr_img_msg = "will create image if doesn't exist"
         else:
             cr_img_msg = "will not create image if doesn't exist"
 
-        self.logger.info(f"Received request to create bdev {name} from"
-                         f" {rbd_pool_name}/{rbd_image_name} (size {rbd_image_size} bytes)"
-                         f" with block size {block_size}, {cr_img_msg}, context={context}{peer_msg}")
+        self.logger.log(log_level, "Received request to create bdev %s from %s/%s (size %s bytes)"
+                        " with block size %s, %s, context=%s%s", name, rbd_pool_name, rbd_image_name,
+                        rbd_image_size, block_size, cr_img_msg, context, peer_msg)
 
         if block_size == 0:
             return BdevStatus(status=errno.EINVAL,
@@ -637,9 +984,9 @@ class GatewayService(pb2_grpc.GatewayServicer):
             try:
                 rc = self.ceph_utils.create_image(rbd_pool_name, rbd_image_name, rbd_image_size)
                 if rc:
-                    self.logger.info(f"Image {rbd_pool_name}/{rbd_image_name} created, size is {rbd_image_size} bytes")
+                    self.logger.info("Image %s/%s created, size is %s bytes", rbd_pool_name, rbd_image_name, rbd_image_size)
                 else:
-                    self.logger.info(f"Image {rbd_pool_name}/{rbd_image_name} already exists with size {rbd_image_size} bytes")
+                    self.logger.info("Image %s/%s already exists with size %s bytes", rbd_pool_name, rbd_image_name, rbd_image_size)
             except Exception as ex:
                 errcode = 0
                 msg = ""
@@ -655,34 +1002,34 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 self.logger.exception(errmsg)
                 return BdevStatus(status=errcode, error_message=f"Failure creating bdev {name}: {errmsg}")
 
-        try:
-            cluster_name=self._get_cluster(anagrp)
-            bdev_name = rpc_bdev.bdev_rbd_create(
-                self.spdk_rpc_client,
-                name=name,
-                cluster_name=cluster_name,
-                pool_name=rbd_pool_name,
-                rbd_name=rbd_image_name,
-                block_size=block_size,
-                uuid=uuid,
-            )
-            with self.shared_state_lock:
-                self.bdev_cluster[name] = cluster_name
-            self.bdev_params[name]  = {'uuid':uuid, 'pool_name':rbd_pool_name, 'image_name':rbd_image_name, 'image_size':rbd_image_size, 'block_size': block_size}
+        return None
 
-            self.logger.debug(f"bdev_rbd_create: {bdev_name}, cluster_name {cluster_name}")
-        except Exception as ex:
+    def bdev_rbd_create_done(self, bdev_req, cluster_name, result):
+        """Handles the result of a bdev_rbd_create call, result is the exception in case the call failed."""
+
+        name = bdev_req["name"]
+        if isinstance(result, Exception):
             self._put_cluster(cluster_name)
             errmsg = f"bdev_rbd_create {name} failed"
-            self.logger.exception(errmsg)
-            errmsg = f"{errmsg} with:\n{ex}"
-            resp = self.parse_json_exeption(ex)
+            self.logger.error(f"{errmsg}:\n{result}")
+            errmsg = f"{errmsg} with:\n{result}"
+            resp = self.parse_json_exception(result)
             status = errno.ENODEV
             if resp:
                 status = resp["code"]
                 errmsg = f"Failure creating bdev {name}: {resp['message']}"
             return BdevStatus(status=status, error_message=errmsg)
 
+        bdev_name = result
+        with self.shared_state_lock:
+            self.bdev_cluster[name] = cluster_name
+            self.bdev_nonce[name] = self.cluster_nonce[cluster_name]
+        self.bdev_params[name]  = {'uuid':bdev_req["uuid"], 'pool_name':bdev_req["rbd_pool_name"],
+                                   'image_name':bdev_req["rbd_image_name"], 'image_size':bdev_req["rbd_image_size"],
+                                   'block_size': bdev_req["block_size"]}
+
+        self.logger.debug("bdev_rbd_create: %s, cluster_name %s", bdev_name, cluster_name)
+
         # Just in case SPDK failed with no exception
         if not bdev_name:
             errmsg = f"Can't create bdev {name}"
@@ -691,27 +1038,33 @@ class GatewayService(pb2_grpc.GatewayServicer):
 
         assert name == bdev_name, f"Created bdev name {bdev_name} differs from requested name {name}"
 
-        return BdevStatus(status=0, error_message=os.strerror(0), bdev_name=name)
+        return BdevStatus(status=0, error_message=STRERROR_OK, bdev_name=name)
 
     def resize_bdev(self, bdev_name, new_size, peer_msg = ""):
         """Resizes a bdev."""
 
-        self.logger.info(f"Received request to resize bdev {bdev_name} to {new_size} MiB{peer_msg}")
+        self.logger.info("Received request to resize bdev %s to %s MiB%s", bdev_name, new_size, peer_msg)
         assert self.rpc_lock.locked(), "RPC is unlocked when calling resize_bdev()"
         rbd_pool_name = None
         rbd_image_name = None
-        bdev_info = self.get_bdev_info(bdev_name)
-        if bdev_info is not None:
-            try:
-                drv_specific_info = bdev_info["driver_specific"]
-                rbd_info = drv_specific_info["rbd"]
-                rbd_pool_name = rbd_info["pool_name"]
-                rbd_image_name = rbd_info["rbd_name"]
-            except KeyError as err:
-                self.logger.warning(f"Key {err} is not found, will not check size for shrinkage")
-                pass
+        # bdevs created by this gateway are already registered in bdev_params, no need to query SPDK for them
+        bdev_params = self.bdev_params.get(bdev_name)
+        if bdev_params:
+            rbd_pool_name = bdev_params["pool_name"]
+            rbd_image_name = bdev_params["image_name"]
         else:
-            self.logger.warning(f"Can't get information for associated block device {bdev_name}, won't check size for shrinkage")
+            bdev_info = self.get_bdev_info(bdev_name)
+            if bdev_info is not None:
+                try:
+                    drv_specific_info = bdev_info["driver_specific"]
+                    rbd_info = drv_specific_info["rbd"]
+                    rbd_pool_name = rbd_info["pool_name"]
+                    rbd_image_name = rbd_info["rbd_name"]
+                except KeyError as err:
+                    self.logger.warning(f"Key {err} is not found, will not check size for shrinkage")
+                    pass
+            else:
+                self.logger.warning(f"Can't get information for associated block device {bdev_name}, won't check size for shrinkage")
 
         if rbd_pool_name and rbd_image_name:
             try:
@@ -729,12 +1082,12 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 name=bdev_name,
                 new_size=new_size,
             )
-            self.logger.debug(f"resize_bdev {bdev_name}: {ret}")
+            self.logger.debug("resize_bdev %s: %s", bdev_name, ret)
         except Exception as ex:
             errmsg = f"Failure resizing bdev {bdev_name}"
             self.logger.exception(errmsg)
             errmsg = f"{errmsg}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
+            resp = self.parse_json_exception(ex)
             status = errno.EINVAL
             if resp:
                 status = resp["code"]
@@ -746,14 +1099,14 @@ class GatewayService(pb2_grpc.GatewayServicer):
             self.logger.error(errmsg)
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def delete_bdev(self, bdev_name, recycling_mode=False, peer_msg=""):
         """Deletes a bdev."""
 
         assert self.rpc_lock.locked(), "RPC is unlocked when calling delete_bdev()"
 
-        self.logger.info(f"Received request to delete bdev {bdev_name}{peer_msg}")
+        self.logger.info("Received request to delete bdev %s%s", bdev_name, peer_msg)
         try:
             ret = rpc_bdev.bdev_rbd_delete(
                 self.spdk_rpc_client,
@@ -763,14 +1116,14 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 del self.bdev_params[bdev_name]
             with self.shared_state_lock:
                 cluster = self.bdev_cluster[bdev_name]
-            self.logger.debug(f"to delete_bdev {bdev_name} cluster {cluster} ")
+            self.logger.debug("to delete_bdev %s cluster %s ", bdev_name, cluster)
             self._put_cluster(cluster)
-            self.logger.debug(f"delete_bdev {bdev_name}: {ret}")
+            self.logger.debug("delete_bdev %s: %s", bdev_name, ret)
         except Exception as ex:
             errmsg = f"Failure deleting bdev {bdev_name}"
             self.logger.exception(errmsg)
             errmsg = f"{errmsg}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
+            resp = self.parse_json_exception(ex)
             status = errno.EINVAL
             if resp:
                 status = resp["code"]
@@ -783,40 +1136,17 @@ class GatewayService(pb2_grpc.GatewayServicer):
             self.logger.error(errmsg)
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def subsystem_already_exists(self, context, nqn) -> bool:
         if not context:
             return False
-        state = self.gateway_state.local.get_state()
-        for key, val in state.items():
-            if not key.startswith(self.gateway_state.local.SUBSYSTEM_PREFIX):
-                continue
-            try:
-                subsys = json.loads(val)
-                subnqn = subsys["subsystem_nqn"]
-                if subnqn == nqn:
-                    return True
-            except Exception:
-                self.logger.exception(f"Got exception while parsing {val}, will continue")
-                continue
-        return False
+        return self.gateway_state.local.has_key(GatewayState.build_subsystem_key(nqn))
 
     def serial_number_already_used(self, context, serial) -> str:
         if not context:
             return None
-        state = self.gateway_state.local.get_state()
-        for key, val in state.items():
-            if not key.startswith(self.gateway_state.local.SUBSYSTEM_PREFIX):
-                continue
-            try:
-                subsys = json.loads(val)
-                if serial == subsys["serial_number"]:
-                    return subsys["subsystem_nqn"]
-            except Exception:
-                self.logger.exception(f"Got exception while parsing {val}")
-                continue
-        return None
+        return self.gateway_state.local.subsystem_by_serial(serial)
 
     def get_peer_message(self, context) -> str:
         if not context:
@@ -846,14 +1176,15 @@ class GatewayService(pb2_grpc.GatewayServicer):
     def create_subsystem_safe(self, request, context):
         """Creates a subsystem."""
 
-        create_subsystem_error_prefix = f"Failure creating subsystem {request.subsystem_nqn}"
+        def create_subsystem_error_prefix():
+            return f"Failure creating subsystem {request.subsystem_nqn}"
         peer_msg = self.get_peer_message(context)
 
-        self.logger.info(
-            f"Received request to create subsystem {request.subsystem_nqn}, enable_ha: {request.enable_ha}, max_namespaces: {request.max_namespaces}, no group append: {request.no_group_append}, context: {context}{peer_msg}")
+        self.logger.info("Received request to create subsystem %s, enable_ha: %s, max_namespaces: %s, no group append: %s, context: %s%s",
+                         request.subsystem_nqn, request.enable_ha, request.max_namespaces, request.no_group_append, context, peer_msg)
 
         if not request.enable_ha:
-            errmsg = f"{create_subsystem_error_prefix}: HA must be enabled for subsystems"
+            errmsg = f"{create_subsystem_error_prefix()}: HA must be enabled for subsystems"
             self.logger.error(f"{errmsg}")
             return pb2.subsys_status(status = errno.EINVAL, error_message = errmsg, nqn = request.subsystem_nqn)
 
@@ -864,29 +1195,29 @@ class GatewayService(pb2_grpc.GatewayServicer):
 
         errmsg = ""
         if not GatewayState.is_key_element_valid(request.subsystem_nqn):
-            errmsg = f"{create_subsystem_error_prefix}: Invalid NQN \"{request.subsystem_nqn}\", contains invalid characters"
+            errmsg = f"{create_subsystem_error_prefix()}: Invalid NQN \"{request.subsystem_nqn}\", contains invalid characters"
             self.logger.error(f"{errmsg}")
             return pb2.subsys_status(status = errno.EINVAL, error_message = errmsg, nqn = request.subsystem_nqn)
 
         if self.verify_nqns:
             rc = GatewayUtils.is_valid_nqn(request.subsystem_nqn)
             if rc[0] != 0:
-                errmsg = f"{create_subsystem_error_prefix}: {rc[1]}"
+                errmsg = f"{create_subsystem_error_prefix()}: {rc[1]}"
                 self.logger.error(f"{errmsg}")
                 return pb2.subsys_status(status = rc[0], error_message = errmsg, nqn = request.subsystem_nqn)
 
         if GatewayUtils.is_discovery_nqn(request.subsystem_nqn):
-            errmsg = f"{create_subsystem_error_prefix}: Can't create a discovery subsystem"
+            errmsg = f"{create_subsystem_error_prefix()}: Can't create a discovery subsystem"
             self.logger.error(f"{errmsg}")
             return pb2.subsys_status(status = errno.EINVAL, error_message = errmsg, nqn = request.subsystem_nqn)
 
         if context:
             if request.no_group_append or not self.gateway_group:
-                self.logger.info(f"Subsystem NQN will not be changed")
+                self.logger.info("Subsystem NQN will not be changed")
             else:
                 group_name_to_use = self.gateway_group.replace(GatewayState.OMAP_KEY_DELIMITER, "-")
                 request.subsystem_nqn += f".{group_name_to_use}"
-                self.logger.info(f"Subsystem NQN was changed to {request.subsystem_nqn}, adding the group name")
+                self.logger.info("Subsystem NQN was changed to %s, adding the group name", request.subsystem_nqn)
 
         # Set client ID range according to group id assigned by the monitor
         offset = self.group_id * CNTLID_RANGE_SIZE
@@ -894,10 +1225,10 @@ class GatewayService(pb2_grpc.GatewayServicer):
         max_cntlid = offset + CNTLID_RANGE_SIZE
 
         if not request.serial_number:
-            random.seed()
-            randser = random.randint(2, 99999999999999)
+            # a number between 2 and 99999999999999, from the OS random source, so nothing needs reseeding
+            randser = secrets.randbelow(99999999999998) + 2
             request.serial_number = f"Ceph{randser}"
-            self.logger.info(f"No serial number specified for {request.subsystem_nqn}, will use {request.serial_number}")
+            self.logger.info("No serial number specified for %s, will use %s", request.subsystem_nqn, request.serial_number)
 
         ret = False
         omap_lock = self.omap_lock.get_omap_lock_to_use(context)
@@ -913,7 +1244,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     if subsys_using_serial:
                         errmsg = f"Serial number {request.serial_number} already used by subsystem {subsys_using_serial}"
                 if subsys_already_exists or subsys_using_serial:
-                    errmsg = f"{create_subsystem_error_prefix}: {errmsg}"
+                    errmsg = f"{create_subsystem_error_prefix()}: {errmsg}"
                     self.logger.error(f"{errmsg}")
                     return pb2.subsys_status(status=errno.EEXIST, error_message=errmsg, nqn = request.subsystem_nqn)
                 ret = rpc_nvmf.nvmf_create_subsystem(
@@ -927,47 +1258,55 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     ana_reporting = True,
                 )
                 self.subsys_max_ns[request.subsystem_nqn] = request.max_namespaces if request.max_namespaces else 32
-                self.logger.debug(f"create_subsystem {request.subsystem_nqn}: {ret}")
+                self.logger.debug("create_subsystem %s: %s", request.subsystem_nqn, ret)
             except Exception as ex:
-                self.logger.exception(create_subsystem_error_prefix)
-                errmsg = f"{create_subsystem_error_prefix}:\n{ex}"
-                resp = self.parse_json_exeption(ex)
+                prefix = create_subsystem_error_prefix()
+                self.logger.exception(prefix)
+                errmsg = f"{prefix}:\n{ex}"
+                resp = self.parse_json_exception(ex)
                 status = errno.EINVAL
                 if resp:
                     status = resp["code"]
-                    errmsg = f"{create_subsystem_error_prefix}: {resp['message']}"
+                    errmsg = f"{prefix}: {resp['message']}"
                 return pb2.subsys_status(status=status, error_message=errmsg, nqn = request.subsystem_nqn)
 
             # Just in case SPDK failed with no exception
             if not ret:
-                self.logger.error(create_subsystem_error_prefix)
-                return pb2.subsys_status(status=errno.EINVAL, error_message=create_subsystem_error_prefix, nqn = request.subsystem_nqn)
+                prefix = create_subsystem_error_prefix()
+                self.logger.error(prefix)
+                return pb2.subsys_status(status=errno.EINVAL, error_message=prefix, nqn = request.subsystem_nqn)
 
             if context:
                 # Update gateway state
                 try:
-                    json_req = json_format.MessageToJson(
-                        request, preserving_proto_field_name=True, including_default_value_fields=True)
-                    self.gateway_state.add_subsystem(request.subsystem_nqn, json_req)
+                    if self.subsystem_state_binary_format:
+                        state_val = GatewayState.build_binary_value(request)
+                    else:
+                        state_val = GatewayService.request_to_state_json(request)
+                    self.gateway_state.add_subsystem(request.subsystem_nqn, state_val)
                 except Exception as ex:
                     errmsg = f"Error persisting subsystem {request.subsystem_nqn}"
                     self.logger.exception(errmsg)
                     errmsg = f"{errmsg}:\n{ex}"
                     return pb2.subsys_status(status=errno.EINVAL, error_message=errmsg, nqn = request.subsystem_nqn)
 
-        return pb2.subsys_status(status=0, error_message=os.strerror(0), nqn = request.subsystem_nqn)
+        return pb2.subsys_status(status=0, error_message=STRERROR_OK, nqn = request.subsystem_nqn)
 
     def create_subsystem(self, request, context=None):
         return self.execute_grpc_function(self.create_subsystem_safe, request, context)
 
     def get_subsystem_namespaces(self, nqn) -> list:
         ns_list = []
-        local_state_dict = self.gateway_state.local.get_state()
-        for key, val in local_state_dict.items():
-            if not key.startswith(self.gateway_state.local.NAMESPACE_PREFIX):
-                continue
+        # Only look at the namespace keys of this subsystem, other NQNs might share the prefix, so still check the NQN
+        prefix = GatewayState.build_namespace_key(nqn, None) + GatewayState.OMAP_KEY_DELIMITER
+        for key, val in self.gateway_state.local.iter_prefix(prefix):
             try:
-                ns = json.loads(val)
+                if GatewayState.is_binary_value(val):
+                    ns = GatewayState.parse_namespace_value(val)
+                    if ns.subsystem_nqn == nqn:
+                        ns_list.append(ns.nsid)
+                    continue
+                ns = self.gateway_state.local.get_parsed(key)
                 if ns["subsystem_nqn"] == nqn:
                     nsid = ns["nsid"]
                     ns_list.append(nsid)
@@ -978,12 +1317,11 @@ class GatewayService(pb2_grpc.GatewayServicer):
         return ns_list
 
     def subsystem_has_listeners(self, nqn) -> bool:
-        local_state_dict = self.gateway_state.local.get_state()
-        for key, val in local_state_dict.items():
-            if not key.startswith(self.gateway_state.local.LISTENER_PREFIX):
-                continue
+        # Other NQNs might share the prefix, so still check the NQN
+        prefix = GatewayState.build_partial_listener_key(nqn, None) + GatewayState.OMAP_KEY_DELIMITER
+        for key, val in self.gateway_state.local.iter_prefix(prefix):
             try:
-                lsnr = json.loads(val)
+                lsnr = self.gateway_state.local.get_parsed(key)
                 if lsnr["nqn"] == nqn:
                     return True
             except Exception:
@@ -994,7 +1332,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
 
     def remove_subsystem_from_state(self, nqn, context):
         if not context:
-            return pb2.req_status(status=0, error_message=os.strerror(0))
+            return pb2.req_status(status=0, error_message=STRERROR_OK)
 
         # Update gateway state
         try:
@@ -1004,12 +1342,13 @@ class GatewayService(pb2_grpc.GatewayServicer):
             self.logger.exception(errmsg)
             errmsg = f"{errmsg}:\n{ex}"
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def delete_subsystem_safe(self, request, context):
         """Deletes a subsystem."""
 
-        delete_subsystem_error_prefix = f"Failure deleting subsystem {request.subsystem_nqn}"
+        def delete_subsystem_error_prefix():
+            return f"Failure deleting subsystem {request.subsystem_nqn}"
 
         ret = False
         omap_lock = self.omap_lock.get_omap_lock_to_use(context)
@@ -1024,33 +1363,77 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     self.subsystem_listeners.pop(request.subsystem_nqn, None)
                 self.host_info.clean_subsystem(request.subsystem_nqn)
                 self.subsystem_nsid_bdev_and_uuid.remove_namespace(request.subsystem_nqn)
+                self.clear_namespace_state_cache(request.subsystem_nqn)
+                self.subsystems_cache.pop(request.subsystem_nqn, None)
                 self.remove_all_subsystem_key_files(request.subsystem_nqn)
                 self.remove_all_subsystem_keys_from_keyring(request.subsystem_nqn)
-                self.logger.debug(f"delete_subsystem {request.subsystem_nqn}: {ret}")
+                self.logger.debug("delete_subsystem %s: %s", request.subsystem_nqn, ret)
             except Exception as ex:
-                self.logger.exception(delete_subsystem_error_prefix)
-                errmsg = f"{delete_subsystem_error_prefix}:\n{ex}"
+                prefix = delete_subsystem_error_prefix()
+                self.logger.exception(prefix)
+                errmsg = f"{prefix}:\n{ex}"
                 self.remove_subsystem_from_state(request.subsystem_nqn, context)
-                resp = self.parse_json_exeption(ex)
+                resp = self.parse_json_exception(ex)
                 status = errno.EINVAL
                 if resp:
                     status = resp["code"]
-                    errmsg = f"{delete_subsystem_error_prefix}: {resp['message']}"
+                    errmsg = f"{prefix}: {resp['message']}"
                 return pb2.req_status(status=status, error_message=errmsg)
 
             # Just in case SPDK failed with no exception
             if not ret:
-                self.logger.error(delete_subsystem_error_prefix)
+                prefix = delete_subsystem_error_prefix()
+                self.logger.error(prefix)
                 self.remove_subsystem_from_state( request.subsystem_nqn, context)
-                return pb2.req_status(status=errno.EINVAL, error_message=delete_subsystem_error_prefix)
+                return pb2.req_status(status=errno.EINVAL, error_message=prefix)
 
             return self.remove_subsystem_from_state(request.subsystem_nqn, context)
 
+    def remove_subsystem_namespaces_safe(self, request, context):
+        """Removes the namespaces of a subsystem about to be force deleted, returns the NSIDs which weren't removed.
+
+        The namespaces are removed from SPDK in one batch. Their state keys are left for the subsystem's
+        deletion, which removes all of them in a single OMAP write."""
+
+        peer_msg = self.get_peer_message(context)
+        nqn = request.subsystem_nqn
+        omap_lock = self.omap_lock.get_omap_lock_to_use(context)
+        with omap_lock:
+            ns_list = self.get_subsystem_namespaces(nqn)
+            if not ns_list:
+                return []
+            calls = [("nvmf_subsystem_remove_ns", {"nqn": nqn, "nsid": nsid}) for nsid in ns_list]
+            try:
+                results = self.spdk_rpc_client.batch_call(calls)
+                self.logger.debug("remove_subsystem_namespaces %s: %s", nqn, results)
+            except Exception:
+                self.logger.exception(f"Failure removing the namespaces of {nqn} in one batch")
+                return ns_list
+
+            failed = []
+            for nsid, result in zip(ns_list, results):
+                if isinstance(result, Exception) or not result:
+                    self.logger.error(f"Failure removing namespace {nsid} from {nqn}:\n{result}")
+                    failed.append(nsid)
+                    continue
+                self.logger.info(f"Automatically removed namespace {nsid} from {nqn}")
+                self.namespace_state_cache.pop((nqn, nsid), None)
+                bdev_name = self.subsystem_nsid_bdev_and_uuid.find_namespace(nqn, nsid).bdev
+                self.subsystem_nsid_bdev_and_uuid.remove_namespace(nqn, nsid)
+                if not bdev_name:
+                    self.logger.warning(f"Can't find namespace {nsid} bdev name, will not delete it")
+                    continue
+                ret_del = self.delete_bdev(bdev_name, peer_msg = peer_msg)
+                if ret_del.status != 0:
+                    self.logger.error(f"Failure deleting namespace {nsid} bdev from {nqn}: {ret_del.error_message}")
+            return failed
+
     def delete_subsystem(self, request, context=None):
         """Deletes a subsystem."""
 
         peer_msg = self.get_peer_message(context)
-        delete_subsystem_error_prefix = f"Failure deleting subsystem {request.subsystem_nqn}"
+        def delete_subsystem_error_prefix():
+            return f"Failure deleting subsystem {request.subsystem_nqn}"
         self.logger.info(f"Received request to delete subsystem {request.subsystem_nqn}, context: {context}{peer_msg}")
 
         if not request.subsystem_nqn:
@@ -1061,12 +1444,12 @@ class GatewayService(pb2_grpc.GatewayServicer):
         if self.verify_nqns:
             rc = GatewayUtils.is_valid_nqn(request.subsystem_nqn)
             if rc[0] != 0:
-                errmsg = f"{delete_subsystem_error_prefix}: {rc[1]}"
+                errmsg = f"{delete_subsystem_error_prefix()}: {rc[1]}"
                 self.logger.error(f"{errmsg}")
                 return pb2.req_status(status = rc[0], error_message = errmsg)
 
         if GatewayUtils.is_discovery_nqn(request.subsystem_nqn):
-            errmsg = f"{delete_subsystem_error_prefix}: Can't delete a discovery subsystem"
+            errmsg = f"{delete_subsystem_error_prefix()}: Can't delete a discovery subsystem"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status = errno.EINVAL, error_message = errmsg)
 
@@ -1078,12 +1461,16 @@ class GatewayService(pb2_grpc.GatewayServicer):
 
         # We found a namespace still using this subsystem and --force wasn't used fail with EBUSY
         if not request.force and len(ns_list) > 0:
-            errmsg = f"{delete_subsystem_error_prefix}: Namespace {ns_list[0]} is still using the subsystem. Either remove it or use the '--force' command line option"
+            errmsg = f"{delete_subsystem_error_prefix()}: Namespace {ns_list[0]} is still using the subsystem. Either remove it or use the '--force' command line option"
             self.logger.error(errmsg)
             return pb2.req_status(status=errno.EBUSY, error_message=errmsg)
 
+        if ns_list:
+            # We found namespaces still using this subsystem and --force was used so we will try to remove them,
+            # all at once first, then one by one for the ones which couldn't be removed that way
+            self.logger.warning(f"Will remove namespaces {ns_list} from {request.subsystem_nqn}")
+            ns_list = self.execute_grpc_function(self.remove_subsystem_namespaces_safe, request, context)
         for nsid in ns_list:
-            # We found a namespace still using this subsystem and --force was used so we will try to remove the namespace
             self.logger.warning(f"Will remove namespace {nsid} from {request.subsystem_nqn}")
             ret = self.namespace_delete(pb2.namespace_delete_req(subsystem_nqn=request.subsystem_nqn, nsid=nsid), context)
             if ret.status == 0:
@@ -1091,28 +1478,22 @@ class GatewayService(pb2_grpc.GatewayServicer):
             else:
                 self.logger.error(f"Failure removing namespace {nsid} from {request.subsystem_nqn}:\n{ret.error_message}")
                 self.logger.warning(f"Will continue deleting {request.subsystem_nqn} anyway")
-        return self.execute_grpc_function(self.delete_subsystem_safe, request, context)
+        ret = self.execute_grpc_function(self.delete_subsystem_safe, request, context)
+        if request.subsystem_nqn not in self.subsys_max_ns:
+            self.drop_connections_generation(request.subsystem_nqn)
+        return ret
 
     def check_if_image_used(self, pool_name, image_name):
         """Check if image is used by any other namespace."""
 
         errmsg = ""
         nqn = None
-        state = self.gateway_state.local.get_state()
-        for key, val in state.items():
-            if not key.startswith(self.gateway_state.local.NAMESPACE_PREFIX):
-                continue
-            try:
-                ns = json.loads(val)
-                ns_pool = ns["rbd_pool_name"]
-                ns_image = ns["rbd_image_name"]
-                if pool_name and pool_name == ns_pool and image_name and image_name == ns_image:
-                    nqn = ns["subsystem_nqn"]
-                    errmsg = f"RBD image {ns_pool}/{ns_image} is already used by a namespace in subsystem {nqn}"
-                    break
-            except Exception:
-                self.logger.exception(f"Got exception while parsing {val}, will continue")
-                continue
+        if not pool_name or not image_name:
+            return errmsg, nqn
+
+        nqn = self.gateway_state.local.subsystem_by_image(pool_name, image_name)
+        if nqn:
+            errmsg = f"RBD image {pool_name}/{image_name} is already used by a namespace in subsystem {nqn}"
         return errmsg, nqn
 
     def create_namespace(self, subsystem_nqn, bdev_name, nsid, anagrpid, uuid, no_auto_visible, context):
@@ -1130,18 +1511,19 @@ class GatewayService(pb2_grpc.GatewayServicer):
             self.logger.error(f"{errmsg}")
             return pb2.nsid_status(status=errno.EINVAL, error_message = errmsg)
 
-        add_namespace_error_prefix = f"Failure adding namespace{nsid_msg} to {subsystem_nqn}"
+        def add_namespace_error_prefix():
+            return f"Failure adding namespace{nsid_msg} to {subsystem_nqn}"
 
         peer_msg = self.get_peer_message(context)
         self.logger.info(f"Received request to add {bdev_name} to {subsystem_nqn} with ANA group id {anagrpid}{nsid_msg}, no_auto_visible: {no_auto_visible}, context: {context}{peer_msg}")
 
         if anagrpid > self.subsys_max_ns[subsystem_nqn]:
-            errmsg = f"{add_namespace_error_prefix}: Group ID {anagrpid} is bigger than configured maximum {self.subsys_max_ns[subsystem_nqn]}"
+            errmsg = f"{add_namespace_error_prefix()}: Group ID {anagrpid} is bigger than configured maximum {self.subsys_max_ns[subsystem_nqn]}"
             self.logger.error(errmsg)
             return pb2.nsid_status(status=errno.EINVAL, error_message=errmsg)
 
         if GatewayUtils.is_discovery_nqn(subsystem_nqn):
-            errmsg = f"{add_namespace_error_prefix}: Can't add namespaces to a discovery subsystem"
+            errmsg = f"{add_namespace_error_prefix()}: Can't add namespaces to a discovery subsystem"
             self.logger.error(errmsg)
             return pb2.nsid_status(status=errno.EINVAL, error_message=errmsg)
 
@@ -1161,28 +1543,55 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 no_auto_visible=no_auto_visible,
             )
             self.subsystem_nsid_bdev_and_uuid.add_namespace(subsystem_nqn, nsid, bdev_name, uuid, anagrpid, no_auto_visible)
-            self.logger.debug(f"subsystem_add_ns: {nsid}")
+            self.logger.debug("subsystem_add_ns: %s", nsid)
         except Exception as ex:
-            self.logger.exception(add_namespace_error_prefix)
-            errmsg = f"{add_namespace_error_prefix}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
+            prefix = add_namespace_error_prefix()
+            self.logger.exception(prefix)
+            errmsg = f"{prefix}:\n{ex}"
+            resp = self.parse_json_exception(ex)
             status = errno.EINVAL
             if resp:
                 status = resp["code"]
-                errmsg = f"{add_namespace_error_prefix}: {resp['message']}"
+                errmsg = f"{prefix}: {resp['message']}"
             self.subsystem_nsid_bdev_and_uuid.remove_namespace(subsystem_nqn, nsid)
             return pb2.nsid_status(status=status, error_message=errmsg)
 
         # Just in case SPDK failed with no exception
         if not nsid:
-            self.logger.error(add_namespace_error_prefix)
-            return pb2.nsid_status(status=errno.EINVAL, error_message=add_namespace_error_prefix)
+            prefix = add_namespace_error_prefix()
+            self.logger.error(prefix)
+            return pb2.nsid_status(status=errno.EINVAL, error_message=prefix)
 
-        return pb2.nsid_status(nsid=nsid, status=0, error_message=os.strerror(0))
+        return pb2.nsid_status(nsid=nsid, status=0, error_message=STRERROR_OK)
 
-    def find_unique_bdev_name(uuid) -> str:
-        assert uuid, "Got an empty UUID"
-        return f"bdev_{uuid}"
+    @staticmethod
+    def find_unique_bdev_name(ns_uuid) -> str:
+        assert ns_uuid, "Got an empty UUID"
+        return GatewayService.BDEV_PREFIX + ns_uuid
+
+    @staticmethod
+    def request_to_state_json(req) -> str:
+        """Serializes a request as JSON for the state store, with all of its fields"""
+        return json_dumps(json_format.MessageToDict(req, preserving_proto_field_name=True, including_default_value_fields=True))
+
+    def get_cached_namespace_state(self, nqn, nsid, state_val) -> pb2.namespace_add_req:
+        """Returns the parsed namespace state value, reusing the request it was written from when it's still current."""
+        cached = self.namespace_state_cache.get((nqn, nsid))
+        if cached and cached[0] == state_val:
+            return cached[1]
+        ns_entry = GatewayState.parse_namespace_value(state_val)
+        self.namespace_state_cache[(nqn, nsid)] = (state_val, ns_entry)
+        return ns_entry
+
+    def clear_namespace_state_cache(self, nqn):
+        for key in [k for k in self.namespace_state_cache if k[0] == nqn]:
+            self.namespace_state_cache.pop(key, None)
+
+    def namespace_add_req_to_state_value(self, req):
+        """Serializes a namespace_add_req in the configured state format."""
+        if self.namespace_state_binary_format:
+            return GatewayState.build_binary_value(req)
+        return GatewayService.request_to_state_json(req)
 
     def set_ana_state(self, request, context=None):
         return self.execute_grpc_function(self.set_ana_state_safe, request, context)
@@ -1192,24 +1601,34 @@ class GatewayService(pb2_grpc.GatewayServicer):
         """Sets ana state for this gateway."""
         self.logger.info(f"Received request to set ana states {ana_info.states}, {peer_msg}")
 
-        state = self.gateway_state.local.get_state()
         inaccessible_ana_groups = {}
         optimized_ana_groups = set()
+        # bind the attributes used inside the loops to locals, they are looked up per listener and group
+        optimized = pb2.ana_state.OPTIMIZED
+        ana_map = self.ana_map
+        subsys_max_ns = self.subsys_max_ns
+        subsystem_listeners = self.subsystem_listeners
+        clusters = self.clusters
+        logger = self.logger
+        spdk_client = self.spdk_rpc_client
+        set_listener_ana_state = rpc_nvmf.nvmf_subsystem_listener_set_ana_state
+        wait_for_latest_osdmap = rpc_bdev.bdev_rbd_wait_for_latest_osdmap
         # Iterate over nqn_ana_states in ana_info
         for nas in ana_info.states:
 
             # fill the static gateway dictionary per nqn and grp_id
             nqn = nas.nqn
             for gs in nas.states:
-                self.ana_map[nqn][gs.grp_id]  = gs.state
+                ana_map[nqn][gs.grp_id]  = gs.state
 
             # If this is not set the subsystem was not created yet
-            if not nqn in self.subsys_max_ns:
+            if not nqn in subsys_max_ns:
                 continue
 
-            self.logger.debug(f"Iterate over {nqn=} {self.subsystem_listeners[nqn]=}")
-            for listener in self.subsystem_listeners[nqn]:
-                self.logger.debug(f"{listener=}")
+            listeners = subsystem_listeners[nqn]
+            logger.debug("Iterate over nqn=%r listeners=%r", nqn, listeners)
+            for listener in listeners:
+                logger.debug("listener=%r", listener)
 
                 # Iterate over ana_group_state in nqn_ana_states
                 for gs in nas.states:
@@ -1217,23 +1636,24 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     grp_id = gs.grp_id
                     # The gateway's interface gRPC ana_state into SPDK JSON RPC values,
                     # see nvmf_subsystem_listener_set_ana_state method https://spdk.io/doc/jsonrpc.html
-                    ana_state = "optimized" if gs.state == pb2.ana_state.OPTIMIZED else "inaccessible"
+                    ana_state = "optimized" if gs.state == optimized else "inaccessible"
                     try:
                         # Need to wait for the latest OSD map, for each RADOS
                         # cluster context before becoming optimized,
                         # part of bocklist logic
-                        if gs.state == pb2.ana_state.OPTIMIZED:
+                        if gs.state == optimized:
                             if grp_id not in optimized_ana_groups:
-                                for cluster in self.clusters[grp_id]:
-                                    if not rpc_bdev.bdev_rbd_wait_for_latest_osdmap(self.spdk_rpc_client, name=cluster):
+                                for cluster in clusters[grp_id]:
+                                    if not wait_for_latest_osdmap(spdk_client, name=cluster):
                                         raise Exception(f"bdev_rbd_wait_for_latest_osdmap({cluster=}) error")
-                                    self.logger.debug(f"set_ana_state bdev_rbd_wait_for_latest_osdmap {cluster=}")
+                                    logger.debug("set_ana_state bdev_rbd_wait_for_latest_osdmap cluster=%r", cluster)
                                 optimized_ana_groups.add(grp_id)
 
-                        self.logger.debug(f"set_ana_state nvmf_subsystem_listener_set_ana_state {nqn=} {listener=} {ana_state=} {grp_id=}")
+                        logger.debug("set_ana_state nvmf_subsystem_listener_set_ana_state nqn=%r listener=%r ana_state=%r grp_id=%r",
+                                     nqn, listener, ana_state, grp_id)
                         (adrfam, traddr, trsvcid, secure) = listener
-                        ret = rpc_nvmf.nvmf_subsystem_listener_set_ana_state(
-                            self.spdk_rpc_client,
+                        ret = set_listener_ana_state(
+                            spdk_client,
                             nqn=nqn,
                             trtype="TCP",
                             traddr=traddr,
@@ -1243,52 +1663,73 @@ class GatewayService(pb2_grpc.GatewayServicer):
                             anagrpid=grp_id)
                         if ana_state == "inaccessible" :
                             inaccessible_ana_groups[grp_id] = True
-                        self.logger.debug(f"set_ana_state nvmf_subsystem_listener_set_ana_state response {ret=}")
+                        logger.debug("set_ana_state nvmf_subsystem_listener_set_ana_state response ret=%r", ret)
                         if not ret:
                             raise Exception(f"nvmf_subsystem_listener_set_ana_state({nqn=}, {listener=}, {ana_state=}, {grp_id=}) error")
                     except Exception as ex:
-                        self.logger.exception("nvmf_subsystem_listener_set_ana_state()")
+                        logger.exception("nvmf_subsystem_listener_set_ana_state()")
                         if context:
                             context.set_code(grpc.StatusCode.INTERNAL)
                             context.set_details(f"{ex}")
                         return pb2.req_status()
         return pb2.req_status(status=True)
 
-    def choose_anagrpid_for_namespace(self, nsid) ->int:
+    def choose_anagrpid_for_namespace(self, nsid, pending_load=None) ->int:
+        """Chooses the ANA group for a new namespace.
+
+        pending_load maps ANA groups to the number of namespaces already assigned to them, whose bdevs weren't created yet."""
+        if pending_load is None:
+            pending_load = {}
         grps_list = self.ceph_utils.get_number_created_gateways(self.gateway_pool, self.gateway_group)
         for ana_grp in grps_list:
-            if not self.clusters[ana_grp]: # still no namespaces in this ana-group - probably the new GW  added
+            if not self.clusters[ana_grp] and not pending_load.get(ana_grp): # still no namespaces in this ana-group - probably the new GW  added
                 self.logger.info(f"New GW created: chosen ana group {ana_grp} for ns {nsid} ")
                 return ana_grp
         #not found ana_grp .To calulate it.  Find minimum loaded ana_grp cluster
-        ana_load = {}
-        min_load = 2000
+        min_load = None
         chosen_ana_group = 0
         for ana_grp in self.clusters:
-            if ana_grp in grps_list: #to take into consideration only valid groups
-                ana_load[ana_grp] = 0;
-                for name in self.clusters[ana_grp]:
-                    ana_load[ana_grp] += self.clusters[ana_grp][name] # accumulate the total load per ana group for all valid ana_grp clusters
-        for ana_grp in ana_load :
-            self.logger.info(f" ana group {ana_grp} load =  {ana_load[ana_grp]}  ")
-            if ana_load[ana_grp] <=  min_load:
-                min_load = ana_load[ana_grp]
+            if ana_grp not in grps_list: #to take into consideration only valid groups
+                continue
+            # the total load per ana group for all valid ana_grp clusters
+            load = self.anagrp_bdev_count[ana_grp] + pending_load.get(ana_grp, 0)
+            self.logger.info(f" ana group {ana_grp} load =  {load}  ")
+            if min_load is None or load <= min_load:
+                min_load = load
                 chosen_ana_group = ana_grp
-                self.logger.info(f" ana group {ana_grp} load =  {ana_load[ana_grp]} set as min {min_load} ")
+                self.logger.info(f" ana group {ana_grp} load =  {load} set as min {min_load} ")
         self.logger.info(f"Found min loaded cluster: chosen ana group {chosen_ana_group} for ns {nsid} ")
         return chosen_ana_group
 
     def namespace_add_safe(self, request, context):
         """Adds a namespace to a subsystem."""
 
+        peer_msg = self.get_peer_message(context)
+        ret, grps_list, anagrp = self.namespace_add_check(request, context, peer_msg)
+        if ret is not None:
+            return ret
+
+        omap_lock = self.omap_lock.get_omap_lock_to_use(context)
+        with omap_lock:
+            ret, bdev_req = self.namespace_add_prepare(request, grps_list, anagrp, context, peer_msg)
+            if ret is not None:
+                return ret
+
+            ret_bdev = self.create_bdev(**bdev_req, context=context, peer_msg=peer_msg)
+            return self.namespace_add_finish(request, ret_bdev, context, peer_msg)
+
+    def namespace_add_check(self, request, context, peer_msg, pending_load=None):
+        """Checks a namespace add request before taking the OMAP lock.
+
+        Returns a tuple of the error status, None if there's no error, the ANA group list and the chosen ANA group."""
+
+        grps_list = []
+        anagrp = 0
         if not request.subsystem_nqn:
             errmsg = f"Failure adding namespace, missing subsystem NQN"
             self.logger.error(f"{errmsg}")
-            return pb2.nsid_status(status=errno.EINVAL, error_message = errmsg)
+            return pb2.nsid_status(status=errno.EINVAL, error_message = errmsg), grps_list, anagrp
 
-        grps_list = []
-        anagrp = 0
-        peer_msg = self.get_peer_message(context)
         nsid_msg = ""
         if request.nsid:
             nsid_msg = f"{request.nsid} "
@@ -1301,7 +1742,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
             if request.anagrpid != 0:
                 grps_list = self.ceph_utils.get_number_created_gateways(self.gateway_pool, self.gateway_group)
             else:
-                anagrp = self.choose_anagrpid_for_namespace(request.nsid)
+                anagrp = self.choose_anagrpid_for_namespace(request.nsid, pending_load)
                 assert anagrp != 0, "Chosen ANA group is 0"
 
             if request.nsid:
@@ -1309,110 +1750,227 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 if not ns.empty():
                     errmsg = f"Failure adding namespace, NSID {request.nsid} is already in use"
                     self.logger.error(f"{errmsg}")
-                    return pb2.nsid_status(status=errno.EEXIST, error_message = errmsg)
+                    return pb2.nsid_status(status=errno.EEXIST, error_message = errmsg), grps_list, anagrp
 
             ns = self.subsystem_nsid_bdev_and_uuid.find_namespace(request.subsystem_nqn, None, request.uuid)
             if not ns.empty():
                  errmsg = f"Failure adding namespace, UUID {request.uuid} is already in use"
                  self.logger.error(f"{errmsg}")
-                 return pb2.nsid_status(status=errno.EEXIST, error_message = errmsg)
+                 return pb2.nsid_status(status=errno.EEXIST, error_message = errmsg), grps_list, anagrp
 
-        omap_lock = self.omap_lock.get_omap_lock_to_use(context)
-        with omap_lock:
-            if context:
-                errmsg, ns_nqn = self.check_if_image_used(request.rbd_pool_name, request.rbd_image_name)
-                if errmsg and ns_nqn:
-                    if request.force:
-                        self.logger.warning(f"{errmsg}, will continue as the \"force\" argument was used")
-                    else:
-                        errmsg = f"{errmsg}, either delete the namespace or use the \"force\" argument,\nyou can find the offending namespace by using the \"namespace list --subsystem {ns_nqn}\" CLI command"
-                        self.logger.error(errmsg)
-                        return pb2.nsid_status(status=errno.EEXIST, error_message=errmsg)
-
-            bdev_name = GatewayService.find_unique_bdev_name(request.uuid)
-
-            create_image = request.create_image
-            if not context:
-                create_image = False
-            else: # new namespace
-                # If an explicit load balancing group was passed, make sure it exists
-                if request.anagrpid != 0:
-                    if request.anagrpid not in grps_list:
-                        self.logger.debug(f"ANA groups: {grps_list}")
-                        errmsg = f"Failure adding namespace {nsid_msg}to {request.subsystem_nqn}: Load balancing group {request.anagrpid} doesn't exist"
-                        self.logger.error(errmsg)
-                        return pb2.req_status(status=errno.ENODEV, error_message=errmsg)
+        return None, grps_list, anagrp
+
+    def namespace_add_prepare(self, request, grps_list, anagrp, context, peer_msg, images_in_batch=None):
+        """Checks a namespace add request under the OMAP lock and sets its ANA group.
+
+        images_in_batch maps the (RBD pool, RBD image) of the namespaces added in the same batch to their subsystem NQN.
+        Returns a tuple of the error status, None if there's no error, and the create_bdev() arguments."""
+
+        nsid_msg = ""
+        if request.nsid:
+            nsid_msg = f"{request.nsid} "
+        if context:
+            errmsg, ns_nqn = self.check_if_image_used(request.rbd_pool_name, request.rbd_image_name)
+            if not ns_nqn and images_in_batch:
+                ns_nqn = images_in_batch.get((request.rbd_pool_name, request.rbd_image_name))
+                if ns_nqn:
+                    errmsg = f"RBD image {request.rbd_pool_name}/{request.rbd_image_name} is already used by a namespace in subsystem {ns_nqn}"
+            if errmsg and ns_nqn:
+                if request.force:
+                    self.logger.warning(f"{errmsg}, will continue as the \"force\" argument was used")
                 else:
-                   request.anagrpid = anagrp
+                    errmsg = f"{errmsg}, either delete the namespace or use the \"force\" argument,\nyou can find the offending namespace by using the \"namespace list --subsystem {ns_nqn}\" CLI command"
+                    self.logger.error(errmsg)
+                    return pb2.nsid_status(status=errno.EEXIST, error_message=errmsg), None
 
-            anagrp = request.anagrpid
-            ret_bdev = self.create_bdev(anagrp, bdev_name, request.uuid, request.rbd_pool_name,
-                                        request.rbd_image_name, request.block_size, create_image, request.size, context, peer_msg)
-            if ret_bdev.status != 0:
-                errmsg = f"Failure adding namespace {nsid_msg}to {request.subsystem_nqn}: {ret_bdev.error_message}"
-                self.logger.error(errmsg)
-                # Delete the bdev unless there was one already there, just to be on the safe side
-                if ret_bdev.status != errno.EEXIST:
-                    ns_bdev = self.get_bdev_info(bdev_name)
-                    if ns_bdev != None:
-                        try:
-                            ret_del = self.delete_bdev(bdev_name, peer_msg = peer_msg)
-                            self.logger.debug(f"delete_bdev({bdev_name}): {ret_del.status}")
-                        except AssertionError:
-                            self.logger.exception(f"Got an assert while trying to delete bdev {bdev_name}")
-                            raise
-                        except Exception:
-                            self.logger.exception(f"Got exception while trying to delete bdev {bdev_name}")
-                return pb2.nsid_status(status=ret_bdev.status, error_message=errmsg)
+        bdev_name = GatewayService.find_unique_bdev_name(request.uuid)
 
-            # If we got here we asserted that ret_bdev.bdev_name == bdev_name
+        create_image = request.create_image
+        if not context:
+            create_image = False
+        else: # new namespace
+            # If an explicit load balancing group was passed, make sure it exists
+            if request.anagrpid != 0:
+                if request.anagrpid not in grps_list:
+                    self.logger.debug("ANA groups: %s", grps_list)
+                    errmsg = f"Failure adding namespace {nsid_msg}to {request.subsystem_nqn}: Load balancing group {request.anagrpid} doesn't exist"
+                    self.logger.error(errmsg)
+                    return pb2.req_status(status=errno.ENODEV, error_message=errmsg), None
+            else:
+               request.anagrpid = anagrp
 
-            ret_ns = self.create_namespace(request.subsystem_nqn, bdev_name, request.nsid, anagrp, request.uuid, request.no_auto_visible, context)
-            if ret_ns.status == 0 and request.nsid and ret_ns.nsid != request.nsid:
-                errmsg = f"Returned NSID {ret_ns.nsid} differs from requested one {request.nsid}"
-                self.logger.error(errmsg)
-                ret_ns.status = errno.ENODEV
-                ret_ns.error_message = errmsg
+        bdev_req = {"anagrp": request.anagrpid, "name": bdev_name, "uuid": request.uuid,
+                    "rbd_pool_name": request.rbd_pool_name, "rbd_image_name": request.rbd_image_name,
+                    "block_size": request.block_size, "create_image": create_image, "rbd_image_size": request.size}
+        return None, bdev_req
 
-            if ret_ns.status != 0:
-                try:
-                    ret_del = self.delete_bdev(bdev_name, peer_msg = peer_msg)
-                    if ret_del.status != 0:
-                        self.logger.warning(f"Failure {ret_del.status} deleting bdev {bdev_name}: {ret_del.error_message}")
-                except AssertionError:
-                    self.logger.exception(f"Got an assert while trying to delete bdev {bdev_name}")
-                    raise
-                except Exception:
-                    self.logger.exception(f"Got exception while trying to delete bdev {bdev_name}")
-                errmsg = f"Failure adding namespace {nsid_msg}to {request.subsystem_nqn}: {ret_ns.error_message}"
-                self.logger.error(errmsg)
-                return pb2.nsid_status(status=ret_ns.status, error_message=errmsg)
+    def namespace_add_finish(self, request, ret_bdev, context, peer_msg):
+        """Adds the namespace of a request to its subsystem once its bdev was created, and persists it."""
 
-            if context:
-                # Update gateway state
-                request.nsid = ret_ns.nsid
-                try:
-                    json_req = json_format.MessageToJson(
-                        request, preserving_proto_field_name=True, including_default_value_fields=True)
-                    self.gateway_state.add_namespace(request.subsystem_nqn, ret_ns.nsid, json_req)
-                except Exception as ex:
-                    errmsg = f"Error persisting namespace {nsid_msg}on {request.subsystem_nqn}"
-                    self.logger.exception(errmsg)
-                    errmsg = f"{errmsg}:\n{ex}"
-                    return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
+        nsid_msg = ""
+        if request.nsid:
+            nsid_msg = f"{request.nsid} "
+        bdev_name = GatewayService.find_unique_bdev_name(request.uuid)
+        anagrp = request.anagrpid
+        if ret_bdev.status != 0:
+            errmsg = f"Failure adding namespace {nsid_msg}to {request.subsystem_nqn}: {ret_bdev.error_message}"
+            self.logger.error(errmsg)
+            # Delete the bdev unless there was one already there, just to be on the safe side
+            if ret_bdev.status != errno.EEXIST:
+                ns_bdev = self.get_bdev_info(bdev_name)
+                if ns_bdev != None:
+                    try:
+                        ret_del = self.delete_bdev(bdev_name, peer_msg = peer_msg)
+                        self.logger.debug("delete_bdev(%s): %s", bdev_name, ret_del.status)
+                    except AssertionError:
+                        self.logger.exception(f"Got an assert while trying to delete bdev {bdev_name}")
+                        raise
+                    except Exception:
+                        self.logger.exception(f"Got exception while trying to delete bdev {bdev_name}")
+            return pb2.nsid_status(status=ret_bdev.status, error_message=errmsg)
 
-        return pb2.nsid_status(status=0, error_message=os.strerror(0), nsid=ret_ns.nsid)
+        # If we got here we asserted that ret_bdev.bdev_name == bdev_name
+
+        ret_ns = self.create_namespace(request.subsystem_nqn, bdev_name, request.nsid, anagrp, request.uuid, request.no_auto_visible, context)
+        if ret_ns.status == 0 and request.nsid and ret_ns.nsid != request.nsid:
+            errmsg = f"Returned NSID {ret_ns.nsid} differs from requested one {request.nsid}"
+            self.logger.error(errmsg)
+            ret_ns.status = errno.ENODEV
+            ret_ns.error_message = errmsg
+
+        if ret_ns.status != 0:
+            try:
+                ret_del = self.delete_bdev(bdev_name, peer_msg = peer_msg)
+                if ret_del.status != 0:
+                    self.logger.warning(f"Failure {ret_del.status} deleting bdev {bdev_name}: {ret_del.error_message}")
+            except AssertionError:
+                self.logger.exception(f"Got an assert while trying to delete bdev {bdev_name}")
+                raise
+            except Exception:
+                self.logger.exception(f"Got exception while trying to delete bdev {bdev_name}")
+            errmsg = f"Failure adding namespace {nsid_msg}to {request.subsystem_nqn}: {ret_ns.error_message}"
+            self.logger.error(errmsg)
+            return pb2.nsid_status(status=ret_ns.status, error_message=errmsg)
+
+        if context:
+            # Update gateway state
+            request.nsid = ret_ns.nsid
+            try:
+                ns_val = self.namespace_add_req_to_state_value(request)
+                self.gateway_state.add_namespace(request.subsystem_nqn, ret_ns.nsid, ns_val)
+                self.namespace_state_cache[(request.subsystem_nqn, ret_ns.nsid)] = (ns_val, request)
+            except Exception as ex:
+                errmsg = f"Error persisting namespace {nsid_msg}on {request.subsystem_nqn}"
+                self.logger.exception(errmsg)
+                errmsg = f"{errmsg}:\n{ex}"
+                return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
+
+        return pb2.nsid_status(status=0, error_message=STRERROR_OK, nsid=ret_ns.nsid)
 
     def namespace_add(self, request, context=None):
         """Adds a namespace to a subsystem."""
         return self.execute_grpc_function(self.namespace_add_safe, request, context)
 
+    def namespace_add_batch_safe(self, requests, context):
+        """Adds several namespaces under a single OMAP lock.
+
+        The bdevs are created with one SPDK batch and the namespaces are persisted with one OMAP write.
+        Returns an nsid_status for each request, in order."""
+
+        peer_msg = self.get_peer_message(context)
+        self.logger.info(f"Received request to add {len(requests)} namespaces, context: {context}{peer_msg}")
+
+        statuses = [None] * len(requests)
+        checked = []
+        pending_load = defaultdict(int)
+        for i, request in enumerate(requests):
+            ret, grps_list, anagrp = self.namespace_add_check(request, context, peer_msg, pending_load)
+            if ret is not None:
+                statuses[i] = ret
+                continue
+            if anagrp:
+                pending_load[anagrp] += 1
+            checked.append((i, grps_list, anagrp))
+
+        omap_lock = self.omap_lock.get_omap_lock_to_use(context)
+        with omap_lock:
+            prepared = []
+            bdev_reqs = []
+            images_in_batch = {}
+            for i, grps_list, anagrp in checked:
+                request = requests[i]
+                ret, bdev_req = self.namespace_add_prepare(request, grps_list, anagrp, context, peer_msg, images_in_batch)
+                if ret is not None:
+                    statuses[i] = ret
+                    continue
+                images_in_batch.setdefault((request.rbd_pool_name, request.rbd_image_name), request.subsystem_nqn)
+                prepared.append(i)
+                bdev_reqs.append(bdev_req)
+
+            ret_bdevs = self.create_bdevs_batch(bdev_reqs, context, peer_msg)
+            try:
+                with self.gateway_state.batched_writes() if context else contextlib.nullcontext():
+                    for i, ret_bdev in zip(prepared, ret_bdevs):
+                        statuses[i] = self.namespace_add_finish(requests[i], ret_bdev, context, peer_msg)
+            except Exception as ex:
+                errmsg = f"Error persisting namespaces on {', '.join(sorted({requests[i].subsystem_nqn for i in prepared}))}"
+                self.logger.exception(errmsg)
+                errmsg = f"{errmsg}:\n{ex}"
+                for i in prepared:
+                    if statuses[i] is None:
+                        statuses[i] = pb2.nsid_status(status=errno.EINVAL, error_message=errmsg)
+                    elif statuses[i].status == 0:
+                        # The namespace was added but not persisted, take it out of SPDK again
+                        statuses[i] = self.namespace_add_rollback(requests[i].subsystem_nqn, statuses[i].nsid,
+                                                                  errmsg, context, peer_msg)
+
+        # Some failures are reported as req_status, the stream only carries nsid_status
+        return [ret if isinstance(ret, pb2.nsid_status) else pb2.nsid_status(status=ret.status, error_message=ret.error_message)
+                for ret in statuses]
+
+    def namespace_add_rollback(self, subsystem_nqn, nsid, errmsg, context, peer_msg):
+        """Removes a namespace, and its bdev, which was added to SPDK but couldn't be persisted.
+
+        Returns the status to report for the namespace, saying whether it's still in SPDK."""
+
+        self.namespace_state_cache.pop((subsystem_nqn, nsid), None)
+        find_ret = self.subsystem_nsid_bdev_and_uuid.find_namespace(subsystem_nqn, nsid)
+        ret = self.remove_namespace(subsystem_nqn, nsid, context)
+        if ret.status != 0:
+            errmsg = f"{errmsg}\nNamespace {nsid} is still in {subsystem_nqn} but isn't persisted: {ret.error_message}"
+            self.logger.error(errmsg)
+            return pb2.nsid_status(status=errno.EINVAL, error_message=errmsg, nsid=nsid)
+
+        self.subsystem_nsid_bdev_and_uuid.remove_namespace(subsystem_nqn, nsid)
+        if find_ret.bdev:
+            ret_del = self.delete_bdev(find_ret.bdev, peer_msg = peer_msg)
+            if ret_del.status != 0:
+                errmsg = f"{errmsg}\nNamespace {nsid} was removed from {subsystem_nqn} but its bdev {find_ret.bdev} wasn't deleted: {ret_del.error_message}"
+                self.logger.error(errmsg)
+        return pb2.nsid_status(status=errno.EINVAL, error_message=errmsg)
+
+    def namespace_add_stream(self, request_iterator, context=None):
+        """Adds the namespaces sent over a stream, returning a status for each one, in order.
+
+        The requests are handled in batches of up to namespace_add_stream_batch_size, so the
+        statuses of a batch are only sent once it's full or the client ends the stream."""
+
+        batch = []
+        for request in request_iterator:
+            batch.append(request)
+            if len(batch) >= self.namespace_add_stream_batch_size:
+                yield from self.execute_grpc_function(self.namespace_add_batch_safe, batch, context)
+                batch = []
+        if batch:
+            yield from self.execute_grpc_function(self.namespace_add_batch_safe, batch, context)
+
     def namespace_change_load_balancing_group_safe(self, request, context):
         """Changes a namespace load balancing group."""
 
         grps_list = []
         peer_msg = self.get_peer_message(context)
-        change_lb_group_failure_prefix = f"Failure changing load balancing group for namespace with NSID {request.nsid} in {request.subsystem_nqn}"
+        def change_lb_group_failure_prefix():
+            return f"Failure changing load balancing group for namespace with NSID {request.nsid} in {request.subsystem_nqn}"
         self.logger.info(f"Received request to change load balancing group for namespace with NSID {request.nsid} in {request.subsystem_nqn} to {request.anagrpid}, context: {context}{peer_msg}")
 
         if not request.subsystem_nqn:
@@ -1427,8 +1985,8 @@ class GatewayService(pb2_grpc.GatewayServicer):
 
         grps_list = self.ceph_utils.get_number_created_gateways(self.gateway_pool, self.gateway_group)
         if request.anagrpid not in grps_list:
-            self.logger.debug(f"ANA groups: {grps_list}")
-            errmsg = f"{change_lb_group_failure_prefix}: Load balancing group {request.anagrpid} doesn't exist"
+            self.logger.debug("ANA groups: %s", grps_list)
+            errmsg = f"{change_lb_group_failure_prefix()}: Load balancing group {request.anagrpid} doesn't exist"
             self.logger.error(errmsg)
             return pb2.req_status(status=errno.ENODEV, error_message=errmsg)
 
@@ -1440,18 +1998,17 @@ class GatewayService(pb2_grpc.GatewayServicer):
             if context:
                 # notice that the local state might not be up to date in case we're in the middle of update() but as the
                 # context is not None, we are not in an update(), the omap lock made sure that we got here with an updated local state
-                state = self.gateway_state.local.get_state()
                 ns_key = GatewayState.build_namespace_key(request.subsystem_nqn, request.nsid)
                 try:
-                    state_ns = state[ns_key]
-                    ns_entry = json.loads(state_ns)
+                    state_ns = self.gateway_state.local.get_one(ns_key)
+                    ns_entry = self.get_cached_namespace_state(request.subsystem_nqn, request.nsid, state_ns)
                 except Exception as ex:
-                    errmsg = f"{change_lb_group_failure_prefix}: Can't find entry for namespace {request.nsid} in {request.subsystem_nqn}"
+                    errmsg = f"{change_lb_group_failure_prefix()}: Can't find entry for namespace {request.nsid} in {request.subsystem_nqn}"
                     self.logger.error(errmsg)
                     return pb2.req_status(status=errno.ENOENT, error_message=errmsg)
-                anagrp = ns_entry["anagrpid"]
+                anagrp = ns_entry.anagrpid
                 gw_id = self.ceph_utils.get_gw_id_owner_ana_group(self.gateway_pool, self.gateway_group, anagrp)
-                self.logger.debug(f"ANA group of ns#{request.nsid} - {anagrp} is owned by gateway {gw_id}, self.name is {self.gateway_name}")
+                self.logger.debug("ANA group of ns#%s - %s is owned by gateway %s, self.name is %s", request.nsid, anagrp, gw_id, self.gateway_name)
                 if self.gateway_name != gw_id:
                     errmsg = f"ANA group of ns#{request.nsid} - {anagrp} is owned by gateway {gw_id} so try this command from it, this gateway name is {self.gateway_name}"
                     self.logger.error(errmsg)
@@ -1465,56 +2022,51 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     anagrpid=request.anagrpid,
                     transit_anagrpid=0
                 )
-                self.logger.debug(f"nvmf_subsystem_set_ns_ana_group: {ret}")
+                self.logger.debug("nvmf_subsystem_set_ns_ana_group: %s", ret)
                 if not find_ret.empty():
                     find_ret.set_ana_group_id(request.anagrpid)
             except Exception as ex:
-                errmsg = f"{change_lb_group_failure_prefix}:\n{ex}"
-                resp = self.parse_json_exeption(ex)
+                prefix = change_lb_group_failure_prefix()
+                errmsg = f"{prefix}:\n{ex}"
+                resp = self.parse_json_exception(ex)
                 status = errno.EINVAL
                 if resp:
                     status = resp["code"]
-                    errmsg = f"{change_lb_group_failure_prefix}: {resp['message']}"
+                    errmsg = f"{prefix}: {resp['message']}"
                 return pb2.req_status(status=status, error_message=errmsg)
 
             # Just in case SPDK failed with no exception
             if not ret:
-                self.logger.error(change_lb_group_failure_prefix)
-                return pb2.req_status(status=errno.EINVAL, error_message=change_lb_group_failure_prefix)
+                prefix = change_lb_group_failure_prefix()
+                self.logger.error(prefix)
+                return pb2.req_status(status=errno.EINVAL, error_message=prefix)
 
             if context:
                 assert ns_entry, "Namespace entry is None for non-update call"
                 # Update gateway state
                 try:
-                    add_req = pb2.namespace_add_req(rbd_pool_name=ns_entry["rbd_pool_name"],
-                                                    rbd_image_name=ns_entry["rbd_image_name"],
-                                                    subsystem_nqn=ns_entry["subsystem_nqn"],
-                                                    nsid=ns_entry["nsid"],
-                                                    block_size=ns_entry["block_size"],
-                                                    uuid=ns_entry["uuid"],
-                                                    anagrpid=request.anagrpid,
-                                                    create_image=ns_entry["create_image"],
-                                                    size=int(ns_entry["size"]),
-                                                    force=ns_entry["force"],
-                                                    no_auto_visible=ns_entry["no_auto_visible"])
-                    json_req = json_format.MessageToJson(
-                        add_req, preserving_proto_field_name=True, including_default_value_fields=True)
-                    self.gateway_state.add_namespace(request.subsystem_nqn, request.nsid, json_req)
+                    add_req = pb2.namespace_add_req()
+                    add_req.CopyFrom(ns_entry)
+                    add_req.anagrpid = request.anagrpid
+                    ns_val = self.namespace_add_req_to_state_value(add_req)
+                    self.gateway_state.add_namespace(request.subsystem_nqn, request.nsid, ns_val)
+                    self.namespace_state_cache[(request.subsystem_nqn, request.nsid)] = (ns_val, add_req)
                 except Exception as ex:
                     errmsg = f"Error persisting namespace load balancing group for namespace with NSID {request.nsid} in {request.subsystem_nqn}"
                     self.logger.exception(errmsg)
                     errmsg = f"{errmsg}:\n{ex}"
                     return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def namespace_change_load_balancing_group(self, request, context=None):
         """Changes a namespace load balancing group."""
         return self.execute_grpc_function(self.namespace_change_load_balancing_group_safe, request, context)
 
     def remove_namespace_from_state(self, nqn, nsid, context):
+        self.namespace_state_cache.pop((nqn, nsid), None)
         if not context:
-            return pb2.req_status(status=0, error_message=os.strerror(0))
+            return pb2.req_status(status=0, error_message=STRERROR_OK)
 
         # If we got here context is not None, so we must hold the OMAP lock
         assert self.omap_lock.locked(), "OMAP is unlocked when calling remove_namespace_from_state()"
@@ -1541,7 +2093,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
             self.logger.exception(errmsg)
             errmsg = f"{errmsg}:\n{ex}"
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def remove_namespace(self, subsystem_nqn, nsid, context):
         """Removes a namespace from a subsystem."""
@@ -1549,11 +2101,12 @@ class GatewayService(pb2_grpc.GatewayServicer):
         if context:
             assert self.omap_lock.locked(), "OMAP is unlocked when calling remove_namespace()"
         peer_msg = self.get_peer_message(context)
-        namespace_failure_prefix = f"Failure removing namespace {nsid} from {subsystem_nqn}"
+        def namespace_failure_prefix():
+            return f"Failure removing namespace {nsid} from {subsystem_nqn}"
         self.logger.info(f"Received request to remove namespace {nsid} from {subsystem_nqn}{peer_msg}")
 
         if GatewayUtils.is_discovery_nqn(subsystem_nqn):
-            errmsg=f"{namespace_failure_prefix}: Can't remove a namespace from a discovery subsystem"
+            errmsg=f"{namespace_failure_prefix()}: Can't remove a namespace from a discovery subsystem"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
@@ -1563,23 +2116,61 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 nqn=subsystem_nqn,
                 nsid=nsid,
             )
-            self.logger.debug(f"remove_namespace {nsid}: {ret}")
+            self.logger.debug("remove_namespace %s: %s", nsid, ret)
         except Exception as ex:
-            self.logger.exception(namespace_failure_prefix)
-            errmsg = f"{namespace_failure_prefix}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
+            prefix = namespace_failure_prefix()
+            self.logger.exception(prefix)
+            errmsg = f"{prefix}:\n{ex}"
+            resp = self.parse_json_exception(ex)
             status = errno.EINVAL
             if resp:
                 status = resp["code"]
-                errmsg = f"{namespace_failure_prefix}: {resp['message']}"
+                errmsg = f"{prefix}: {resp['message']}"
             return pb2.req_status(status=status, error_message=errmsg)
 
         # Just in case SPDK failed with no exception
         if not ret:
-            self.logger.error(namespace_failure_prefix)
-            return pb2.req_status(status=errno.EINVAL, error_message=namespace_failure_prefix)
+            prefix = namespace_failure_prefix()
+            self.logger.error(prefix)
+            return pb2.req_status(status=errno.EINVAL, error_message=prefix)
+
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
+
+    def get_subsystems_cached(self, nqn, max_age=None):
+        """Get nvmf_get_subsystems() result for a subsystem, reusing a recent one
+
+        A cached result is used only if it is at most max_age seconds old (by default, the configured
+        subsystems_cache_ttl_ms) and no SPDK call which might have changed the state was made since.
+        The returned list is shared, callers shouldn't modify it."""
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        assert self.rpc_lock.locked(), "RPC is unlocked when calling get_subsystems_cached()"
+        ret = self.find_cached_subsystems(nqn, max_age)
+        if ret is None:
+            ret = rpc_nvmf.nvmf_get_subsystems(self.spdk_rpc_client, nqn=nqn)
+            self.cache_subsystems(nqn, ret)
+        return ret
+
+    def find_cached_subsystems(self, nqn, max_age=None):
+        """Returns the cached nvmf_get_subsystems() result for a subsystem if it's still valid, None otherwise"""
+        if max_age is None:
+            max_age = self.subsystems_cache_max_age
+        if max_age <= 0:
+            return None
+        modify_count = getattr(self.spdk_rpc_client, "modify_count", None)
+        cached = self.subsystems_cache.get(nqn)
+        if cached and modify_count is not None:
+            fetch_time, fetch_modify_count, ret = cached
+            if fetch_modify_count == modify_count and time.monotonic() - fetch_time <= max_age:
+                return ret
+        return None
+
+    def cache_subsystems(self, nqn, ret):
+        """Caches an nvmf_get_subsystems() result for a subsystem, which was just fetched from SPDK"""
+        modify_count = getattr(self.spdk_rpc_client, "modify_count", None)
+        if modify_count is None:
+            self.subsystems_cache.pop(nqn, None)
+        else:
+            self.subsystems_cache[nqn] = (time.monotonic(), modify_count, ret)
 
     def get_bdev_info(self, bdev_name):
         """Get bdev info"""
@@ -1596,20 +2187,49 @@ class GatewayService(pb2_grpc.GatewayServicer):
 
         return ret_bdev
 
+    def get_bdevs_info(self, bdev_names):
+        """Get info of several bdevs, in a single round-trip to SPDK"""
+
+        assert self.rpc_lock.locked(), "RPC is unlocked when calling get_bdevs_info()"
+        ret_bdevs = {}
+        if not bdev_names:
+            return ret_bdevs
+
+        if len(bdev_names) >= GatewayService.BULK_BDEV_LIST_THRESHOLD:
+            try:
+                all_bdevs = {b["name"]: b for b in rpc_bdev.bdev_get_bdevs(self.spdk_rpc_client)}
+            except Exception:
+                self.logger.exception(f"Got exception while getting bdevs info")
+                return ret_bdevs
+            for bdev_name in bdev_names:
+                bdev = all_bdevs.get(bdev_name)
+                if bdev:
+                    ret_bdevs[bdev_name] = bdev
+            return ret_bdevs
+
+        try:
+            results = self.spdk_rpc_client.batch_call([("bdev_get_bdevs", {"name": bdev_name}) for bdev_name in bdev_names])
+        except Exception:
+            self.logger.exception(f"Got exception while getting bdevs {bdev_names} info")
+            return ret_bdevs
+
+        for bdev_name, bdevs in zip(bdev_names, results):
+            if isinstance(bdevs, Exception):
+                self.logger.error(f"Got exception while getting bdev {bdev_name} info:\n{bdevs}")
+                continue
+            if not bdevs:
+                continue
+            if (len(bdevs) > 1):
+                self.logger.warning(f"Got {len(bdevs)} bdevs for bdev name {bdev_name}, will use the first one")
+            ret_bdevs[bdev_name] = bdevs[0]
+
+        return ret_bdevs
+
     def list_namespaces(self, request, context=None):
         """List namespaces."""
 
         peer_msg = self.get_peer_message(context)
-        if request.nsid == None or request.nsid == 0:
-            if request.uuid:
-                nsid_msg = f"namespace with UUID {request.uuid}"
-            else:
-                nsid_msg = "all namespaces"
-        else:
-            if request.uuid:
-                nsid_msg = f"namespace with NSID {request.nsid} and UUID {request.uuid}"
-            else:
-                nsid_msg = f"namespace with NSID {request.nsid}"
+        nsid_msg = NSID_MSGS[(bool(request.nsid), bool(request.uuid))].format(nsid=request.nsid, uuid=request.uuid)
         self.logger.info(f"Received request to list {nsid_msg} for {request.subsystem}, context: {context}{peer_msg}")
 
         if not request.subsystem:
@@ -1619,13 +2239,13 @@ class GatewayService(pb2_grpc.GatewayServicer):
 
         with self.rpc_lock:
             try:
-                ret = rpc_nvmf.nvmf_get_subsystems(self.spdk_rpc_client, nqn=request.subsystem)
-                self.logger.debug(f"list_namespaces: {ret}")
+                ret = self.get_subsystems_cached(request.subsystem)
+                self.logger.debug("list_namespaces: %s", ret)
             except Exception as ex:
                 errmsg = f"Failure listing namespaces"
                 self.logger.exception(errmsg)
                 errmsg = f"{errmsg}:\n{ex}"
-                resp = self.parse_json_exeption(ex)
+                resp = self.parse_json_exception(ex)
                 status = errno.EINVAL
                 if resp:
                     status = resp["code"]
@@ -1633,72 +2253,66 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 return pb2.namespaces_info(status=status, error_message=errmsg, subsystem_nqn=request.subsystem, namespaces=[])
 
         namespaces = []
-        for s in ret:
+        s = next((x for x in ret if x.get("nqn") == request.subsystem), None)
+        if s is None:
+            self.logger.warning(f"Subsystem {request.subsystem} is missing from SPDK's response")
+        else:
             try:
-                if s["nqn"] != request.subsystem:
-                    self.logger.warning(f'Got subsystem {s["nqn"]} instead of {request.subsystem}, ignore')
-                    continue
-                try:
-                    ns_list = s["namespaces"]
-                except Exception:
-                    ns_list = []
-                    pass
+                ns_list = s.get("namespaces") or []
                 if not ns_list:
                     self.subsystem_nsid_bdev_and_uuid.remove_namespace(request.subsystem)
+                listed_bdevs = [n["bdev_name"] for n in ns_list
+                                if (not request.nsid or request.nsid == n["nsid"]) and (not request.uuid or request.uuid == n["uuid"])]
+                with self.rpc_lock:
+                    ns_bdevs = self.get_bdevs_info(listed_bdevs)
                 for n in ns_list:
                     nsid = n["nsid"]
                     bdev_name = n["bdev_name"]
                     if request.nsid and request.nsid != n["nsid"]:
-                        self.logger.debug(f'Filter out namespace {n["nsid"]} which is different than requested nsid {request.nsid}')
+                        self.logger.debug("Filter out namespace %s which is different than requested nsid %s", n["nsid"], request.nsid)
                         continue
                     if request.uuid and request.uuid != n["uuid"]:
-                        self.logger.debug(f'Filter out namespace with UUID {n["uuid"]} which is different than requested UUID {request.uuid}')
+                        self.logger.debug("Filter out namespace with UUID %s which is different than requested UUID %s", n["uuid"], request.uuid)
                         continue
-                    lb_group = 0
-                    try:
-                        lb_group = n["anagrpid"]
-                    except KeyError:
-                        pass
+                    lb_group = n.get("anagrpid", 0)
                     find_ret = self.subsystem_nsid_bdev_and_uuid.find_namespace(request.subsystem, nsid)
                     if find_ret.empty():
                         self.logger.warning(f"Can't find info of namesapce {nsid} in {request.subsystem}. Visibility status will be inaccurate")
                     no_auto_visible = find_ret.no_auto_visible
-                    one_ns = pb2.namespace_cli(nsid = nsid,
-                                           bdev_name = bdev_name,
-                                           uuid = n["uuid"],
-                                           load_balancing_group = lb_group,
-                                           no_auto_visible = no_auto_visible,
-                                           hosts = find_ret.host_list)
-                    with self.rpc_lock:
-                        ns_bdev = self.get_bdev_info(bdev_name)
+                    ns_fields = {"nsid": nsid,
+                                 "bdev_name": bdev_name,
+                                 "uuid": n["uuid"],
+                                 "load_balancing_group": lb_group,
+                                 "no_auto_visible": no_auto_visible,
+                                 "hosts": find_ret.host_list}
+                    ns_bdev = ns_bdevs.get(bdev_name)
                     if ns_bdev == None:
                         self.logger.warning(f"Can't find namespace's bdev {bdev_name}, will not list bdev's information")
                     else:
                         try:
                             drv_specific_info = ns_bdev["driver_specific"]
                             rbd_info = drv_specific_info["rbd"]
-                            one_ns.rbd_image_name = rbd_info["rbd_name"]
-                            one_ns.rbd_pool_name = rbd_info["pool_name"]
-                            one_ns.block_size = ns_bdev["block_size"]
-                            one_ns.rbd_image_size = ns_bdev["block_size"] * ns_bdev["num_blocks"]
+                            ns_fields["rbd_image_name"] = rbd_info["rbd_name"]
+                            ns_fields["rbd_pool_name"] = rbd_info["pool_name"]
+                            ns_fields["block_size"] = ns_bdev["block_size"]
+                            ns_fields["rbd_image_size"] = ns_bdev["block_size"] * ns_bdev["num_blocks"]
                             assigned_limits = ns_bdev["assigned_rate_limits"]
-                            one_ns.rw_ios_per_second=assigned_limits["rw_ios_per_sec"]
-                            one_ns.rw_mbytes_per_second=assigned_limits["rw_mbytes_per_sec"]
-                            one_ns.r_mbytes_per_second=assigned_limits["r_mbytes_per_sec"]
-                            one_ns.w_mbytes_per_second=assigned_limits["w_mbytes_per_sec"]
+                            ns_fields["rw_ios_per_second"] = assigned_limits["rw_ios_per_sec"]
+                            ns_fields["rw_mbytes_per_second"] = assigned_limits["rw_mbytes_per_sec"]
+                            ns_fields["r_mbytes_per_second"] = assigned_limits["r_mbytes_per_sec"]
+                            ns_fields["w_mbytes_per_second"] = assigned_limits["w_mbytes_per_sec"]
                         except KeyError as err:
                             self.logger.warning(f"Key {err} is not found, will not list bdev's information") 
                             pass
                         except Exception:
                             self.logger.exception(f"{ns_bdev=} parse error") 
                             pass
-                    namespaces.append(one_ns)
-                break
+                    namespaces.append(pb2.namespace_cli(**ns_fields))
             except Exception:
                 self.logger.exception(f"{s=} parse error")
                 pass
 
-        return pb2.namespaces_info(status = 0, error_message = os.strerror(0), subsystem_nqn=request.subsystem, namespaces=namespaces)
+        return pb2.namespaces_info(status = 0, error_message = STRERROR_OK, subsystem_nqn=request.subsystem, namespaces=namespaces)
 
     def namespace_get_io_stats(self, request, context=None):
         """Get namespace's IO stats."""
@@ -1728,17 +2342,19 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 self.logger.error(errmsg)
                 return pb2.namespace_io_stats_info(status=errno.ENODEV, error_message=errmsg)
 
+        # Stats are read through their own SPDK clients, so polling them doesn't wait for rpc_lock
+        with self.spdk_rpc_stats_client() as stats_client:
             try:
                 ret = rpc_bdev.bdev_get_iostat(
-                    self.spdk_rpc_client,
+                    stats_client,
                     name=bdev_name,
                 )
-                self.logger.debug(f"get_bdev_iostat {bdev_name}: {ret}")
+                self.logger.debug("get_bdev_iostat %s: %s", bdev_name, ret)
             except Exception as ex:
                 errmsg = f"Failure getting IO stats for namespace {request.nsid} on {request.subsystem_nqn}"
                 self.logger.exception(errmsg)
                 errmsg = f"{errmsg}:\n{ex}"
-                resp = self.parse_json_exeption(ex)
+                resp = self.parse_json_exception(ex)
                 status = errno.EINVAL
                 if resp:
                     status = resp["code"]
@@ -1760,41 +2376,18 @@ class GatewayService(pb2_grpc.GatewayServicer):
             if len(bdevs) > 1:
                 self.logger.warning(f"More than one associated block device found for namespace, will use the first one")
             bdev = bdevs[0]
-            io_errs = []
-            try:
-                io_error=bdev["io_error"]
-                for err_name in io_error.keys():
-                    one_error = pb2.namespace_io_error(name=err_name, value=io_error[err_name])
-                    io_errs.append(one_error)
-            except Exception:
-                self.logger.exception(f"failure getting io errors")
+            io_errs = [pb2.namespace_io_error(name=err_name, value=err_val) for err_name, err_val in bdev.get("io_error", {}).items()]
+            io_counters = {k: bdev[k] for k in IOSTAT_KEYS}
             io_stats = pb2.namespace_io_stats_info(status=0,
-                               error_message=os.strerror(0),
+                               error_message=STRERROR_OK,
                                subsystem_nqn=request.subsystem_nqn,
                                nsid=request.nsid,
                                uuid=uuid,
                                bdev_name=bdev_name,
                                tick_rate=ret["tick_rate"],
                                ticks=ret["ticks"],
-                               bytes_read=bdev["bytes_read"],
-                               num_read_ops=bdev["num_read_ops"],
-                               bytes_written=bdev["bytes_written"],
-                               num_write_ops=bdev["num_write_ops"],
-                               bytes_unmapped=bdev["bytes_unmapped"],
-                               num_unmap_ops=bdev["num_unmap_ops"],
-                               read_latency_ticks=bdev["read_latency_ticks"],
-                               max_read_latency_ticks=bdev["max_read_latency_ticks"],
-                               min_read_latency_ticks=bdev["min_read_latency_ticks"],
-                               write_latency_ticks=bdev["write_latency_ticks"],
-                               max_write_latency_ticks=bdev["max_write_latency_ticks"],
-                               min_write_latency_ticks=bdev["min_write_latency_ticks"],
-                               unmap_latency_ticks=bdev["unmap_latency_ticks"],
-                               max_unmap_latency_ticks=bdev["max_unmap_latency_ticks"],
-                               min_unmap_latency_ticks=bdev["min_unmap_latency_ticks"],
-                               copy_latency_ticks=bdev["copy_latency_ticks"],
-                               max_copy_latency_ticks=bdev["max_copy_latency_ticks"],
-                               min_copy_latency_ticks=bdev["min_copy_latency_ticks"],
-                               io_error=io_errs)
+                               io_error=io_errs,
+                               **io_counters)
             return io_stats
         except Exception as ex:
             self.logger.exception(f"parse error")
@@ -1802,18 +2395,18 @@ class GatewayService(pb2_grpc.GatewayServicer):
             pass
 
         return pb2.namespace_io_stats_info(status=errno.EINVAL,
-                               error_message=f"Failure getting IO stats for namespace {nsid_msg}on {request.subsystem_nqn}: Error parsing returned stats:\n{exmsg}") 
+                               error_message=f"Failure getting IO stats for namespace {request.nsid} on {request.subsystem_nqn}: Error parsing returned stats:\n{exmsg}") 
+
+    @staticmethod
+    def get_qos_fields(request):
+        """Get the QOS limits set in a request, as a field name to value dict"""
+        return {fd.name: val for fd, val in request.ListFields() if fd.name in QOS_LIMITS}
 
-    def get_qos_limits_string(self, request):
+    def get_qos_limits_string(self, qos_fields):
         limits_to_set = ""
-        if request.HasField("rw_ios_per_second"):
-            limits_to_set += f" R/W IOs per second: {request.rw_ios_per_second}"
-        if request.HasField("rw_mbytes_per_second"):
-            limits_to_set += f" R/W megabytes per second: {request.rw_mbytes_per_second}"
-        if request.HasField("r_mbytes_per_second"):
-            limits_to_set += f" Read megabytes per second: {request.r_mbytes_per_second}"
-        if request.HasField("w_mbytes_per_second"):
-            limits_to_set += f" Write megabytes per second: {request.w_mbytes_per_second}"
+        for field_name, limit_desc in QOS_LIMITS.items():
+            if field_name in qos_fields:
+                limits_to_set += f" {limit_desc}: {qos_fields[field_name]}"
 
         return limits_to_set
 
@@ -1821,7 +2414,8 @@ class GatewayService(pb2_grpc.GatewayServicer):
         """Set namespace's qos limits."""
 
         peer_msg = self.get_peer_message(context)
-        limits_to_set = self.get_qos_limits_string(request)
+        qos_fields = GatewayService.get_qos_fields(request)
+        limits_to_set = self.get_qos_limits_string(qos_fields)
         self.logger.info(f"Received request to set QOS limits for namespace {request.nsid} on {request.subsystem_nqn},{limits_to_set}, context: {context}{peer_msg}")
 
         if not request.nsid:
@@ -1845,53 +2439,44 @@ class GatewayService(pb2_grpc.GatewayServicer):
             self.logger.error(errmsg)
             return pb2.req_status(status=errno.ENODEV, error_message=errmsg)
 
-        set_qos_limits_args = {}
-        set_qos_limits_args["name"] = bdev_name
-        if request.HasField("rw_ios_per_second"):
-            set_qos_limits_args["rw_ios_per_sec"] = request.rw_ios_per_second
-        if request.HasField("rw_mbytes_per_second"):
-            set_qos_limits_args["rw_mbytes_per_sec"] = request.rw_mbytes_per_second
-        if request.HasField("r_mbytes_per_second"):
-            set_qos_limits_args["r_mbytes_per_sec"] = request.r_mbytes_per_second
-        if request.HasField("w_mbytes_per_second"):
-            set_qos_limits_args["w_mbytes_per_sec"] = request.w_mbytes_per_second
-
         ns_qos_entry = None
         if context:
-            state = self.gateway_state.local.get_state()
             ns_qos_key = GatewayState.build_namespace_qos_key(request.subsystem_nqn, request.nsid)
             try:
-                state_ns_qos = state[ns_qos_key]
-                ns_qos_entry = json.loads(state_ns_qos)
+                state_ns_qos = self.gateway_state.local.get_one(ns_qos_key)
+                ns_qos_entry = json_loads(state_ns_qos)
             except Exception as ex:
                 self.logger.info(f"No previous QOS limits found, this is the first time the limits are set for namespace {request.nsid} on {request.subsystem_nqn}")
 
         # Merge current limits with previous ones, if exist
+        merged_fields = qos_fields
         if ns_qos_entry:
-            if not request.HasField("rw_ios_per_second") and ns_qos_entry.get("rw_ios_per_second") != None:
-                request.rw_ios_per_second = int(ns_qos_entry["rw_ios_per_second"])
-            if not request.HasField("rw_mbytes_per_second") and ns_qos_entry.get("rw_mbytes_per_second") != None:
-                request.rw_mbytes_per_second = int(ns_qos_entry["rw_mbytes_per_second"])
-            if not request.HasField("r_mbytes_per_second") and ns_qos_entry.get("r_mbytes_per_second") != None:
-                request.r_mbytes_per_second = int(ns_qos_entry["r_mbytes_per_second"])
-            if not request.HasField("w_mbytes_per_second") and ns_qos_entry.get("w_mbytes_per_second") != None:
-                request.w_mbytes_per_second = int(ns_qos_entry["w_mbytes_per_second"])
-
-            limits_to_set = self.get_qos_limits_string(request)
-            self.logger.debug(f"After merging current QOS limits with previous ones for namespace {request.nsid} on {request.subsystem_nqn},{limits_to_set}")
+            merged_fields = dict(qos_fields)
+            for field_name in QOS_LIMITS:
+                if field_name not in merged_fields and ns_qos_entry.get(field_name) != None:
+                    merged_fields[field_name] = int(ns_qos_entry[field_name])
+                    setattr(request, field_name, merged_fields[field_name])
+
+            limits_to_set = self.get_qos_limits_string(merged_fields)
+            self.logger.debug("After merging current QOS limits with previous ones for namespace %s on %s,%s", request.nsid, request.subsystem_nqn, limits_to_set)
 
         omap_lock = self.omap_lock.get_omap_lock_to_use(context)
         with omap_lock:
             try:
+                # SPDK only gets the limits set in the request, the rest are None and left out of the call
                 ret = rpc_bdev.bdev_set_qos_limit(
                     self.spdk_rpc_client,
-                    **set_qos_limits_args)
-                self.logger.debug(f"bdev_set_qos_limit {bdev_name}: {ret}")
+                    name=bdev_name,
+                    rw_ios_per_sec=qos_fields.get("rw_ios_per_second"),
+                    rw_mbytes_per_sec=qos_fields.get("rw_mbytes_per_second"),
+                    r_mbytes_per_sec=qos_fields.get("r_mbytes_per_second"),
+                    w_mbytes_per_sec=qos_fields.get("w_mbytes_per_second"))
+                self.logger.debug("bdev_set_qos_limit %s: %s", bdev_name, ret)
             except Exception as ex:
                 errmsg = f"Failure setting QOS limits for namespace {request.nsid} on {request.subsystem_nqn}"
                 self.logger.exception(errmsg)
                 errmsg = f"{errmsg}:\n{ex}"
-                resp = self.parse_json_exeption(ex)
+                resp = self.parse_json_exception(ex)
                 status = errno.EINVAL
                 if resp:
                     status = resp["code"]
@@ -1907,8 +2492,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
             if context:
                 # Update gateway state
                 try:
-                    json_req = json_format.MessageToJson(
-                        request, preserving_proto_field_name=True, including_default_value_fields=True)
+                    json_req = GatewayService.request_to_state_json(request)
                     self.gateway_state.add_namespace_qos(request.subsystem_nqn, request.nsid, json_req)
                 except Exception as ex:
                     errmsg = f"Error persisting namespace QOS settings {request.nsid} on {request.subsystem_nqn}"
@@ -1916,7 +2500,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     errmsg = f"{errmsg}:\n{ex}"
                     return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def namespace_set_qos_limits(self, request, context=None):
         """Set namespace's qos limits."""
@@ -1957,7 +2541,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
         ret = self.resize_bdev(bdev_name, request.new_size, peer_msg)
 
         if ret.status == 0:
-            errmsg = os.strerror(0)
+            errmsg = STRERROR_OK
         else:
             errmsg = f"Failure resizing namespace {request.nsid} on {request.subsystem_nqn}: {ret.error_message}"
             self.logger.error(errmsg)
@@ -2008,7 +2592,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     self.logger.error(errmsg)
                     return pb2.nsid_status(status=ret_del.status, error_message=errmsg)
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def namespace_delete(self, request, context=None):
         """Delete a namespace."""
@@ -2052,12 +2636,13 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 self.logger.error(f"{errmsg}")
                 return pb2.req_status(status = rc[0], error_message = errmsg)
 
-        if GatewayUtils.is_discovery_nqn(request.subsystem_nqn):
+        subsys_is_discovery, host_is_discovery = GatewayUtils.discovery_flags(request.subsystem_nqn, request.host_nqn)
+        if subsys_is_discovery:
             errmsg = f"Failure adding host to namespace {request.nsid} on {request.subsystem_nqn}, subsystem NQN can't be a discovery NQN"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        if GatewayUtils.is_discovery_nqn(request.host_nqn):
+        if host_is_discovery:
             errmsg = f"Failure adding host to namespace {request.nsid} on {request.subsystem_nqn}, host NQN can't be a discovery NQN"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
@@ -2083,7 +2668,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 nsid=request.nsid,
                 host=request.host_nqn
             )
-            self.logger.debug(f"ns_visible {request.host_nqn}: {ret}")
+            self.logger.debug("ns_visible %s: %s", request.host_nqn, ret)
             if not find_ret.empty():
                 find_ret.add_host(request.host_nqn)
 
@@ -2096,8 +2681,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
             if context:
                 # Update gateway state
                 try:
-                    json_req = json_format.MessageToJson(
-                        request, preserving_proto_field_name=True, including_default_value_fields=True)
+                    json_req = GatewayService.request_to_state_json(request)
                     self.gateway_state.add_namespace_host(request.subsystem_nqn, request.nsid, request.host_nqn, json_req)
                 except Exception as ex:
                     errmsg = f"Error persisting host {request.host_nqn} for namespace {request.nsid} on {request.subsystem_nqn}"
@@ -2105,7 +2689,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     errmsg = f"{errmsg}:\n{ex}"
                     return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def namespace_add_host(self, request, context=None):
         """Add a host to a namespace."""
@@ -2149,12 +2733,13 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 self.logger.error(f"{errmsg}")
                 return pb2.req_status(status = rc[0], error_message = errmsg)
 
-        if GatewayUtils.is_discovery_nqn(request.subsystem_nqn):
+        subsys_is_discovery, host_is_discovery = GatewayUtils.discovery_flags(request.subsystem_nqn, request.host_nqn)
+        if subsys_is_discovery:
             errmsg = f"Failure deleting host from namespace {request.nsid} on {request.subsystem_nqn}, subsystem NQN can't be a discovery NQN"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        if GatewayUtils.is_discovery_nqn(request.host_nqn):
+        if host_is_discovery:
             errmsg = f"Failure deleting host from namespace {request.nsid} on {request.subsystem_nqn}, host NQN can't be a discovery NQN"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
@@ -2174,7 +2759,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 nsid=request.nsid,
                 host=request.host_nqn
             )
-            self.logger.debug(f"ns_visible {request.host_nqn}: {ret}")
+            self.logger.debug("ns_visible %s: %s", request.host_nqn, ret)
             if not find_ret.empty():
                 find_ret.remove_host(request.host_nqn)
 
@@ -2194,7 +2779,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     errmsg = f"{errmsg}:\n{ex}"
                     return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def namespace_delete_host(self, request, context=None):
         """Delete a host from a namespace."""
@@ -2203,77 +2788,77 @@ class GatewayService(pb2_grpc.GatewayServicer):
     def matching_host_exists(self, context, subsys_nqn, host_nqn) -> bool:
         if not context:
             return False
-        state = self.gateway_state.local.get_state()
         host_key = GatewayState.build_host_key(subsys_nqn, host_nqn)
-        if state.get(host_key):
-            return True
-        return False
+        return self.gateway_state.local.has_key(host_key)
 
     def add_host_safe(self, request, context):
         """Adds a host to a subsystem."""
 
         peer_msg = self.get_peer_message(context)
-        all_host_failure_prefix=f"Failure allowing open host access to {request.subsystem_nqn}"
-        host_failure_prefix=f"Failure adding host {request.host_nqn} to {request.subsystem_nqn}"
+        def all_host_failure_prefix():
+            return f"Failure allowing open host access to {request.subsystem_nqn}"
+        def host_failure_prefix():
+            return f"Failure adding host {request.host_nqn} to {request.subsystem_nqn}"
 
         if not GatewayState.is_key_element_valid(request.host_nqn):
-            errmsg = f"{host_failure_prefix}: Invalid host NQN \"{request.host_nqn}\", contains invalid characters"
+            errmsg = f"{host_failure_prefix()}: Invalid host NQN \"{request.host_nqn}\", contains invalid characters"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status = errno.EINVAL, error_message = errmsg)
 
         if not GatewayState.is_key_element_valid(request.subsystem_nqn):
-            errmsg = f"{host_failure_prefix}: Invalid subsystem NQN \"{request.subsystem_nqn}\", contains invalid characters"
+            errmsg = f"{host_failure_prefix()}: Invalid subsystem NQN \"{request.subsystem_nqn}\", contains invalid characters"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status = errno.EINVAL, error_message = errmsg)
 
         if self.verify_nqns:
             rc = GatewayService.is_valid_host_nqn(request.host_nqn)
             if rc.status != 0:
-                errmsg = f"{host_failure_prefix}: {rc.error_message}"
+                errmsg = f"{host_failure_prefix()}: {rc.error_message}"
                 self.logger.error(f"{errmsg}")
                 return pb2.req_status(status = rc.status, error_message = errmsg)
 
-        if GatewayUtils.is_discovery_nqn(request.subsystem_nqn):
+        subsys_is_discovery, host_is_discovery = GatewayUtils.discovery_flags(request.subsystem_nqn, request.host_nqn)
+        if subsys_is_discovery:
             if request.host_nqn == "*":
-                errmsg=f"{all_host_failure_prefix}: Can't allow host access to a discovery subsystem"
+                errmsg=f"{all_host_failure_prefix()}: Can't allow host access to a discovery subsystem"
             else:
-                errmsg=f"{host_failure_prefix}: Can't add host to a discovery subsystem"
+                errmsg=f"{host_failure_prefix()}: Can't add host to a discovery subsystem"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        if GatewayUtils.is_discovery_nqn(request.host_nqn):
-            errmsg=f"{host_failure_prefix}: Can't use a discovery NQN as host's"
+        if host_is_discovery:
+            errmsg=f"{host_failure_prefix()}: Can't use a discovery NQN as host's"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
         if request.psk and request.host_nqn == "*":
-            errmsg=f"{host_failure_prefix}: PSK is only allowed for specific hosts"
+            errmsg=f"{host_failure_prefix()}: PSK is only allowed for specific hosts"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
         if request.dhchap_key and request.host_nqn == "*":
-            errmsg=f"{host_failure_prefix}: DH-HMAC-CHAP key is only allowed for specific hosts"
+            errmsg=f"{host_failure_prefix()}: DH-HMAC-CHAP key is only allowed for specific hosts"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
         if request.dhchap_ctrlr_key and not request.dhchap_key:
-            errmsg=f"{host_failure_prefix}: DH-HMAC-CHAP controller key can only be used with a DH-HMAC-CHAP key"
+            errmsg=f"{host_failure_prefix()}: DH-HMAC-CHAP controller key can only be used with a DH-HMAC-CHAP key"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
         if request.psk and request.dhchap_key:
-            errmsg=f"{host_failure_prefix}: PSK and DH-HMAC-CHAP keys are mutually exclusive"
+            errmsg=f"{host_failure_prefix()}: PSK and DH-HMAC-CHAP keys are mutually exclusive"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
         host_already_exist = self.matching_host_exists(context, request.subsystem_nqn, request.host_nqn)
         if host_already_exist:
             if request.host_nqn == "*":
-                errmsg = f"{all_host_failure_prefix}: Open host access is already allowed"
+                errmsg = f"{all_host_failure_prefix()}: Open host access is already allowed"
                 self.logger.error(f"{errmsg}")
                 return pb2.req_status(status=errno.EEXIST, error_message=errmsg)
             else:
-                errmsg = f"{host_failure_prefix}: Host is already added"
+                errmsg = f"{host_failure_prefix()}: Host is already added"
                 self.logger.error(f"{errmsg}")
                 return pb2.req_status(status=errno.EEXIST, error_message=errmsg)
 
@@ -2282,12 +2867,12 @@ class GatewayService(pb2_grpc.GatewayServicer):
         if request.psk:
             psk_file = self.create_host_psk_file(request.subsystem_nqn, request.host_nqn, request.psk)
             if not psk_file:
-                errmsg=f"{host_failure_prefix}: Can't write PSK file"
+                errmsg=f"{host_failure_prefix()}: Can't write PSK file"
                 self.logger.error(f"{errmsg}")
                 return pb2.req_status(status=errno.ENOENT, error_message=errmsg)
             psk_key_name = GatewayService.construct_key_name_for_keyring(request.subsystem_nqn, request.host_nqn, GatewayService.PSK_PREFIX)
             if len(psk_key_name) >= SubsystemHostAuth.MAX_PSK_KEY_NAME_LENGTH:
-                errmsg=f"{host_failure_prefix}: PSK key name {psk_key_name} is too long, max length is {SubsystemHostAuth.MAX_PSK_KEY_NAME_LENGTH}"
+                errmsg=f"{host_failure_prefix()}: PSK key name {psk_key_name} is too long, max length is {SubsystemHostAuth.MAX_PSK_KEY_NAME_LENGTH}"
                 self.logger.error(f"{errmsg}")
                 return pb2.req_status(status=errno.E2BIG, error_message=errmsg)
 
@@ -2296,7 +2881,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
         if request.dhchap_key:
             dhchap_file = self.create_host_dhchap_file(request.subsystem_nqn, request.host_nqn, request.dhchap_key)
             if not dhchap_file:
-                errmsg=f"{host_failure_prefix}: Can't write DH-HMAC-CHAP file"
+                errmsg=f"{host_failure_prefix()}: Can't write DH-HMAC-CHAP file"
                 self.logger.error(f"{errmsg}")
                 if psk_file:
                     self.remove_host_psk_file(request.subsystem_nqn, request.host_nqn)
@@ -2308,7 +2893,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
         if request.dhchap_ctrlr_key:
             dhchap_ctrlr_file = self.create_host_dhchap_file(request.subsystem_nqn, request.host_nqn, request.dhchap_ctrlr_key)
             if not dhchap_ctrlr_file:
-                errmsg=f"{host_failure_prefix}: Can't write DH-HMAC-CHAP controller file"
+                errmsg=f"{host_failure_prefix()}: Can't write DH-HMAC-CHAP controller file"
                 self.logger.error(f"{errmsg}")
                 if psk_file:
                     self.remove_host_psk_file(request.subsystem_nqn, request.host_nqn)
@@ -2327,7 +2912,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                         nqn=request.subsystem_nqn,
                         disable=False,
                     )
-                    self.logger.debug(f"add_host *: {ret}")
+                    self.logger.debug("add_host *: %s", ret)
                     self.host_info.allow_any_host(request.subsystem_nqn)
                 else:  # Allow single host access to subsystem
                     self.logger.info(
@@ -2338,7 +2923,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                         except Exception:
                             pass
                         ret = rpc_keyring.keyring_file_add_key(self.spdk_rpc_client, psk_key_name, psk_file)
-                        self.logger.debug(f"keyring_file_add_key {psk_key_name}: {ret}")
+                        self.logger.debug("keyring_file_add_key %s: %s", psk_key_name, ret)
                         self.logger.info(f"Added PSK key {psk_key_name} to keyring")
                     if dhchap_file:
                         try:
@@ -2346,7 +2931,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                         except Exception:
                             pass
                         ret = rpc_keyring.keyring_file_add_key(self.spdk_rpc_client, dhchap_key_name, dhchap_file)
-                        self.logger.debug(f"keyring_file_add_key {dhchap_key_name}: {ret}")
+                        self.logger.debug("keyring_file_add_key %s: %s", dhchap_key_name, ret)
                         self.logger.info(f"Added DH-HMAC-CHAP key {dhchap_key_name} to keyring")
                         if dhchap_ctrlr_file:
                             try:
@@ -2354,7 +2939,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                             except Exception:
                                 pass
                             ret = rpc_keyring.keyring_file_add_key(self.spdk_rpc_client, dhchap_ctrlr_key_name, dhchap_ctrlr_file)
-                            self.logger.debug(f"keyring_file_add_key {dhchap_ctrlr_key_name}: {ret}")
+                            self.logger.debug("keyring_file_add_key %s: %s", dhchap_ctrlr_key_name, ret)
                             self.logger.info(f"Added DH-HMAC-CHAP controller key {dhchap_ctrlr_key_name} to keyring")
                     ret = rpc_nvmf.nvmf_subsystem_add_host(
                         self.spdk_rpc_client,
@@ -2364,7 +2949,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                         dhchap_key=dhchap_key_name,
                         dhchap_ctrlr_key=dhchap_ctrlr_key_name,
                     )
-                    self.logger.debug(f"add_host {request.host_nqn}: {ret}")
+                    self.logger.debug("add_host %s: %s", request.host_nqn, ret)
                     if psk_file:
                         self.host_info.add_psk_host(request.subsystem_nqn, request.host_nqn)
                         self.remove_host_psk_file(request.subsystem_nqn, request.host_nqn)
@@ -2376,29 +2961,26 @@ class GatewayService(pb2_grpc.GatewayServicer):
                         self.host_info.add_dhchap_host(request.subsystem_nqn, request.host_nqn)
             except Exception as ex:
                 if request.host_nqn == "*":
-                    self.logger.exception(all_host_failure_prefix)
-                    errmsg = f"{all_host_failure_prefix}:\n{ex}"
+                    prefix = all_host_failure_prefix()
                 else:
                     self.remove_all_host_key_files(request.subsystem_nqn, request.host_nqn)
                     self.remove_all_host_keys_from_keyring(request.subsystem_nqn, request.host_nqn)
-                    self.logger.exception(host_failure_prefix)
-                    errmsg = f"{host_failure_prefix}:\n{ex}"
-                resp = self.parse_json_exeption(ex)
+                    prefix = host_failure_prefix()
+                self.logger.exception(prefix)
+                errmsg = f"{prefix}:\n{ex}"
+                resp = self.parse_json_exception(ex)
                 status = errno.EINVAL
                 if resp:
                     status = resp["code"]
-                    if request.host_nqn == "*":
-                        errmsg = f"{all_host_failure_prefix}: {resp['message']}"
-                    else:
-                        errmsg = f"{host_failure_prefix}: {resp['message']}"
+                    errmsg = f"{prefix}: {resp['message']}"
                 return pb2.req_status(status=status, error_message=errmsg)
 
             # Just in case SPDK failed with no exception
             if not ret:
                 if request.host_nqn == "*":
-                    errmsg = all_host_failure_prefix
+                    errmsg = all_host_failure_prefix()
                 else:
-                    errmsg = host_failure_prefix
+                    errmsg = host_failure_prefix()
                     self.remove_all_host_key_files(request.subsystem_nqn, request.host_nqn)
                     self.remove_all_host_keys_from_keyring(request.subsystem_nqn, request.host_nqn)
                 self.logger.error(errmsg)
@@ -2407,8 +2989,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
             if context:
                 # Update gateway state
                 try:
-                    json_req = json_format.MessageToJson(
-                        request, preserving_proto_field_name=True, including_default_value_fields=True)
+                    json_req = GatewayService.request_to_state_json(request)
                     self.gateway_state.add_host(request.subsystem_nqn, request.host_nqn, json_req)
                 except Exception as ex:
                     errmsg = f"Error persisting host {request.host_nqn} access addition"
@@ -2418,14 +2999,14 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     self.remove_all_host_keys_from_keyring(request.subsystem_nqn, request.host_nqn)
                     return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def add_host(self, request, context=None):
         return self.execute_grpc_function(self.add_host_safe, request, context)
 
     def remove_host_from_state(self, subsystem_nqn, host_nqn, context):
         if not context:
-            return pb2.req_status(status=0, error_message=os.strerror(0))
+            return pb2.req_status(status=0, error_message=STRERROR_OK)
 
         if context:
             assert self.omap_lock.locked(), "OMAP is unlocked when calling remove_host_from_state()"
@@ -2437,35 +3018,38 @@ class GatewayService(pb2_grpc.GatewayServicer):
             self.logger.exception(errmsg)
             errmsg = f"{errmsg}:\n{ex}"
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def remove_host_safe(self, request, context):
         """Removes a host from a subsystem."""
 
         peer_msg = self.get_peer_message(context)
-        all_host_failure_prefix=f"Failure disabling open host access to {request.subsystem_nqn}"
-        host_failure_prefix=f"Failure removing host {request.host_nqn} access from {request.subsystem_nqn}"
+        def all_host_failure_prefix():
+            return f"Failure disabling open host access to {request.subsystem_nqn}"
+        def host_failure_prefix():
+            return f"Failure removing host {request.host_nqn} access from {request.subsystem_nqn}"
 
         if self.verify_nqns:
             rc = GatewayService.is_valid_host_nqn(request.host_nqn)
             if rc.status != 0:
-                errmsg = f"{host_failure_prefix}: {rc.error_message}"
+                errmsg = f"{host_failure_prefix()}: {rc.error_message}"
                 self.logger.error(f"{errmsg}")
                 return pb2.req_status(status = rc.status, error_message = errmsg)
 
-        if GatewayUtils.is_discovery_nqn(request.subsystem_nqn):
+        subsys_is_discovery, host_is_discovery = GatewayUtils.discovery_flags(request.subsystem_nqn, request.host_nqn)
+        if subsys_is_discovery:
             if request.host_nqn == "*":
-                errmsg=f"{all_host_failure_prefix}: Can't disable open host access to a discovery subsystem"
+                errmsg=f"{all_host_failure_prefix()}: Can't disable open host access to a discovery subsystem"
             else:
-                errmsg=f"{host_failure_prefix}: Can't remove host access from a discovery subsystem"
+                errmsg=f"{host_failure_prefix()}: Can't remove host access from a discovery subsystem"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        if GatewayUtils.is_discovery_nqn(request.host_nqn):
+        if host_is_discovery:
             if request.host_nqn == "*":
-                errmsg=f"{all_host_failure_prefix}: Can't use a discovery NQN as host's"
+                errmsg=f"{all_host_failure_prefix()}: Can't use a discovery NQN as host's"
             else:
-                errmsg=f"{host_failure_prefix}: Can't use a discovery NQN as host's"
+                errmsg=f"{host_failure_prefix()}: Can't use a discovery NQN as host's"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
@@ -2473,55 +3057,50 @@ class GatewayService(pb2_grpc.GatewayServicer):
         with omap_lock:
             try:
                 if request.host_nqn == "*":  # Disable allow any host access
-                    self.logger.info(
-                        f"Received request to disable open host access to"
-                        f" {request.subsystem_nqn}, context: {context}{peer_msg}")
+                    self.logger.info("Received request to disable open host access to %s, context: %s%s",
+                                     request.subsystem_nqn, context, peer_msg)
                     ret = rpc_nvmf.nvmf_subsystem_allow_any_host(
                         self.spdk_rpc_client,
                         nqn=request.subsystem_nqn,
                         disable=True,
                     )
-                    self.logger.debug(f"remove_host *: {ret}")
+                    self.logger.debug("remove_host *: %s", ret)
                     self.host_info.disallow_any_host(request.subsystem_nqn)
                 else:  # Remove single host access to subsystem
-                    self.logger.info(
-                        f"Received request to remove host {request.host_nqn} access from"
-                        f" {request.subsystem_nqn}, context: {context}{peer_msg}")
+                    self.logger.info("Received request to remove host %s access from %s, context: %s%s",
+                                     request.host_nqn, request.subsystem_nqn, context, peer_msg)
                     ret = rpc_nvmf.nvmf_subsystem_remove_host(
                         self.spdk_rpc_client,
                         nqn=request.subsystem_nqn,
                         host=request.host_nqn,
                     )
-                    self.logger.debug(f"remove_host {request.host_nqn}: {ret}")
+                    self.logger.debug("remove_host %s: %s", request.host_nqn, ret)
                     self.host_info.remove_psk_host(request.subsystem_nqn, request.host_nqn)
                     self.host_info.remove_dhchap_host(request.subsystem_nqn, request.host_nqn)
                     self.remove_all_host_key_files(request.subsystem_nqn, request.host_nqn)
                     self.remove_all_host_keys_from_keyring(request.subsystem_nqn, request.host_nqn)
             except Exception as ex:
                 if request.host_nqn == "*":
-                    self.logger.exception(all_host_failure_prefix)
-                    errmsg = f"{all_host_failure_prefix}:\n{ex}"
+                    prefix = all_host_failure_prefix()
                 else:
-                    self.logger.exception(host_failure_prefix)
-                    errmsg = f"{host_failure_prefix}:\n{ex}"
+                    prefix = host_failure_prefix()
+                self.logger.exception(prefix)
+                errmsg = f"{prefix}:\n{ex}"
                 self.logger.error(errmsg)
                 self.remove_host_from_state(request.subsystem_nqn, request.host_nqn, context)
-                resp = self.parse_json_exeption(ex)
+                resp = self.parse_json_exception(ex)
                 status = errno.EINVAL
                 if resp:
                     status = resp["code"]
-                    if request.host_nqn == "*":
-                        errmsg = f"{all_host_failure_prefix}: {resp['message']}"
-                    else:
-                        errmsg = f"{host_failure_prefix}: {resp['message']}"
+                    errmsg = f"{prefix}: {resp['message']}"
                 return pb2.req_status(status=status, error_message=errmsg)
 
             # Just in case SPDK failed with no exception
             if not ret:
                 if request.host_nqn == "*":
-                    errmsg = all_host_failure_prefix
+                    errmsg = all_host_failure_prefix()
                 else:
-                    errmsg = host_failure_prefix
+                    errmsg = host_failure_prefix()
                 self.logger.error(errmsg)
                 self.remove_host_from_state(request.subsystem_nqn, request.host_nqn, context)
                 return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
@@ -2529,21 +3108,24 @@ class GatewayService(pb2_grpc.GatewayServicer):
             return self.remove_host_from_state(request.subsystem_nqn, request.host_nqn, context)
 
     def remove_host(self, request, context=None):
-        return self.execute_grpc_function(self.remove_host_safe, request, context)
+        ret = self.execute_grpc_function(self.remove_host_safe, request, context)
+        if ret.status == 0:
+            self.notify_connections_changed(request.subsystem_nqn)
+        return ret
 
     def list_hosts_safe(self, request, context):
         """List hosts."""
 
         peer_msg = self.get_peer_message(context)
-        self.logger.info(f"Received request to list hosts for {request.subsystem}, context: {context}{peer_msg}")
+        self.logger.info("Received request to list hosts for %s, context: %s%s", request.subsystem, context, peer_msg)
         try:
-            ret = rpc_nvmf.nvmf_get_subsystems(self.spdk_rpc_client, nqn=request.subsystem)
-            self.logger.debug(f"list_hosts: {ret}")
+            ret = self.get_subsystems_cached(request.subsystem)
+            self.logger.debug("list_hosts: %s", ret)
         except Exception as ex:
             errmsg = f"Failure listing hosts, can't get subsystems"
             self.logger.exception(errmsg)
             errmsg = f"{errmsg}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
+            resp = self.parse_json_exception(ex)
             status = errno.EINVAL
             if resp:
                 status = resp["code"]
@@ -2552,110 +3134,106 @@ class GatewayService(pb2_grpc.GatewayServicer):
 
         hosts = []
         allow_any_host = False
-        for s in ret:
+        s = next((x for x in ret if x.get("nqn") == request.subsystem), None)
+        if s is None:
+            self.logger.warning(f"Subsystem {request.subsystem} is missing from SPDK's response")
+        else:
             try:
-                if s["nqn"] != request.subsystem:
-                    self.logger.warning(f'Got subsystem {s["nqn"]} instead of {request.subsystem}, ignore')
-                    continue
-                try:
-                    allow_any_host = s["allow_any_host"]
-                    host_nqns = s["hosts"]
-                except Exception:
-                    host_nqns = []
-                    pass
+                allow_any_host = s.get("allow_any_host", False)
+                host_nqns = s.get("hosts") or []
                 for h in host_nqns:
                     host_nqn = h["nqn"]
                     psk = self.host_info.is_psk_host(request.subsystem, host_nqn)
                     dhchap = self.host_info.is_dhchap_host(request.subsystem, host_nqn)
                     one_host = pb2.host(nqn = host_nqn, use_psk = psk, use_dhchap = dhchap)
                     hosts.append(one_host)
-                break
             except Exception:
                 self.logger.exception(f"{s=} parse error")
                 pass
 
-        return pb2.hosts_info(status = 0, error_message = os.strerror(0), allow_any_host=allow_any_host,
+        return pb2.hosts_info(status = 0, error_message = STRERROR_OK, allow_any_host=allow_any_host,
                               subsystem_nqn=request.subsystem, hosts=hosts)
 
     def list_hosts(self, request, context=None):
-        return self.execute_grpc_function(self.list_hosts_safe, request, context)
+        return self.execute_grpc_function_once(("list_hosts", request.subsystem),
+                                               self.list_hosts_safe, request, context)
 
     def list_connections_safe(self, request, context):
         """List connections."""
 
         peer_msg = self.get_peer_message(context)
         log_level = logging.INFO if context else logging.DEBUG
-        self.logger.log(log_level, f"Received request to list connections for {request.subsystem}, context: {context}{peer_msg}")
+        self.logger.log(log_level, "Received request to list connections for %s, context: %s%s", request.subsystem, context, peer_msg)
 
         if not request.subsystem:
             errmsg = f"Failure listing connections, missing subsystem NQN"
             self.logger.error(f"{errmsg}")
             return pb2.connections_info(status=errno.EINVAL, error_message = errmsg, connections=[])
 
+        # Send all the queries to SPDK together, the subsystem might already be cached
+        subsys_ret = self.find_cached_subsystems(request.subsystem)
+        calls = [("nvmf_subsystem_get_qpairs", {"nqn": request.subsystem}),
+                 ("nvmf_subsystem_get_controllers", {"nqn": request.subsystem})]
+        if subsys_ret is None:
+            calls.append(("nvmf_get_subsystems", {"nqn": request.subsystem}))
         try:
-            qpair_ret = rpc_nvmf.nvmf_subsystem_get_qpairs(self.spdk_rpc_client, nqn=request.subsystem)
-            self.logger.debug(f"list_connections get_qpairs: {qpair_ret}")
+            results = self.spdk_rpc_client.batch_call(calls)
         except Exception as ex:
-            errmsg = f"Failure listing connections, can't get qpairs"
+            errmsg = f"Failure listing connections"
             self.logger.exception(errmsg)
             errmsg = f"{errmsg}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
+            resp = self.parse_json_exception(ex)
             status = errno.EINVAL
             if resp:
                 status = resp["code"]
-                errmsg = f"Failure listing connections, can't get qpairs: {resp['message']}"
+                errmsg = f"Failure listing connections: {resp['message']}"
             return pb2.connections_info(status=status, error_message=errmsg, connections=[])
 
-        try:
-            ctrl_ret = rpc_nvmf.nvmf_subsystem_get_controllers(self.spdk_rpc_client, nqn=request.subsystem)
-            self.logger.debug(f"list_connections get_controllers: {ctrl_ret}")
-        except Exception as ex:
-            errmsg = f"Failure listing connections, can't get controllers"
-            self.logger.exception(errmsg)
-            errmsg = f"{errmsg}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
-            status = errno.EINVAL
-            if resp:
-                status = resp["code"]
-                errmsg = f"Failure listing connections, can't get controllers: {resp['message']}"
-            return pb2.connections_info(status=status, error_message=errmsg, connections=[])
-
-        try:
-            subsys_ret = rpc_nvmf.nvmf_get_subsystems(self.spdk_rpc_client, nqn=request.subsystem)
-            self.logger.debug(f"list_connections subsystems: {subsys_ret}")
-        except Exception as ex:
-            errmsg = f"Failure listing connections, can't get subsystems"
-            self.logger.exception(errmsg)
-            errmsg = f"{errmsg}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
-            status = errno.EINVAL
-            if resp:
-                status = resp["code"]
-                errmsg = f"Failure listing connections, can't get subsystems: {resp['message']}"
-            return pb2.connections_info(status=status, error_message=errmsg, connections=[])
+        for what, result in zip(("qpairs", "controllers", "subsystems"), results):
+            if isinstance(result, Exception):
+                errmsg = f"Failure listing connections, can't get {what}"
+                self.logger.error(f"{errmsg}:\n{result}")
+                errmsg = f"{errmsg}:\n{result}"
+                resp = self.parse_json_exception(result)
+                status = errno.EINVAL
+                if resp:
+                    status = resp["code"]
+                    errmsg = f"Failure listing connections, can't get {what}: {resp['message']}"
+                return pb2.connections_info(status=status, error_message=errmsg, connections=[])
+
+        qpair_ret = results[0]
+        ctrl_ret = results[1]
+        if subsys_ret is None:
+            subsys_ret = results[2]
+            self.cache_subsystems(request.subsystem, subsys_ret)
+        self.logger.debug("list_connections get_qpairs: %s", qpair_ret)
+        self.logger.debug("list_connections get_controllers: %s", ctrl_ret)
+        self.logger.debug("list_connections subsystems: %s", subsys_ret)
 
         connections = []
-        host_nqns = []
-        for s in subsys_ret:
+        # a dict rather than a set, to keep SPDK's order when listing the hosts which aren't connected
+        host_nqns = {}
+        s = next((x for x in subsys_ret if x.get("nqn") == request.subsystem), None)
+        if s is None:
+            self.logger.warning(f"Subsystem {request.subsystem} is missing from SPDK's response")
+        else:
             try:
-                if s["nqn"] != request.subsystem:
-                    self.logger.warning(f'Got subsystem {s["nqn"]} instead of {request.subsystem}, ignore')
-                    continue
-                try:
-                    subsys_hosts = s["hosts"]
-                except Exception:
-                    subsys_hosts = []
-                    pass
-                for h in subsys_hosts:
-                    try:
-                        host_nqns.append(h["nqn"])
-                    except Exception:
-                        pass
-                break
+                for h in s.get("hosts") or []:
+                    host_nqn = h.get("nqn")
+                    if host_nqn is not None:
+                        host_nqns[host_nqn] = None
             except Exception:
                 self.logger.exception(f"{s=} parse error")
                 pass
 
+        # Index the usable qpairs by controller, rather than scanning all of them for each controller
+        qpairs_by_cntlid = defaultdict(list)
+        for qp in qpair_ret:
+            if qp.get("state") != "enabled":
+                self.logger.debug("Qpair %s is not enabled", qp)
+                continue
+            qpairs_by_cntlid[qp.get("cntlid")].append(qp)
+
         for conn in ctrl_ret:
             try:
                 traddr = ""
@@ -2669,36 +3247,23 @@ class GatewayService(pb2_grpc.GatewayServicer):
                 psk = False
                 dhchap = False
 
-                for qp in qpair_ret:
+                for qp in qpairs_by_cntlid.get(conn["cntlid"], ()):
+                    addr = qp.get("listen_address")
+                    if not addr or not addr.get("traddr"):
+                        continue
                     try:
-                        if qp["cntlid"] != conn["cntlid"]:
-                            continue
-                        if qp["state"] != "enabled":
-                            self.logger.debug(f"Qpair {qp} is not enabled")
-                            continue
-                        addr = qp["listen_address"]
-                        if not addr:
-                            continue
-                        traddr = addr["traddr"]
-                        if not traddr:
-                            continue
                         trsvcid = int(addr["trsvcid"])
-                        try:
-                            trtype = addr["trtype"].upper()
-                        except Exception:
-                            pass
-                        try:
-                            adrfam = addr["adrfam"].lower()
-                        except Exception:
-                            pass
-                        found = True
-                        break
-                    except Exception:
-                        self.logger.exception(f"Got exception while parsing qpair: {qp}")
-                        pass
+                    except (KeyError, TypeError, ValueError):
+                        self.logger.error(f"Got invalid port in qpair: {qp}")
+                        continue
+                    traddr = addr["traddr"]
+                    trtype = (addr.get("trtype") or "TCP").upper()
+                    adrfam = (addr.get("adrfam") or "ipv4").lower()
+                    found = True
+                    break
 
                 if not found:
-                    self.logger.debug(f"Can't find active qpair for connection {conn}")
+                    self.logger.debug("Can't find active qpair for connection %s", conn)
                     continue
 
                 psk = self.host_info.is_psk_host(request.subsystem, hostnqn)
@@ -2708,17 +3273,12 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     if (adrfam, traddr, trsvcid, True) in self.subsystem_listeners[request.subsystem]:
                         secure = True
 
-                if not trtype:
-                    trtype = "TCP"
-                if not adrfam:
-                    adrfam = "ipv4"
                 one_conn = pb2.connection(nqn=hostnqn, connected=True,
                                           traddr=traddr, trsvcid=trsvcid, trtype=trtype, adrfam=adrfam,
                                           qpairs_count=conn["num_io_qpairs"], controller_id=conn["cntlid"],
                                           secure=secure, use_psk=psk, use_dhchap=dhchap)
                 connections.append(one_conn)
-                if hostnqn in host_nqns:
-                    host_nqns.remove(hostnqn)
+                host_nqns.pop(hostnqn, None)
             except Exception:
                 self.logger.exception(f"{conn=} parse error")
                 pass
@@ -2732,46 +3292,147 @@ class GatewayService(pb2_grpc.GatewayServicer):
                                       qpairs_count=-1, controller_id=-1, use_psk=psk, use_dhchap=dhchap)
             connections.append(one_conn)
 
-        return pb2.connections_info(status = 0, error_message = os.strerror(0),
+        return pb2.connections_info(status = 0, error_message = STRERROR_OK,
                               subsystem_nqn=request.subsystem, connections=connections)
 
     def list_connections(self, request, context=None):
-        return self.execute_grpc_function(self.list_connections_safe, request, context)
+        return self.execute_grpc_function_once(("list_connections", request.subsystem),
+                                               self.list_connections_safe, request, context)
+
+    def notify_connections_changed(self, nqn):
+        """Wakes up the connection watchers of a subsystem"""
+        with self.connections_changed:
+            self.connections_generation[nqn] = self.connections_generation.get(nqn, 0) + 1
+            self.connections_changed.notify_all()
+
+    def drop_connections_generation(self, nqn):
+        """Forgets the connection changes of a deleted subsystem, and wakes up its watchers so they end"""
+        with self.connections_changed:
+            self.connections_generation.pop(nqn, None)
+            self.connections_changed.notify_all()
+
+    def watch_connections(self, request, context=None):
+        """Streams the connections of a subsystem.
+
+        The connections are sent right away, and then whenever they might have been changed by
+        this gateway, or every watch_connections_interval seconds, as hosts can connect and
+        disconnect on their own. The stream ends on the first error, when the subsystem is deleted,
+        when the client goes away or after watch_connections_timeout seconds. At most
+        max_connection_watchers streams can be active at once.
+        """
+
+        peer_msg = self.get_peer_message(context)
+        self.logger.info(f"Received request to watch connections for {request.subsystem}, context: {context}{peer_msg}")
+
+        if request.subsystem not in self.subsys_max_ns:
+            errmsg = f"Failure watching connections for {request.subsystem}: Can't find subsystem"
+            self.logger.error(errmsg)
+            yield pb2.connections_info(status=errno.ENOENT, error_message=errmsg, subsystem_nqn=request.subsystem)
+            return
+
+        with self.connections_changed:
+            too_many_watchers = self.connection_watchers >= self.max_connection_watchers
+            if not too_many_watchers:
+                self.connection_watchers += 1
+        if too_many_watchers:
+            errmsg = f"Failure watching connections for {request.subsystem}: Too many watchers, the limit is {self.max_connection_watchers}"
+            self.logger.error(errmsg)
+            yield pb2.connections_info(status=errno.EBUSY, error_message=errmsg, subsystem_nqn=request.subsystem)
+            return
+
+        try:
+            deadline = time.monotonic() + self.watch_connections_timeout
+            generation = None
+            while context is None or context.is_active():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    self.logger.info(f"Stopped watching connections for {request.subsystem} after {self.watch_connections_timeout} seconds{peer_msg}")
+                    break
+                with self.connections_changed:
+                    self.connections_changed.wait_for(lambda: self.connections_generation.get(request.subsystem, 0) != generation
+                                                      or request.subsystem not in self.subsys_max_ns,
+                                                      timeout=min(self.watch_connections_interval, timeout))
+                    generation = self.connections_generation.get(request.subsystem, 0)
+                if request.subsystem not in self.subsys_max_ns:
+                    errmsg = f"Stopped watching connections for {request.subsystem}: Subsystem was deleted"
+                    self.logger.info(errmsg)
+                    yield pb2.connections_info(status=errno.ENOENT, error_message=errmsg, subsystem_nqn=request.subsystem)
+                    break
+                # No context, to not log each observation as a client request
+                ret = self.execute_grpc_function(self.list_connections_safe, request, None)
+                yield ret
+                if ret.status != 0:
+                    break
+        finally:
+            with self.connections_changed:
+                self.connection_watchers -= 1
+
+    def get_listener_ana_state_calls(self, nqn, listen_address):
+        """Returns the SPDK requests setting the ANA states of a new listener.
+
+        All the ANA groups are set inaccessible first, then the optimized ones are set
+        according to the ANA states we were given for the subsystem prior to the creation."""
+
+        calls = [("nvmf_subsystem_listener_set_ana_state",
+                  {"nqn": nqn, "listen_address": listen_address, "ana_state": "inaccessible"})]
+        nqn_ana_map = self.ana_map.get(nqn)
+        if nqn_ana_map:
+            max_ana_grp = self.subsys_max_ns.get(nqn, 0)
+            for ana_grp, ana_state in sorted(nqn_ana_map.items()):
+                if ana_state != pb2.ana_state.OPTIMIZED or not 1 <= ana_grp <= max_ana_grp:
+                    continue
+                self.logger.debug("using ana_map: set listener on nqn : %s  ana state : optimized for group : %s", nqn, ana_grp)
+                calls.append(("nvmf_subsystem_listener_set_ana_state",
+                              {"nqn": nqn, "listen_address": listen_address,
+                               "ana_state": "optimized", "anagrpid": ana_grp}))
+        return calls
 
     def create_listener_safe(self, request, context):
         """Creates a listener for a subsystem at a given IP/Port."""
 
         ret = True
-        create_listener_error_prefix = f"Failure adding {request.nqn} listener at {request.traddr}:{request.trsvcid}"
+        def create_listener_error_prefix():
+            return f"Failure adding {request.nqn} listener at {request.traddr}:{request.trsvcid}"
 
-        adrfam = GatewayEnumUtils.get_key_from_value(pb2.AddressFamily, request.adrfam)
+        adrfam = ADRFAM_VALUE_TO_NAME.get(request.adrfam)
         if adrfam == None:
-            errmsg=f"{create_listener_error_prefix}: Unknown address family {request.adrfam}"
+            errmsg=f"{create_listener_error_prefix()}: Unknown address family {request.adrfam}"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.ENOKEY, error_message=errmsg)
 
         peer_msg = self.get_peer_message(context)
-        self.logger.info(f"Received request to create {request.host_name}"
-                         f" TCP {adrfam} listener for {request.nqn} at"
-                         f" {request.traddr}:{request.trsvcid}, secure: {request.secure}, context: {context}{peer_msg}")
+        self.logger.info("Received request to create %s TCP %s listener for %s at %s:%s, secure: %s, context: %s%s",
+                         request.host_name, adrfam, request.nqn, request.traddr, request.trsvcid,
+                         request.secure, context, peer_msg)
 
         traddr = GatewayUtils.unescape_address_if_ipv6(request.traddr, adrfam)
 
         if GatewayUtils.is_discovery_nqn(request.nqn):
-            errmsg=f"{create_listener_error_prefix}: Can't create a listener for a discovery subsystem"
+            errmsg=f"{create_listener_error_prefix()}: Can't create a listener for a discovery subsystem"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
         if not GatewayState.is_key_element_valid(request.host_name):
-            errmsg=f"{create_listener_error_prefix}: Host name \"{request.host_name}\" contains invalid characters"
+            errmsg=f"{create_listener_error_prefix()}: Host name \"{request.host_name}\" contains invalid characters"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
         if request.secure and self.host_info.is_any_host_allowed(request.nqn):
-            errmsg=f"{create_listener_error_prefix}: Secure channel is only allowed for subsystems in which \"allow any host\" is off"
+            errmsg=f"{create_listener_error_prefix()}: Secure channel is only allowed for subsystems in which \"allow any host\" is off"
             self.logger.error(f"{errmsg}")
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
+        # Checked before taking the OMAP lock, as it only depends on the request
+        if request.host_name != self.host_name:
+            if context:
+                errmsg=f"{create_listener_error_prefix()}: Gateway's host name must match current host ({self.host_name})"
+                self.logger.error(f"{errmsg}")
+                return pb2.req_status(status=errno.ENODEV, error_message=errmsg)
+            else:
+                errmsg=f"Listener not created as gateway's host name {self.host_name} differs from requested host {request.host_name}"
+                self.logger.debug(errmsg)
+                return pb2.req_status(status=0, error_message=errmsg)
+
         add_listener_args = {}
         add_listener_args["nqn"] = request.nqn
         add_listener_args["trtype"] = "TCP"
@@ -2781,89 +3442,63 @@ class GatewayService(pb2_grpc.GatewayServicer):
         if request.secure:
             add_listener_args["secure_channel"] = True
 
+        json_req = None
+        if context:
+            # Serialize the request before taking the OMAP lock, so the lock only covers the OMAP write
+            json_req = GatewayService.request_to_state_json(request)
+
         omap_lock = self.omap_lock.get_omap_lock_to_use(context)
         with omap_lock:
             try:
-                if request.host_name == self.host_name:
-                    if (adrfam, traddr, request.trsvcid, False) in self.subsystem_listeners[request.nqn] or (adrfam, traddr, request.trsvcid, True) in self.subsystem_listeners[request.nqn]:
-                        self.logger.error(f"{request.nqn} already listens on address {request.traddr}:{request.trsvcid}")
-                        return pb2.req_status(status=errno.EEXIST,
-                                  error_message=f"{create_listener_error_prefix}: Subsystem already listens on this address")
-                    ret = rpc_nvmf.nvmf_subsystem_add_listener(self.spdk_rpc_client, **add_listener_args)
-                    self.logger.debug(f"create_listener: {ret}")
-                    self.subsystem_listeners[request.nqn].add((adrfam, traddr, request.trsvcid, request.secure))
-                else:
-                    if context:
-                        errmsg=f"{create_listener_error_prefix}: Gateway's host name must match current host ({self.host_name})"
-                        self.logger.error(f"{errmsg}")
-                        return pb2.req_status(status=errno.ENODEV, error_message=errmsg)
-                    else:
-                        errmsg=f"Listener not created as gateway's host name {self.host_name} differs from requested host {request.host_name}"
-                        self.logger.debug(f"{errmsg}")
-                        return pb2.req_status(status=0, error_message=errmsg)
+                listeners = self.subsystem_listeners[request.nqn]
+                if (adrfam, traddr, request.trsvcid, False) in listeners or (adrfam, traddr, request.trsvcid, True) in listeners:
+                    self.logger.error(f"{request.nqn} already listens on address {request.traddr}:{request.trsvcid}")
+                    return pb2.req_status(status=errno.EEXIST,
+                              error_message=f"{create_listener_error_prefix()}: Subsystem already listens on this address")
+                ret = rpc_nvmf.nvmf_subsystem_add_listener(self.spdk_rpc_client, **add_listener_args)
+                self.logger.debug("create_listener: %s", ret)
+                listeners.add((adrfam, traddr, request.trsvcid, request.secure))
             except Exception as ex:
-                self.logger.exception(create_listener_error_prefix)
-                errmsg = f"{create_listener_error_prefix}:\n{ex}"
-                resp = self.parse_json_exeption(ex)
+                prefix = create_listener_error_prefix()
+                self.logger.exception(prefix)
+                errmsg = f"{prefix}:\n{ex}"
+                resp = self.parse_json_exception(ex)
                 status = errno.EINVAL
                 if resp:
                     status = resp["code"]
-                    errmsg = f"{create_listener_error_prefix}: {resp['message']}"
+                    errmsg = f"{prefix}: {resp['message']}"
                 return pb2.req_status(status=status, error_message=errmsg)
 
             # Just in case SPDK failed with no exception
             if not ret:
-                self.logger.error(create_listener_error_prefix)
-                return pb2.req_status(status=errno.EINVAL, error_message=create_listener_error_prefix)
+                prefix = create_listener_error_prefix()
+                self.logger.error(prefix)
+                return pb2.req_status(status=errno.EINVAL, error_message=prefix)
 
             try:
-                self.logger.debug(f"create_listener nvmf_subsystem_listener_set_ana_state {request=} set inaccessible for all ana groups")
-                _ana_state = "inaccessible"
-                ret = rpc_nvmf.nvmf_subsystem_listener_set_ana_state(
-                  self.spdk_rpc_client,
-                  nqn=request.nqn,
-                  ana_state=_ana_state,
-                  trtype="TCP",
-                  traddr=traddr,
-                  trsvcid=str(request.trsvcid),
-                  adrfam=adrfam)
-                self.logger.debug(f"create_listener nvmf_subsystem_listener_set_ana_state response {ret=}")
-
-                # have been provided with ana state for this nqn prior to creation
-                # update optimized ana groups
-                if self.ana_map[request.nqn]:
-                    for x in range (self.subsys_max_ns[request.nqn]):
-                        ana_grp = x+1
-                        if ana_grp in self.ana_map[request.nqn] and self.ana_map[request.nqn][ana_grp] == pb2.ana_state.OPTIMIZED:
-                            _ana_state = "optimized"
-                            self.logger.debug(f"using ana_map: set listener on nqn : {request.nqn}  ana state : {_ana_state} for group : {ana_grp}")
-                            ret = rpc_nvmf.nvmf_subsystem_listener_set_ana_state(
-                              self.spdk_rpc_client,
-                              nqn=request.nqn,
-                              ana_state=_ana_state,
-                              trtype="TCP",
-                              traddr=traddr,
-                              trsvcid=str(request.trsvcid),
-                              adrfam=adrfam,
-                              anagrpid=ana_grp )
-                            self.logger.debug(f"create_listener nvmf_subsystem_listener_set_ana_state response {ret=}")
+                # Only set the ANA states once the listener was added, so we never touch an address we don't own
+                self.logger.debug("create_listener nvmf_subsystem_listener_set_ana_state request=%r set inaccessible for all ana groups", request)
+                listen_address = {"trtype": "TCP", "traddr": traddr, "trsvcid": str(request.trsvcid), "adrfam": adrfam}
+                ana_results = self.spdk_rpc_client.batch_call(self.get_listener_ana_state_calls(request.nqn, listen_address))
+                self.logger.debug("create_listener nvmf_subsystem_listener_set_ana_state response results=%r", ana_results)
+                for result in ana_results:
+                    if isinstance(result, Exception):
+                        raise result
 
             except Exception as ex:
-                errmsg=f"{create_listener_error_prefix}: Error setting ANA state"
-                self.logger.exception(errmsg)
-                errmsg=f"{errmsg}:\n{ex}"
-                resp = self.parse_json_exeption(ex)
+                prefix = f"{create_listener_error_prefix()}: Error setting ANA state"
+                self.logger.exception(prefix)
+                errmsg=f"{prefix}:\n{ex}"
+                resp = self.parse_json_exception(ex)
                 status = errno.EINVAL
                 if resp:
                     status = resp["code"]
-                    errmsg = f"{create_listener_error_prefix}: Error setting ANA state: {resp['message']}"
+                    errmsg = f"{prefix}: {resp['message']}"
                 return pb2.req_status(status=status, error_message=errmsg)
 
             if context:
                 # Update gateway state
                 try:
-                    json_req = json_format.MessageToJson(
-                        request, preserving_proto_field_name=True, including_default_value_fields=True)
                     self.gateway_state.add_listener(request.nqn,
                                                     request.host_name,
                                                     "TCP", request.traddr,
@@ -2874,14 +3509,17 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     errmsg = f"{errmsg}:\n{ex}"
                     return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
 
     def create_listener(self, request, context=None):
-        return self.execute_grpc_function(self.create_listener_safe, request, context)
+        ret = self.execute_grpc_function(self.create_listener_safe, request, context)
+        if ret.status == 0:
+            self.notify_connections_changed(request.nqn)
+        return ret
 
     def remove_listener_from_state(self, nqn, host_name, traddr, port, context):
         if not context:
-            return pb2.req_status(status=0, error_message=os.strerror(0))
+            return pb2.req_status(status=0, error_message=STRERROR_OK)
 
         if context:
             assert self.omap_lock.locked(), "OMAP is unlocked when calling remove_listener_from_state()"
@@ -2889,13 +3527,10 @@ class GatewayService(pb2_grpc.GatewayServicer):
         host_name = host_name.strip()
         listener_hosts = []
         if host_name == "*":
-            state = self.gateway_state.local.get_state()
             listener_prefix = GatewayState.build_partial_listener_key(nqn, None)
-            for key, val in state.items():
-                if not key.startswith(listener_prefix):
-                    continue
+            for key, val in self.gateway_state.local.iter_prefix(listener_prefix):
                 try:
-                    listener = json.loads(val)
+                    listener = self.gateway_state.local.get_parsed(key)
                     listener_nqn = listener["nqn"]
                     if listener_nqn != nqn:
                         self.logger.warning(f"Got subsystem {listener_nqn} instead of {nqn}, ignore")
@@ -2912,31 +3547,39 @@ class GatewayService(pb2_grpc.GatewayServicer):
             listener_hosts.append(host_name)
 
         # Update gateway state
-        req_status = None
-        for one_host in listener_hosts:
-            try:
-                self.gateway_state.remove_listener(nqn, one_host, "TCP", traddr, port)
-            except Exception as ex:
-                errmsg = f"Error persisting deletion of {one_host} listener {traddr}:{port} from {nqn}"
-                self.logger.exception(errmsg)
-                if not req_status:
-                    errmsg = f"{errmsg}:\n{ex}"
-                    req_status = pb2.req_status(status=errno.EINVAL, error_message=errmsg)
-        if not req_status:
-            req_status = pb2.req_status(status=0, error_message=os.strerror(0))
+        try:
+            self.gateway_state.remove_listeners_bulk(nqn, listener_hosts, "TCP", traddr, port)
+        except Exception as ex:
+            errmsg = f"Error persisting deletion of {', '.join(listener_hosts)} listener {traddr}:{port} from {nqn}"
+            self.logger.exception(errmsg)
+            errmsg = f"{errmsg}:\n{ex}"
+            return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
-        return req_status
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
+
+    def has_active_qpair_on(self, nqn, traddr, trsvcid) -> bool:
+        """Returns whether a subsystem has an enabled qpair on a listener address"""
+        assert self.rpc_lock.locked(), "RPC is unlocked when calling has_active_qpair_on()"
+        qpairs = rpc_nvmf.nvmf_subsystem_get_qpairs(self.spdk_rpc_client, nqn=nqn)
+        for qp in qpairs:
+            if qp.get("state") != "enabled":
+                continue
+            addr = qp.get("listen_address")
+            if addr and addr.get("traddr") == traddr and int(addr.get("trsvcid", 0)) == trsvcid:
+                return True
+        return False
 
     def delete_listener_safe(self, request, context):
         """Deletes a listener from a subsystem at a given IP/Port."""
 
         ret = True
         esc_traddr = GatewayUtils.escape_address_if_ipv6(request.traddr)
-        delete_listener_error_prefix = f"Listener {esc_traddr}:{request.trsvcid} failed to delete from {request.nqn}"
+        def delete_listener_error_prefix():
+            return f"Listener {esc_traddr}:{request.trsvcid} failed to delete from {request.nqn}"
 
-        adrfam = GatewayEnumUtils.get_key_from_value(pb2.AddressFamily, request.adrfam)
+        adrfam = ADRFAM_VALUE_TO_NAME.get(request.adrfam)
         if adrfam == None:
-            errmsg=f"{delete_listener_error_prefix}. Unknown address family {request.adrfam}"
+            errmsg=f"{delete_listener_error_prefix()}. Unknown address family {request.adrfam}"
             self.logger.error(errmsg)
             return pb2.req_status(status=errno.ENOKEY, error_message=errmsg)
 
@@ -2946,87 +3589,84 @@ class GatewayService(pb2_grpc.GatewayServicer):
         force_msg = " forcefully" if request.force else ""
         host_msg = "all hosts" if request.host_name == "*" else f"host {request.host_name}"
 
-        self.logger.info(f"Received request to delete TCP listener of {host_msg}"
-                         f" for subsystem {request.nqn} at"
-                         f" {esc_traddr}:{request.trsvcid}{force_msg}, context: {context}{peer_msg}")
+        self.logger.info("Received request to delete TCP listener of %s for subsystem %s at %s:%s%s, context: %s%s",
+                         host_msg, request.nqn, esc_traddr, request.trsvcid, force_msg, context, peer_msg)
 
         if request.host_name == "*" and not request.force:
-            errmsg=f"{delete_listener_error_prefix}. Must use the \"--force\" parameter when setting the host name to \"*\"."
+            errmsg=f"{delete_listener_error_prefix()}. Must use the \"--force\" parameter when setting the host name to \"*\"."
             self.logger.error(errmsg)
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
         if GatewayUtils.is_discovery_nqn(request.nqn):
-            errmsg=f"{delete_listener_error_prefix}. Can't delete a listener from a discovery subsystem"
+            errmsg=f"{delete_listener_error_prefix()}. Can't delete a listener from a discovery subsystem"
             self.logger.error(errmsg)
             return pb2.req_status(status=errno.EINVAL, error_message=errmsg)
 
+        if request.host_name != self.host_name and not request.force:
+            errmsg=f"{delete_listener_error_prefix()}. Gateway's host name must match current host ({self.host_name}). You can continue to delete the listener by adding the `--force` parameter."
+            self.logger.error(f"{errmsg}")
+            return pb2.req_status(status=errno.ENOENT, error_message=errmsg)
+
         if not request.force:
-            list_conn_req = pb2.list_connections_req(subsystem=request.nqn)
-            list_conn_ret = self.list_connections_safe(list_conn_req, context)
-            if list_conn_ret.status != 0:
-                errmsg=f"{delete_listener_error_prefix}. Can't verify there are no active connections for this address"
-                self.logger.error(errmsg)
+            try:
+                has_active_qpair = self.has_active_qpair_on(request.nqn, traddr, request.trsvcid)
+            except Exception:
+                errmsg=f"{delete_listener_error_prefix()}. Can't verify there are no active connections for this address"
+                self.logger.exception(errmsg)
                 return pb2.req_status(status=errno.ENOTEMPTY, error_message=errmsg)
-            for conn in list_conn_ret.connections:
-                if not conn.connected:
-                    continue
-                if conn.traddr != traddr:
-                    continue
-                if conn.trsvcid != request.trsvcid:
-                    continue
-                errmsg=f"{delete_listener_error_prefix} due to active connections for {esc_traddr}:{request.trsvcid}. Deleting the listener terminates active connections. You can continue to delete the listener by adding the `--force` parameter."
+            if has_active_qpair:
+                errmsg=f"{delete_listener_error_prefix()} due to active connections for {esc_traddr}:{request.trsvcid}. Deleting the listener terminates active connections. You can continue to delete the listener by adding the `--force` parameter."
                 self.logger.error(errmsg)
                 return pb2.req_status(status=errno.ENOTEMPTY, error_message=errmsg)
 
         omap_lock = self.omap_lock.get_omap_lock_to_use(context)
         with omap_lock:
             try:
-                if request.host_name == self.host_name or request.force:
-                    ret = rpc_nvmf.nvmf_subsystem_remove_listener(
-                        self.spdk_rpc_client,
-                        nqn=request.nqn,
-                        trtype="TCP",
-                        traddr=traddr,
-                        trsvcid=str(request.trsvcid),
-                        adrfam=adrfam,
-                    )
-                    self.logger.debug(f"delete_listener: {ret}")
-                    if request.nqn in self.subsystem_listeners:
-                        if (adrfam, traddr, request.trsvcid, False) in self.subsystem_listeners[request.nqn]:
-                            self.subsystem_listeners[request.nqn].remove((adrfam, traddr, request.trsvcid, False))
-                        if (adrfam, traddr, request.trsvcid, True) in self.subsystem_listeners[request.nqn]:
-                            self.subsystem_listeners[request.nqn].remove((adrfam, traddr, request.trsvcid, True))
-                else:
-                    errmsg=f"{delete_listener_error_prefix}. Gateway's host name must match current host ({self.host_name}). You can continue to delete the listener by adding the `--force` parameter."
-                    self.logger.error(f"{errmsg}")
-                    return pb2.req_status(status=errno.ENOENT, error_message=errmsg)
+                ret = rpc_nvmf.nvmf_subsystem_remove_listener(
+                    self.spdk_rpc_client,
+                    nqn=request.nqn,
+                    trtype="TCP",
+                    traddr=traddr,
+                    trsvcid=str(request.trsvcid),
+                    adrfam=adrfam,
+                )
+                self.logger.debug("delete_listener: %s", ret)
+                listeners = self.subsystem_listeners.get(request.nqn)
+                if listeners:
+                    listeners.discard((adrfam, traddr, request.trsvcid, False))
+                    listeners.discard((adrfam, traddr, request.trsvcid, True))
             except Exception as ex:
-                self.logger.exception(delete_listener_error_prefix)
+                prefix = delete_listener_error_prefix()
+                self.logger.exception(prefix)
                 # It's OK for SPDK to fail in case we used a different host name, just continue to remove from OMAP
                 if request.host_name == self.host_name:
-                    errmsg = f"{delete_listener_error_prefix}:\n{ex}"
+                    errmsg = f"{prefix}:\n{ex}"
                     self.remove_listener_from_state(request.nqn, request.host_name,
                                                     traddr, request.trsvcid, context)
-                    resp = self.parse_json_exeption(ex)
+                    resp = self.parse_json_exception(ex)
                     status = errno.EINVAL
                     if resp:
                         status = resp["code"]
-                        errmsg = f"{delete_listener_error_prefix}: {resp['message']}"
+                        errmsg = f"{prefix}: {resp['message']}"
                     return pb2.req_status(status=status, error_message=errmsg)
                 ret = True
 
             # Just in case SPDK failed with no exception
             if not ret:
-                self.logger.error(delete_listener_error_prefix)
+                prefix = delete_listener_error_prefix()
+                self.logger.error(prefix)
                 self.remove_listener_from_state(request.nqn, request.host_name,
                                                 traddr, request.trsvcid, context)
-                return pb2.req_status(status=errno.EINVAL, error_message=delete_listener_error_prefix)
+                return pb2.req_status(status=errno.EINVAL, error_message=prefix)
 
             return self.remove_listener_from_state(request.nqn, request.host_name,
                                                    traddr, request.trsvcid, context)
 
     def delete_listener(self, request, context=None):
-        return self.execute_grpc_function(self.delete_listener_safe, request, context)
+        ret = self.execute_grpc_function(self.delete_listener_safe, request, context)
+        if ret.status == 0:
+            self.notify_connections_changed(request.nqn)
+        return ret
 
     def list_listeners_safe(self, request, context):
         """List listeners."""
@@ -3037,13 +3677,10 @@ class GatewayService(pb2_grpc.GatewayServicer):
         listeners = []
         omap_lock = self.omap_lock.get_omap_lock_to_use(context)
         with omap_lock:
-            state = self.gateway_state.local.get_state()
             listener_prefix = GatewayState.build_partial_listener_key(request.subsystem, None)
-            for key, val in state.items():
-                if not key.startswith(listener_prefix):
-                    continue
+            for key, val in self.gateway_state.local.iter_prefix(listener_prefix):
                 try:
-                    listener = json.loads(val)
+                    listener = self.gateway_state.local.get_parsed(key)
                     nqn = listener["nqn"]
                     if nqn != request.subsystem:
                         self.logger.warning(f"Got subsystem {nqn} instead of {request.subsystem}, ignore")
@@ -3062,7 +3699,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
                     self.logger.exception(f"Got exception while parsing {val}")
                     continue
 
-        return pb2.listeners_info(status = 0, error_message = os.strerror(0), listeners=listeners)
+        return pb2.listeners_info(status = 0, error_message = STRERROR_OK, listeners=listeners)
 
     def list_listeners(self, request, context=None):
         return self.execute_grpc_function(self.list_listeners_safe, request, context)
@@ -3080,54 +3717,78 @@ class GatewayService(pb2_grpc.GatewayServicer):
             else:
                 self.logger.log(log_level, f"Received request to list all subsystems, context: {context}{peer_msg}")
 
-        subsystems = []
         try:
             if request.subsystem_nqn:
                 ret = rpc_nvmf.nvmf_get_subsystems(self.spdk_rpc_client, nqn=request.subsystem_nqn)
             else:
                 ret = rpc_nvmf.nvmf_get_subsystems(self.spdk_rpc_client)
-            self.logger.debug(f"list_subsystems: {ret}")
+            self.logger.debug("list_subsystems: %s", ret)
         except Exception as ex:
             errmsg = f"Failure listing subsystems"
             self.logger.exception(errmsg)
             errmsg = f"{errmsg}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
+            resp = self.parse_json_exception(ex)
             status = errno.ENODEV
             if resp:
                 status = resp["code"]
                 errmsg = f"Failure listing subsystems: {resp['message']}"
             return pb2.subsystems_info_cli(status=status, error_message=errmsg, subsystems=[])
 
-        for s in ret:
-            try:
-                if request.serial_number:
-                    if s["serial_number"] != request.serial_number:
-                        continue
-                if s["subtype"] == "NVMe":
-                    ns_count = len(s["namespaces"])
-                    if not ns_count:
-                        self.subsystem_nsid_bdev_and_uuid.remove_namespace(s["nqn"])
-                    s["namespace_count"] = ns_count
-                    s["enable_ha"] = True
-                else:
-                    s["namespace_count"] = 0
-                    s["enable_ha"] = False
-                # Parse the JSON dictionary into the protobuf message
-                subsystem = pb2.subsystem_cli()
-                json_format.Parse(json.dumps(s), subsystem, ignore_unknown_fields=True)
-                subsystems.append(subsystem)
-            except Exception:
-                self.logger.exception(f"{s=} parse error")
-                pass
+        if request.serial_number:
+            # Serial numbers are unique, so stop at the first match
+            s = next((x for x in ret if x.get("serial_number") == request.serial_number), None)
+            ret = [s] if s else []
+
+        subsystems = self.convert_subsystems(ret, self.subsystem_cli_from_dict)
+        return pb2.subsystems_info_cli(status = 0, error_message = STRERROR_OK, subsystems=subsystems)
+
+    def subsystem_cli_from_dict(self, s):
+        """Converts a subsystem returned by SPDK to a subsystem_cli message"""
+        if s["subtype"] == "NVMe":
+            ns_count = len(s["namespaces"])
+            if not ns_count:
+                self.subsystem_nsid_bdev_and_uuid.remove_namespace(s["nqn"])
+            s["namespace_count"] = ns_count
+            s["enable_ha"] = True
+        else:
+            s["namespace_count"] = 0
+            s["enable_ha"] = False
+        return GatewayService.dict_to_pb(pb2.subsystem_cli, s)
 
-        return pb2.subsystems_info_cli(status = 0, error_message = os.strerror(0), subsystems=subsystems)
+    @staticmethod
+    def dict_to_pb(msg_cls, s):
+        """Parses a JSON dictionary returned by SPDK into a new msg_cls protobuf message"""
+        msg = msg_cls()
+        json_format.ParseDict(s, msg, ignore_unknown_fields=True)
+        return msg
+
+    def convert_subsystems(self, subsystems, convert):
+        """Converts the subsystems returned by SPDK using convert, skipping the ones which can't be converted.
+
+        All subsystems are first converted in one go. Only if one of them fails we go over them again, one by one,
+        so the failing ones can be logged and skipped. The conversion functions might run twice on a subsystem,
+        so they must not depend on being called only once."""
+        try:
+            return [convert(s) for s in subsystems]
+        except Exception:
+            pass
+
+        converted = []
+        for s in subsystems:
+            try:
+                converted.append(convert(s))
+            except Exception as ex:
+                # This subsystem is just skipped, no need for a traceback
+                self.logger.error("s=%r parse error: %r", s, ex)
+        return converted
 
     def get_subsystems_safe(self, request, context):
         """Gets subsystems."""
 
         peer_msg = self.get_peer_message(context)
-        self.logger.debug(f"Received request to get subsystems, context: {context}{peer_msg}")
-        subsystems = []
+        self.logger.debug("Received request to get subsystems, context: %s%s", context, peer_msg)
+        fetch_time = time.monotonic()
+        modify_count = getattr(self.spdk_rpc_client, "modify_count", None)
         try:
             ret = rpc_nvmf.nvmf_get_subsystems(self.spdk_rpc_subsystems_client)
         except Exception as ex:
@@ -3136,68 +3797,113 @@ class GatewayService(pb2_grpc.GatewayServicer):
             context.set_details(f"{ex}")
             return pb2.subsystems_info()
 
-        for s in ret:
-            try:
-                ns_key = "namespaces"
-                if ns_key in s:
-                    for n in s[ns_key]:
-                        bdev = n["bdev_name"]
-                        with self.shared_state_lock:
-                            nonce = self.cluster_nonce[self.bdev_cluster[bdev]]
-                        n["nonce"] = nonce
-                        find_ret = self.subsystem_nsid_bdev_and_uuid.find_namespace(s["nqn"], n["nsid"])
-                        n["no_auto_visible"] = find_ret.no_auto_visible
-                        n["hosts"] = find_ret.host_list
-                # Parse the JSON dictionary into the protobuf message
-                subsystem = pb2.subsystem()
-                json_format.Parse(json.dumps(s), subsystem, ignore_unknown_fields=True)
-                subsystems.append(subsystem)
-            except Exception:
-                self.logger.exception(f"{s=} parse error")
-                pass
+        pb_cache = {}
+        subsystems = self.convert_subsystems(ret, lambda s: self.subsystem_from_dict(s, pb_cache))
+
+        # Only keep the subsystems which are still there
+        self.subsystem_pb_cache = pb_cache
+        ret = pb2.subsystems_info(subsystems=subsystems)
+        if modify_count is not None:
+            self.get_subsystems_cache = (fetch_time, modify_count, ret)
+        return ret
 
-        return pb2.subsystems_info(subsystems=subsystems)
+    def subsystem_from_dict(self, s, pb_cache):
+        """Converts a subsystem returned by SPDK to a subsystem message, adding it to pb_cache"""
+        ns_key = "namespaces"
+        if ns_key in s:
+            with self.shared_state_lock:
+                nonces = [self.bdev_nonce[n["bdev_name"]] for n in s[ns_key]]
+            for n, nonce in zip(s[ns_key], nonces):
+                n["nonce"] = nonce
+                find_ret = self.subsystem_nsid_bdev_and_uuid.find_namespace(s["nqn"], n["nsid"])
+                n["no_auto_visible"] = find_ret.no_auto_visible
+                n["hosts"] = find_ret.host_list
+        # Reuse the protobuf message built the last time, if the subsystem didn't change since
+        nqn = s["nqn"]
+        signature = json.dumps(s, sort_keys=True)
+        cached = self.subsystem_pb_cache.get(nqn)
+        if cached and cached[0] == signature:
+            subsystem = cached[1]
+        else:
+            subsystem = GatewayService.dict_to_pb(pb2.subsystem, s)
+            cached = (signature, subsystem)
+        pb_cache[nqn] = cached
+        return subsystem
+
+    def find_cached_get_subsystems(self, request_time):
+        """Returns a get_subsystems() result which can be used for a request made at request_time, None if there's none.
+
+        A result fetched after the request was made is always good, as if the request waited for it. An older one
+        is good if it's at most subsystems_cache_ttl_ms old and no SPDK call which might have changed the state was
+        made since."""
+        cached = self.get_subsystems_cache
+        if not cached:
+            return None
+        fetch_time, fetch_modify_count, ret = cached
+        if fetch_time >= request_time:
+            return ret
+        if fetch_modify_count == getattr(self.spdk_rpc_client, "modify_count", None) and \
+                request_time - fetch_time <= self.subsystems_cache_max_age:
+            return ret
+        return None
 
     def get_subsystems(self, request, context):
+        request_time = time.monotonic()
         with self.spdk_rpc_subsystems_lock:
+            # Callers which waited for the lock share the result of the one which just got it
+            ret = self.find_cached_get_subsystems(request_time)
+            if ret is not None:
+                return ret
             return self.get_subsystems_safe(request, context)
 
     def list_subsystems(self, request, context=None):
-        return self.execute_grpc_function(self.list_subsystems_safe, request, context)
+        return self.execute_grpc_function_once(("list_subsystems", request.subsystem_nqn, request.serial_number),
+                                               self.list_subsystems_safe, request, context)
+
+    def get_nvmf_log_flag_names(self):
+        """Returns the names of SPDK's nvmf log flags, fetching them on first use"""
+        if self.nvmf_log_flag_names is None:
+            self.nvmf_log_flag_names = [key for key in rpc_log.log_get_flags(self.spdk_rpc_client).keys() if key.startswith('nvmf')]
+        return self.nvmf_log_flag_names
 
     def get_spdk_nvmf_log_flags_and_level_safe(self, request, context):
         """Gets spdk nvmf log flags, log level and log print level"""
         peer_msg = self.get_peer_message(context)
         self.logger.info(f"Received request to get SPDK nvmf log flags and level{peer_msg}")
-        log_flags = []
         try:
-            nvmf_log_flags = {key: value for key, value in rpc_log.log_get_flags(
-                self.spdk_rpc_client).items() if key.startswith('nvmf')}
-            for flag, flagvalue in nvmf_log_flags.items():
-                pb2_log_flag = pb2.spdk_log_flag_info(name = flag, enabled = flagvalue)
-                log_flags.append(pb2_log_flag)
-            spdk_log_level = rpc_log.log_get_level(self.spdk_rpc_client)
-            spdk_log_print_level = rpc_log.log_get_print_level(self.spdk_rpc_client)
-            self.logger.debug(f"spdk log flags: {nvmf_log_flags}, " 
-                             f"spdk log level: {spdk_log_level}, "
-                             f"spdk log print level: {spdk_log_print_level}")
+            results = self.spdk_rpc_client.batch_call([("log_get_flags", None),
+                                                       ("log_get_level", None),
+                                                       ("log_get_print_level", None)])
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+            all_log_flags, spdk_log_level, spdk_log_print_level = results
+            if self.nvmf_log_flag_names is None:
+                self.nvmf_log_flag_names = [key for key in all_log_flags.keys() if key.startswith('nvmf')]
+            if self.logger.isEnabledFor(logging.DEBUG):
+                nvmf_log_flags = {flag: all_log_flags.get(flag, False) for flag in self.nvmf_log_flag_names}
+                self.logger.debug("spdk log flags: %s, spdk log level: %s, spdk log print level: %s",
+                                  nvmf_log_flags, spdk_log_level, spdk_log_print_level)
         except Exception as ex:
             errmsg = f"Failure getting SPDK log levels and nvmf log flags"
             self.logger.exception(errmsg)
             errmsg = f"{errmsg}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
+            resp = self.parse_json_exception(ex)
             status = errno.ENOKEY
             if resp:
                 status = resp["code"]
                 errmsg = f"Failure getting SPDK log levels and nvmf log flags: {resp['message']}"
             return pb2.spdk_nvmf_log_flags_and_level_info(status = status, error_message = errmsg)
 
-        return pb2.spdk_nvmf_log_flags_and_level_info(
-            nvmf_log_flags=log_flags,
+        ret = pb2.spdk_nvmf_log_flags_and_level_info(
             log_level = spdk_log_level,
             log_print_level = spdk_log_print_level,
             status = 0,
-            error_message = os.strerror(0))
+            error_message = STRERROR_OK)
+        # Build the flags in place, rather than creating messages which are then copied into the response
+        for flag in self.nvmf_log_flag_names:
+            ret.nvmf_log_flags.add(name = flag, enabled = all_log_flags.get(flag, False))
+        return ret
 
     def get_spdk_nvmf_log_flags_and_level(self, request, context=None):
         return self.execute_grpc_function(self.get_spdk_nvmf_log_flags_and_level_safe, request, context)
@@ -3226,33 +3932,41 @@ class GatewayService(pb2_grpc.GatewayServicer):
 
         self.logger.info(f"Received request to set SPDK nvmf logs: log_level: {log_level}, print_level: {print_level}{peer_msg}")
 
+        # The flags to clear if we fail, all of them unless we know which ones were set
+        flags_to_clear = []
         try:
-            nvmf_log_flags = [key for key in rpc_log.log_get_flags(self.spdk_rpc_client).keys() if key.startswith('nvmf')]
-            ret = [rpc_log.log_set_flag(
-                self.spdk_rpc_client, flag=flag) for flag in nvmf_log_flags]
-            self.logger.debug(f"Set SPDK nvmf log flags {nvmf_log_flags} to TRUE: {ret}")
+            nvmf_log_flags = self.get_nvmf_log_flag_names()
+            flags_to_clear = nvmf_log_flags
+            ret = self.spdk_rpc_client.batch_call([("log_set_flag", {"flag": flag}) for flag in nvmf_log_flags])
+            flags_to_clear = [flag for flag, result in zip(nvmf_log_flags, ret) if result is True]
+            for result in ret:
+                if isinstance(result, Exception):
+                    raise result
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Set SPDK nvmf log flags %s to TRUE: %s", nvmf_log_flags, ret)
             if log_level != None:
                 ret_log = rpc_log.log_set_level(self.spdk_rpc_client, level=log_level)
-                self.logger.debug(f"Set log level to {log_level}: {ret_log}")
+                self.logger.debug("Set log level to %s: %s", log_level, ret_log)
             if print_level != None:
                 ret_print = rpc_log.log_set_print_level(
                     self.spdk_rpc_client, level=print_level)
-                self.logger.debug(f"Set log print level to {print_level}: {ret_print}")
+                self.logger.debug("Set log print level to %s: %s", print_level, ret_print)
         except Exception as ex:
             errmsg="Failure setting SPDK log levels"
             self.logger.exception(errmsg)
-            errmsg="{errmsg}:\n{ex}"
-            for flag in nvmf_log_flags:
-                rpc_log.log_clear_flag(self.spdk_rpc_client, flag=flag)
-            resp = self.parse_json_exeption(ex)
-            status = errno.EINVAL
+            if flags_to_clear:
+                self.spdk_rpc_client.batch_call([("log_clear_flag", {"flag": flag}) for flag in flags_to_clear])
+            resp = self.parse_json_exception(ex)
             if resp:
                 status = resp["code"]
-                errmsg = f"Failure setting SPDK log levels: {resp['message']}"
+                errmsg = f"{errmsg}: {resp['message']}"
+            else:
+                status = errno.EINVAL
+                errmsg = f"{errmsg}:\n{ex}"
             return pb2.req_status(status=status, error_message=errmsg)
 
         status = 0
-        errmsg = os.strerror(0)
+        errmsg = STRERROR_OK
         if log_level != None and not ret_log:
             status = errno.EINVAL
             errmsg = "Failure setting SPDK log level"
@@ -3273,16 +3987,18 @@ class GatewayService(pb2_grpc.GatewayServicer):
         self.logger.info(f"Received request to disable SPDK nvmf logs{peer_msg}")
 
         try:
-            nvmf_log_flags = [key for key in rpc_log.log_get_flags(self.spdk_rpc_client).keys() if key.startswith('nvmf')]
-            ret = [rpc_log.log_clear_flag(self.spdk_rpc_client, flag=flag) for flag in nvmf_log_flags]
-            logs_level = [rpc_log.log_set_level(self.spdk_rpc_client, level='NOTICE'),
-                          rpc_log.log_set_print_level(self.spdk_rpc_client, level='INFO')]
-            ret.extend(logs_level)
+            calls = [("log_clear_flag", {"flag": flag}) for flag in self.get_nvmf_log_flag_names()]
+            calls.append(("log_set_level", {"level": "NOTICE"}))
+            calls.append(("log_set_print_level", {"level": "INFO"}))
+            ret = self.spdk_rpc_client.batch_call(calls)
+            for result in ret:
+                if isinstance(result, Exception):
+                    raise result
         except Exception as ex:
             errmsg = f"Failure in disable SPDK nvmf log flags"
             self.logger.exception(errmsg)
             errmsg = f"{errmsg}:\n{ex}"
-            resp = self.parse_json_exeption(ex)
+            resp = self.parse_json_exception(ex)
             status = errno.EINVAL
             if resp:
                 status = resp["code"]
@@ -3290,7 +4006,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
             return pb2.req_status(status=status, error_message=errmsg)
 
         status = 0
-        errmsg = os.strerror(0)
+        errmsg = STRERROR_OK
         if not all(ret):
             status = errno.EINVAL
             errmsg = "Failure in disable SPDK nvmf log flags"
@@ -3302,42 +4018,33 @@ class GatewayService(pb2_grpc.GatewayServicer):
     def parse_version(self, version):
         if not version:
             return None
-        try:
-            vlist = version.split(".")
-            if len(vlist) != 3:
-                raise Exception
-            v1 = int(vlist[0])
-            v2 = int(vlist[1])
-            v3 = int(vlist[2])
-        except Exception:
-            self.logger.exception(f"Can't parse version \"{version}\"")
+        version_match = VERSION_RE.fullmatch(version)
+        if not version_match:
+            self.logger.error(f"Can't parse version \"{version}\"")
             return None
-        return (v1, v2, v3)
+        return tuple(int(v) for v in version_match.groups())
 
     def get_gateway_info_safe(self, request, context):
         """Get gateway's info"""
 
         peer_msg = self.get_peer_message(context)
         self.logger.info(f"Received request to get gateway's info{peer_msg}")
-        gw_version_string = os.getenv("NVMEOF_VERSION")
-        spdk_version_string = os.getenv("NVMEOF_SPDK_VERSION")
+        gw_version_string = self.gateway_version
         cli_version_string = request.cli_version
-        addr = self.config.get_with_default("gateway", "addr", "")
-        port = self.config.get_with_default("gateway", "port", "")
         ret = pb2.gateway_info(cli_version = request.cli_version,
                                version = gw_version_string,
-                               spdk_version = spdk_version_string,
+                               spdk_version = self.spdk_version,
                                name = self.gateway_name,
                                group = self.gateway_group,
-                               addr = addr,
-                               port = port,
+                               addr = self.gateway_addr,
+                               port = self.gateway_port,
                                load_balancing_group = self.group_id + 1,
                                bool_status = True,
                                hostname = self.host_name,
                                status = 0,
-                               error_message = os.strerror(0))
+                               error_message = STRERROR_OK)
         cli_ver = self.parse_version(cli_version_string)
-        gw_ver = self.parse_version(gw_version_string)
+        gw_ver = self.gateway_parsed_version
         if cli_ver != None and gw_ver != None and cli_ver < gw_ver:
             ret.bool_status = False
             ret.status = errno.EINVAL
@@ -3354,11 +4061,9 @@ class GatewayService(pb2_grpc.GatewayServicer):
             self.logger.warning(f"No CLI version specified, can't check version compatibility")
         elif not cli_ver:
             self.logger.warning(f"Invalid CLI version {cli_version_string}, can't check version compatibility")
-        if ret.status == 0:
-            log_func = self.logger.debug
-        else:
-            log_func = self.logger.error
-        log_func(f"Gateway's info:\n{ret}")
+        # The message is only rendered as text if the level is enabled
+        log_level = logging.DEBUG if ret.status == 0 else logging.ERROR
+        self.logger.log(log_level, "Gateway's info:\n%s", ret)
         return ret
 
     def get_gateway_info(self, request, context=None):
@@ -3375,7 +4080,7 @@ class GatewayService(pb2_grpc.GatewayServicer):
             return pb2.gateway_log_level_info(status = errno.ENOKEY,
                                               error_message=f"Invalid gateway log level")
         self.logger.info(f"Received request to get gateway's log level. Level is {log_level}{peer_msg}")
-        return pb2.gateway_log_level_info(status = 0, error_message=os.strerror(0), log_level=log_level)
+        return pb2.gateway_log_level_info(status = 0, error_message=STRERROR_OK, log_level=log_level)
 
     def set_gateway_log_level(self, request, context=None):
         """Set gateway's log level"""
@@ -3389,19 +4094,71 @@ class GatewayService(pb2_grpc.GatewayServicer):
         log_level = log_level.upper()
 
         self.logger.info(f"Received request to set gateway's log level to {log_level}{peer_msg}")
-        self.gw_logger_object.set_log_level(request.log_level)
-
+        saved_level = None
         try:
-            os.remove(GatewayLogger.NVME_GATEWAY_LOG_LEVEL_FILE_PATH)
+            with open(GatewayLogger.NVME_GATEWAY_LOG_LEVEL_FILE_PATH) as f:
+                saved_level = f.read().strip()
         except FileNotFoundError:
             pass
         except Exception:
-            self.logger.exception(f"Failure removing \"{GatewayLogger.NVME_GATEWAY_LOG_LEVEL_FILE_PATH}\"")
-
+            self.logger.exception(f"Failure reading log level from \"{GatewayLogger.NVME_GATEWAY_LOG_LEVEL_FILE_PATH}\"")
+        if self.logger.level == request.log_level and saved_level == str(request.log_level):
+            # Nothing changed, the discovery service already got this level
+            return pb2.req_status(status=0, error_message=STRERROR_OK)
+
+        if self.logger.level != request.log_level:
+            self.gw_logger_object.set_log_level(request.log_level)
+
+        # Write to a temporary file and rename it, so the discovery service never sees a partial file.
+        # The temporary file gets a unique name, so concurrent calls don't write into the same one.
+        log_level_path = GatewayLogger.NVME_GATEWAY_LOG_LEVEL_FILE_PATH
+        tmp_path = None
         try:
-            with open(GatewayLogger.NVME_GATEWAY_LOG_LEVEL_FILE_PATH, "w") as f:
+            (tmp_fd, tmp_path) = tempfile.mkstemp(prefix=os.path.basename(log_level_path) + ".",
+                                                  dir=os.path.dirname(log_level_path), text=True)
+            with open(tmp_fd, "wt") as f:
                 f.write(str(request.log_level))
+            # mkstemp() creates the file readable only by us, keep the permissions the file always had
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, log_level_path)
         except Exception:
-            self.logger.exception(f"Failure writing log level to \"{GatewayLogger.NVME_GATEWAY_LOG_LEVEL_FILE_PATH}\"")
+            self.logger.exception(f"Failure writing log level to \"{log_level_path}\"")
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except Exception:
+                    pass
+
+        return pb2.req_status(status=0, error_message=STRERROR_OK)
+
+    # list_batch_one_req field -> (GatewayService method, list_batch_one_info field)
+    LIST_BATCH_HANDLERS = {
+        "list_subsystems": ("list_subsystems", "subsystems"),
+        "list_namespaces": ("list_namespaces", "namespaces"),
+        "list_hosts": ("list_hosts", "hosts"),
+        "list_listeners": ("list_listeners", "listeners"),
+        "list_connections": ("list_connections", "connections"),
+    }
+
+    def list_batch(self, request, context=None):
+        """Runs several list requests, in order, and returns their results"""
 
-        return pb2.req_status(status=0, error_message=os.strerror(0))
+        peer_msg = self.get_peer_message(context)
+        self.logger.info("Received request to run %d list requests, context: %s%s", len(request.requests), context, peer_msg)
+
+        results = []
+        for one_req in request.requests:
+            req_type = one_req.WhichOneof("req")
+            if req_type not in GatewayService.LIST_BATCH_HANDLERS:
+                errmsg = f"Failure running list requests, unknown request type {req_type}"
+                self.logger.error(errmsg)
+                return pb2.list_batch_info(status=errno.EINVAL, error_message=errmsg, results=[])
+            # The list methods take the RPC lock by themselves, and SPDK serializes the requests anyway,
+            # so they run one after the other. Each sub-request reports its own status in its result.
+            method_name, info_field = GatewayService.LIST_BATCH_HANDLERS[req_type]
+            ret = getattr(self, method_name)(getattr(one_req, req_type), context)
+            one_result = pb2.list_batch_one_info()
+            getattr(one_result, info_field).CopyFrom(ret)
+            results.append(one_result)
+
+        return pb2.list_batch_info(status=0, error_message=STRERROR_OK, results=results)
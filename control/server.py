@@ -21,14 +21,13 @@ from concurrent import futures
 from google.protobuf import json_format
 
 import spdk.rpc
-import spdk.rpc.client as rpc_client
 import spdk.rpc.nvmf as rpc_nvmf
 
 from .proto import gateway_pb2 as pb2
 from .proto import gateway_pb2_grpc as pb2_grpc
 from .proto import monitor_pb2_grpc
 from .state import GatewayState, LocalGatewayState, OmapLock, OmapGatewayState, GatewayStateHandler
-from .grpc import GatewayService, MonitorGroupService
+from .grpc import GatewayService, MonitorGroupService, SpdkRpcClient
 from .discovery import DiscoveryService
 from .config import GatewayConfig
 from .utils import GatewayLogger
@@ -89,6 +88,7 @@ class GatewayServer:
         spdk_rpc_client: Client of SPDK RPC server
         spdk_rpc_ping_client: Ping client of SPDK RPC server
         spdk_rpc_subsystems_client: subsystems client of SPDK RPC server
+        spdk_rpc_stats_clients: Pool of IO stats clients of SPDK RPC server
         spdk_process: Subprocess running SPDK NVMEoF target application
         discovery_pid: Subprocess running Ceph nvmeof discovery service
     """
@@ -228,7 +228,7 @@ class GatewayServer:
         # Register service implementation with server
         gateway_state = GatewayStateHandler(self.config, local_state, omap_state, self.gateway_rpc_caller, f"gateway-{self.name}")
         self.omap_lock = OmapLock(omap_state, gateway_state, self.rpc_lock)
-        self.gateway_rpc = GatewayService(self.config, gateway_state, self.rpc_lock, self.omap_lock, self.group_id, self.spdk_rpc_client, self.spdk_rpc_subsystems_client, self.ceph_utils)
+        self.gateway_rpc = GatewayService(self.config, gateway_state, self.rpc_lock, self.omap_lock, self.group_id, self.spdk_rpc_client, self.spdk_rpc_subsystems_client, self.spdk_rpc_stats_clients, self.ceph_utils)
         self.server = self._grpc_server(self._gateway_address())
         pb2_grpc.add_GatewayServicer_to_server(self.gateway_rpc, self.server)
 
@@ -522,27 +522,35 @@ class GatewayServer:
             f" conn_retries: {conn_retries}, timeout: {timeout}, log level: {protocol_log_level}"
         )
         try:
-            self.spdk_rpc_client = rpc_client.JSONRPCClient(
+            self.spdk_rpc_client = SpdkRpcClient(
                 self.spdk_rpc_socket_path,
                 None,
                 timeout,
                 log_level=protocol_log_level,
                 conn_retries=conn_retries,
             )
-            self.spdk_rpc_ping_client = rpc_client.JSONRPCClient(
+            self.spdk_rpc_ping_client = SpdkRpcClient(
                 self.spdk_rpc_socket_path,
                 None,
                 timeout,
                 log_level=protocol_log_level,
                 conn_retries=conn_retries,
             )
-            self.spdk_rpc_subsystems_client = rpc_client.JSONRPCClient(
+            self.spdk_rpc_subsystems_client = SpdkRpcClient(
                 self.spdk_rpc_socket_path,
                 None,
                 timeout,
                 log_level=protocol_log_level,
                 conn_retries=conn_retries,
             )
+            rpc_pool_size = self.config.getint_with_default("spdk", "rpc_pool_size", 4)
+            self.spdk_rpc_stats_clients = [SpdkRpcClient(
+                self.spdk_rpc_socket_path,
+                None,
+                timeout,
+                log_level=protocol_log_level,
+                conn_retries=conn_retries,
+            ) for _ in range(max(rpc_pool_size, 1))]
         except Exception:
             self.logger.exception(f"Unable to initialize SPDK")
             raise
@@ -705,8 +713,12 @@ class GatewayServer:
         for key, val in requests.items():
             if key.startswith(GatewayState.SUBSYSTEM_PREFIX):
                 if is_add_req:
-                    req = json_format.Parse(val, pb2.create_subsystem_req(), ignore_unknown_fields=True)
+                    req = GatewayState.parse_subsystem_value(val)
                     self.gateway_rpc.create_subsystem(req)
+                elif GatewayState.is_binary_value(val):
+                    create_req = GatewayState.parse_subsystem_value(val)
+                    req = pb2.delete_subsystem_req(subsystem_nqn=create_req.subsystem_nqn)
+                    self.gateway_rpc.delete_subsystem(req)
                 else:
                     req = json_format.Parse(val,
                                             pb2.delete_subsystem_req(),
@@ -714,8 +726,12 @@ class GatewayServer:
                     self.gateway_rpc.delete_subsystem(req)
             elif key.startswith(GatewayState.NAMESPACE_PREFIX):
                 if is_add_req:
-                    req = json_format.Parse(val, pb2.namespace_add_req(), ignore_unknown_fields=True)
+                    req = GatewayState.parse_namespace_value(val)
                     self.gateway_rpc.namespace_add(req)
+                elif GatewayState.is_binary_value(val):
+                    add_req = GatewayState.parse_namespace_value(val)
+                    req = pb2.namespace_delete_req(subsystem_nqn=add_req.subsystem_nqn, nsid=add_req.nsid)
+                    self.gateway_rpc.namespace_delete(req)
                 else:
                     req = json_format.Parse(val,
                                             pb2.namespace_delete_req(),
@@ -8,10 +8,13 @@
 #
 
 import time
+import json
 import threading
 import rados
 import errno
 import contextlib
+import functools
+import bisect
 from typing import Dict
 from collections import defaultdict
 from abc import ABC, abstractmethod
@@ -20,6 +23,19 @@ from .utils import GatewayUtils
 from google.protobuf import json_format
 from .proto import gateway_pb2 as pb2
 
+# orjson isn't required, but when it's installed use it to encode and decode the JSON values in the state
+try:
+    import orjson
+    json_loads = orjson.loads
+
+    def json_dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj) -> str:
+        return json.dumps(obj, indent=2)
+
 class GatewayState(ABC):
     """Persists gateway NVMeoF target state.
 
@@ -35,6 +51,11 @@ class GatewayState(ABC):
     NAMESPACE_QOS_PREFIX = "qos" + OMAP_KEY_DELIMITER
     NAMESPACE_LB_GROUP_PREFIX = "lbgroup" + OMAP_KEY_DELIMITER
     NAMESPACE_HOST_PREFIX = "ns_host" + OMAP_KEY_DELIMITER
+    # State values starting with this tag hold a serialized request protobuf instead of JSON,
+    # the key prefix tells which request: namespace_add_req for namespaces, create_subsystem_req for subsystems
+    BINARY_VALUE_TAG = b"\x00pb1:"
+    # number of keys remembered by each of the cached key builders
+    KEY_CACHE_SIZE = 4096
 
     def is_key_element_valid(s: str) -> bool:
         if type(s) != str:
@@ -43,6 +64,25 @@ class GatewayState(ABC):
             return False
         return True
 
+    def is_binary_value(val) -> bool:
+        return type(val) == bytes and val.startswith(GatewayState.BINARY_VALUE_TAG)
+
+    def build_binary_value(req) -> bytes:
+        return GatewayState.BINARY_VALUE_TAG + req.SerializeToString()
+
+    def parse_namespace_value(val) -> pb2.namespace_add_req:
+        """Parses a namespace state value, in either the binary or the JSON format."""
+        if GatewayState.is_binary_value(val):
+            return pb2.namespace_add_req.FromString(val[len(GatewayState.BINARY_VALUE_TAG):])
+        return json_format.Parse(val, pb2.namespace_add_req(), ignore_unknown_fields=True)
+
+    def parse_subsystem_value(val) -> pb2.create_subsystem_req:
+        """Parses a subsystem state value, in either the binary or the JSON format."""
+        if GatewayState.is_binary_value(val):
+            return pb2.create_subsystem_req.FromString(val[len(GatewayState.BINARY_VALUE_TAG):])
+        return json_format.Parse(val, pb2.create_subsystem_req(), ignore_unknown_fields=True)
+
+    @functools.lru_cache(maxsize=KEY_CACHE_SIZE)
     def build_namespace_key(subsystem_nqn: str, nsid) -> str:
         key = GatewayState.NAMESPACE_PREFIX + subsystem_nqn
         if nsid is not None:
@@ -55,12 +95,14 @@ class GatewayState(ABC):
             key += GatewayState.OMAP_KEY_DELIMITER + str(nsid)
         return key
 
+    @functools.lru_cache(maxsize=KEY_CACHE_SIZE)
     def build_namespace_qos_key(subsystem_nqn: str, nsid) -> str:
         key = GatewayState.NAMESPACE_QOS_PREFIX + subsystem_nqn
         if nsid is not None:
             key += GatewayState.OMAP_KEY_DELIMITER + str(nsid)
         return key
 
+    @functools.lru_cache(maxsize=KEY_CACHE_SIZE)
     def build_namespace_host_key(subsystem_nqn: str, nsid, host : str) -> str:
         key = GatewayState.NAMESPACE_HOST_PREFIX + subsystem_nqn
         if nsid is not None:
@@ -71,6 +113,7 @@ class GatewayState(ABC):
     def build_subsystem_key(subsystem_nqn: str) -> str:
         return GatewayState.SUBSYSTEM_PREFIX + subsystem_nqn
 
+    @functools.lru_cache(maxsize=KEY_CACHE_SIZE)
     def build_host_key(subsystem_nqn: str, host_nqn: str) -> str:
         key = GatewayState.HOST_PREFIX + subsystem_nqn
         if host_nqn is not None:
@@ -108,18 +151,31 @@ class GatewayState(ABC):
         """Removes key from state data store."""
         pass
 
+    def _add_keys(self, keys_vals):
+        """Adds several keys and values to state data store."""
+        for key, val in keys_vals.items():
+            self._add_key(key, val)
+
+    def _remove_keys(self, keys):
+        """Removes several keys from state data store."""
+        for key in keys:
+            self._remove_key(key)
+
     def add_namespace(self, subsystem_nqn: str, nsid: str, val: str):
         """Adds a namespace to the state data store."""
         key = GatewayState.build_namespace_key(subsystem_nqn, nsid)
         self._add_key(key, val)
 
-    def remove_namespace(self, subsystem_nqn: str, nsid: str):
-        """Removes a namespace from the state data store."""
+    def remove_namespace(self, subsystem_nqn: str, nsid: str, state = None):
+        """Removes a namespace from the state data store.
+
+        The related keys are looked up in state if given, in the store's own state otherwise."""
         key = GatewayState.build_namespace_key(subsystem_nqn, nsid)
         self._remove_key(key)
 
         # Delete all keys related to the namespace
-        state = self.get_state()
+        if state is None:
+            state = self.get_state()
         for key in state.keys():
             if (key.startswith(GatewayState.build_namespace_qos_key(subsystem_nqn, nsid)) or
                     key.startswith(GatewayState.build_namespace_host_key(subsystem_nqn, nsid, ""))):
@@ -150,13 +206,16 @@ class GatewayState(ABC):
         key = GatewayState.build_subsystem_key(subsystem_nqn)
         self._add_key(key, val)
 
-    def remove_subsystem(self, subsystem_nqn: str):
-        """Removes a subsystem from the state data store."""
+    def remove_subsystem(self, subsystem_nqn: str, state = None):
+        """Removes a subsystem from the state data store.
+
+        The related keys are looked up in state if given, in the store's own state otherwise."""
         key = GatewayState.build_subsystem_key(subsystem_nqn)
         self._remove_key(key)
 
         # Delete all keys related to subsystem
-        state = self.get_state()
+        if state is None:
+            state = self.get_state()
         for key in state.keys():
             if (key.startswith(GatewayState.build_namespace_key(subsystem_nqn, None)) or
                     key.startswith(GatewayState.build_namespace_qos_key(subsystem_nqn, None)) or
@@ -170,9 +229,10 @@ class GatewayState(ABC):
         key = GatewayState.build_host_key(subsystem_nqn, host_nqn)
         self._add_key(key, val)
 
-    def remove_host(self, subsystem_nqn: str, host_nqn: str):
+    def remove_host(self, subsystem_nqn: str, host_nqn: str, state = None):
         """Removes a host from the state data store."""
-        state = self.get_state()
+        if state is None:
+            state = self.get_state()
         key = GatewayState.build_host_key(subsystem_nqn, host_nqn)
         if key in state.keys():
             self._remove_key(key)
@@ -182,13 +242,23 @@ class GatewayState(ABC):
         key = GatewayState.build_listener_key(subsystem_nqn, gateway, trtype, traddr, trsvcid)
         self._add_key(key, val)
 
-    def remove_listener(self, subsystem_nqn: str, gateway: str, trtype: str, traddr: str, trsvcid: int):
+    def remove_listener(self, subsystem_nqn: str, gateway: str, trtype: str, traddr: str, trsvcid: int, state = None):
         """Removes a listener from the state data store."""
-        state = self.get_state()
+        if state is None:
+            state = self.get_state()
         key = GatewayState.build_listener_key(subsystem_nqn, gateway, trtype, traddr, trsvcid)
         if key in state.keys():
             self._remove_key(key)
 
+    def remove_listeners_bulk(self, subsystem_nqn: str, gateways, trtype: str, traddr: str, trsvcid: int, state = None):
+        """Removes the listeners of several gateways on the same address from the state data store."""
+        if state is None:
+            state = self.get_state()
+        keys_to_remove = [GatewayState.build_listener_key(subsystem_nqn, gateway, trtype, traddr, trsvcid) for gateway in gateways]
+        keys_to_remove = [key for key in keys_to_remove if key in state]
+        if keys_to_remove:
+            self._remove_keys(keys_to_remove)
+
     @abstractmethod
     def delete_state(self):
         """Deletes state data store."""
@@ -200,30 +270,167 @@ class LocalGatewayState(GatewayState):
 
     Instance attributes:
         state: Local gateway NVMeoF target state
+        keys_by_prefix: Sorted keys of the subsystem, namespace and listener entries in state, by key prefix
+        parsed_cache: Decoded JSON values, with the raw value they were decoded from, by key
+        nqn_by_serial: Subsystem NQNs by state key, by serial number
+        nqn_by_image: Subsystem NQNs by namespace state key, by (RBD pool, RBD image)
     """
 
+    INDEXED_PREFIXES = (GatewayState.SUBSYSTEM_PREFIX, GatewayState.NAMESPACE_PREFIX, GatewayState.LISTENER_PREFIX)
+
     def __init__(self):
         self.state = {}
+        self.keys_by_prefix = {prefix: [] for prefix in LocalGatewayState.INDEXED_PREFIXES}
+        self.parsed_cache = {}
+        self.nqn_by_serial = defaultdict(dict)
+        self.nqn_by_image = defaultdict(dict)
 
     def get_state(self) -> Dict[str, str]:
         """Returns local state dictionary."""
         return self.state.copy()
 
+    def get_one(self, key: str):
+        """Returns the value of a single key, or None if it is missing."""
+        return self.state.get(key)
+
+    def has_key(self, key: str) -> bool:
+        """Returns whether a key is in the local state."""
+        return key in self.state
+
+    def get_parsed(self, key: str):
+        """Returns the decoded JSON value of a key, or None if it is missing.
+
+        The decoded value is cached until the key's value changes, callers shouldn't modify it."""
+        val = self.state.get(key)
+        if val is None:
+            return None
+        cached = self.parsed_cache.get(key)
+        if cached and cached[0] is val:
+            return cached[1]
+        parsed = json_loads(val)
+        self.parsed_cache[key] = (val, parsed)
+        return parsed
+
+    def subsystem_by_serial(self, serial: str):
+        """Returns the NQN of a subsystem using a serial number, or None if there is none."""
+        nqns = self.nqn_by_serial.get(serial)
+        return next(iter(nqns.values())) if nqns else None
+
+    def subsystem_by_image(self, pool_name: str, image_name: str):
+        """Returns the NQN of a subsystem with a namespace using an RBD image, or None if there is none."""
+        nqns = self.nqn_by_image.get((pool_name, image_name))
+        return next(iter(nqns.values())) if nqns else None
+
+    def namespace_keys(self):
+        """Returns a snapshot of the namespace keys in the local state."""
+        return list(self.keys_by_prefix[GatewayState.NAMESPACE_PREFIX])
+
+    def iter_prefix(self, prefix: str):
+        """Iterates over the keys starting with prefix and their values.
+
+        When the entry type is indexed only the matching keys are visited, as they are adjacent in
+        the sorted keys. The keys are taken from a snapshot, so the state can be modified while iterating."""
+        matching = None
+        for indexed_prefix, sorted_keys in self.keys_by_prefix.items():
+            if prefix.startswith(indexed_prefix):
+                matching = []
+                for i in range(bisect.bisect_left(sorted_keys, prefix), len(sorted_keys)):
+                    if not sorted_keys[i].startswith(prefix):
+                        break
+                    matching.append(sorted_keys[i])
+                break
+        if matching is None:
+            matching = [k for k in list(self.state) if k.startswith(prefix)]
+        for key in matching:
+            val = self.state.get(key)
+            if val is not None:
+                yield key, val
+
+    def _sorted_keys(self, key: str):
+        for prefix, sorted_keys in self.keys_by_prefix.items():
+            if key.startswith(prefix):
+                return sorted_keys
+        return None
+
+    def _entry_index(self, key: str, val):
+        """Returns the index of a subsystem or namespace entry, its index key and its subsystem NQN.
+
+        Returns (None, None, None) for other entries, and for values which can't be parsed."""
+        try:
+            if key.startswith(GatewayState.SUBSYSTEM_PREFIX):
+                if GatewayState.is_binary_value(val):
+                    subsys = GatewayState.parse_subsystem_value(val)
+                    return self.nqn_by_serial, subsys.serial_number, subsys.subsystem_nqn
+                subsys = self.get_parsed(key) if self.state.get(key) is val else json_loads(val)
+                return self.nqn_by_serial, subsys.get("serial_number"), subsys.get("subsystem_nqn")
+            if key.startswith(GatewayState.NAMESPACE_PREFIX):
+                if GatewayState.is_binary_value(val):
+                    ns = GatewayState.parse_namespace_value(val)
+                    return self.nqn_by_image, (ns.rbd_pool_name, ns.rbd_image_name), ns.subsystem_nqn
+                ns = json_loads(val)
+                return self.nqn_by_image, (ns.get("rbd_pool_name"), ns.get("rbd_image_name")), ns.get("subsystem_nqn")
+        except Exception:
+            pass
+        return None, None, None
+
+    def _index_entry(self, key: str, val):
+        index, index_key, nqn = self._entry_index(key, val)
+        if index is not None:
+            index[index_key][key] = nqn
+
+    def _unindex_entry(self, key: str, val):
+        index, index_key, nqn = self._entry_index(key, val)
+        if index is None:
+            return
+        nqns = index.get(index_key)
+        if nqns is not None:
+            nqns.pop(key, None)
+            if not nqns:
+                del index[index_key]
+
     def _add_key(self, key: str, val: str):
         """Adds key and value to the local state dictionary."""
+        old_val = self.state.get(key)
+        if old_val is not None:
+            self._unindex_entry(key, old_val)
+        else:
+            sorted_keys = self._sorted_keys(key)
+            if sorted_keys is not None:
+                bisect.insort(sorted_keys, key)
         self.state[key] = val
+        self._index_entry(key, val)
 
     def _remove_key(self, key: str):
         """Removes key from the local state dictionary."""
+        self._unindex_entry(key, self.state[key])
         self.state.pop(key)
+        self.parsed_cache.pop(key, None)
+        sorted_keys = self._sorted_keys(key)
+        if sorted_keys is not None:
+            i = bisect.bisect_left(sorted_keys, key)
+            if i < len(sorted_keys) and sorted_keys[i] == key:
+                del sorted_keys[i]
 
     def delete_state(self):
         """Deletes contents of local state dictionary."""
         self.state.clear()
+        self.parsed_cache.clear()
+        for sorted_keys in self.keys_by_prefix.values():
+            sorted_keys.clear()
+        self.nqn_by_serial.clear()
+        self.nqn_by_image.clear()
 
     def reset(self, omap_state):
         """Resets dictionary with OMAP state."""
         self.state = omap_state
+        self.parsed_cache.clear()
+        self.keys_by_prefix = {prefix: sorted(key for key in omap_state if key.startswith(prefix))
+                               for prefix in LocalGatewayState.INDEXED_PREFIXES}
+        self.nqn_by_serial.clear()
+        self.nqn_by_image.clear()
+        for prefix in (GatewayState.SUBSYSTEM_PREFIX, GatewayState.NAMESPACE_PREFIX):
+            for key in self.keys_by_prefix[prefix]:
+                self._index_entry(key, omap_state[key])
 
 class ReleasedLock:
     def __init__(self, lock: threading.Lock):
@@ -240,6 +447,8 @@ class ReleasedLock:
 class OmapLock:
     OMAP_FILE_LOCK_NAME = "omap_file_lock"
     OMAP_FILE_LOCK_COOKIE = "omap_file_cookie"
+    # reusable no-op context manager, for calls which don't take the OMAP lock
+    NO_LOCK = contextlib.nullcontext()
 
     def __init__(self, omap_state, gateway_state, rpc_lock: threading.Lock) -> None:
         self.logger = omap_state.logger
@@ -284,7 +493,7 @@ class OmapLock:
     def get_omap_lock_to_use(self, context):
         if context:
             return self
-        return contextlib.suppress()
+        return OmapLock.NO_LOCK
 
     #
     # This function accepts a function in which there is Omap locking. It will execute this function
@@ -545,6 +754,62 @@ class OmapGatewayState(GatewayState):
         except Exception as ex:
             self.logger.warning(f"Failed to notify.")
 
+    def _add_keys(self, keys_vals):
+        """Adds several keys and values to the OMAP in a single write operation."""
+        if not self.ioctx:
+            raise RuntimeError("Can't add keys when Rados is closed")
+
+        keys = tuple(keys_vals.keys())
+        try:
+            version_update = self.version + 1
+            with rados.WriteOpCtx() as write_op:
+                # Compare operation failure will cause write failure
+                write_op.omap_cmp(self.OMAP_VERSION_KEY, str(self.version),
+                                  rados.LIBRADOS_CMPXATTR_OP_EQ)
+                self.ioctx.set_omap(write_op, keys, tuple(keys_vals.values()))
+                self.ioctx.set_omap(write_op, (self.OMAP_VERSION_KEY,),
+                                    (str(version_update),))
+                self.ioctx.operate_write_op(write_op, self.omap_name)
+            self.version = version_update
+            self.logger.debug(f"omap_keys generated: {keys}")
+        except Exception:
+            self.logger.exception(f"Unable to add keys to OMAP, exiting!")
+            raise
+
+        # Notify other gateways within the group of change
+        try:
+            self.ioctx.notify(self.omap_name, timeout_ms = self.notify_timeout)
+        except Exception as ex:
+            self.logger.warning(f"Failed to notify.")
+
+    def _remove_keys(self, keys):
+        """Removes several keys from the OMAP in a single write operation."""
+        if not self.ioctx:
+            raise RuntimeError("Can't remove keys when Rados is closed")
+
+        keys = tuple(keys)
+        try:
+            version_update = self.version + 1
+            with rados.WriteOpCtx() as write_op:
+                # Compare operation failure will cause remove failure
+                write_op.omap_cmp(self.OMAP_VERSION_KEY, str(self.version),
+                                  rados.LIBRADOS_CMPXATTR_OP_EQ)
+                self.ioctx.remove_omap_keys(write_op, keys)
+                self.ioctx.set_omap(write_op, (self.OMAP_VERSION_KEY,),
+                                    (str(version_update),))
+                self.ioctx.operate_write_op(write_op, self.omap_name)
+            self.version = version_update
+            self.logger.debug(f"omap_keys removed: {keys}")
+        except Exception:
+            self.logger.exception(f"Unable to remove keys from OMAP, exiting!")
+            raise
+
+        # Notify other gateways within the group of change
+        try:
+            self.ioctx.notify(self.omap_name, timeout_ms = self.notify_timeout)
+        except Exception as ex:
+            self.logger.warning(f"Failed to notify.")
+
     def delete_state(self):
         """Deletes OMAP object contents."""
         if not self.ioctx:
@@ -634,19 +899,57 @@ class GatewayStateHandler:
                                                  "state_update_notify")
         self.update_is_active_lock = threading.Lock()
         self.id_text = id_text
+        self.pending_writes = threading.local()
+
+    @contextlib.contextmanager
+    def batched_writes(self):
+        """Collects the keys added by this thread inside the scope and writes them in a single operation on exit.
+
+        Keys added inside the scope can't be read back before it ends. Nested scopes join the outermost one.
+        The keys are only written when the scope exits normally, they are dropped if it raises. An OMAP
+        write failure is raised to the caller, and the keys aren't added to the local state then.
+        """
+        if getattr(self.pending_writes, "keys", None) is not None:
+            yield
+            return
+
+        self.pending_writes.keys = {}
+        try:
+            yield
+        except BaseException:
+            self.pending_writes.keys = None
+            raise
+        keys_vals = self.pending_writes.keys
+        self.pending_writes.keys = None
+        if keys_vals:
+            self.omap._add_keys(keys_vals)
+            self.local._add_keys(keys_vals)
+
+    def _defer_add_key(self, key: str, val: str) -> bool:
+        """Queues a key inside a batched_writes() scope, returns False when there is none."""
+        keys_vals = getattr(self.pending_writes, "keys", None)
+        if keys_vals is None:
+            return False
+        keys_vals[key] = val
+        return True
 
     def add_namespace(self, subsystem_nqn: str, nsid: str, val: str):
         """Adds a namespace to the state data store."""
+        if self._defer_add_key(GatewayState.build_namespace_key(subsystem_nqn, nsid), val):
+            return
         self.omap.add_namespace(subsystem_nqn, nsid, val)
         self.local.add_namespace(subsystem_nqn, nsid, val)
 
     def remove_namespace(self, subsystem_nqn: str, nsid: str):
         """Removes a namespace from the state data store."""
+        state = self.local.get_state()
         self.omap.remove_namespace(subsystem_nqn, nsid)
-        self.local.remove_namespace(subsystem_nqn, nsid)
+        self.local.remove_namespace(subsystem_nqn, nsid, state)
 
     def add_namespace_qos(self, subsystem_nqn: str, nsid: str, val: str):
         """Adds namespace's QOS settings to the state data store."""
+        if self._defer_add_key(GatewayState.build_namespace_qos_key(subsystem_nqn, nsid), val):
+            return
         self.omap.add_namespace_qos(subsystem_nqn, nsid, val)
         self.local.add_namespace_qos(subsystem_nqn, nsid, val)
 
@@ -657,6 +960,8 @@ class GatewayStateHandler:
 
     def add_namespace_host(self, subsystem_nqn: str, nsid: str, host : str, val: str):
         """Adds namespace's host to the state data store."""
+        if self._defer_add_key(GatewayState.build_namespace_host_key(subsystem_nqn, nsid, host), val):
+            return
         self.omap.add_namespace_host(subsystem_nqn, nsid, host, val)
         self.local.add_namespace_host(subsystem_nqn, nsid, host, val)
 
@@ -672,18 +977,22 @@ class GatewayStateHandler:
 
     def remove_subsystem(self, subsystem_nqn: str):
         """Removes a subsystem from the state data store."""
+        state = self.local.get_state()
         self.omap.remove_subsystem(subsystem_nqn)
-        self.local.remove_subsystem(subsystem_nqn)
+        self.local.remove_subsystem(subsystem_nqn, state)
 
     def add_host(self, subsystem_nqn: str, host_nqn: str, val: str):
         """Adds a host to the state data store."""
+        if self._defer_add_key(GatewayState.build_host_key(subsystem_nqn, host_nqn), val):
+            return
         self.omap.add_host(subsystem_nqn, host_nqn, val)
         self.local.add_host(subsystem_nqn, host_nqn, val)
 
     def remove_host(self, subsystem_nqn: str, host_nqn: str):
         """Removes a host from the state data store."""
+        state = self.local.get_state()
         self.omap.remove_host(subsystem_nqn, host_nqn)
-        self.local.remove_host(subsystem_nqn, host_nqn)
+        self.local.remove_host(subsystem_nqn, host_nqn, state)
 
     def add_listener(self, subsystem_nqn: str, gateway: str, trtype: str, traddr: str, trsvcid: str, val: str):
         """Adds a listener to the state data store."""
@@ -693,10 +1002,17 @@ class GatewayStateHandler:
     def remove_listener(self, subsystem_nqn: str, gateway: str, trtype: str,
                         traddr: str, trsvcid: str):
         """Removes a listener from the state data store."""
+        state = self.local.get_state()
         self.omap.remove_listener(subsystem_nqn, gateway, trtype, traddr,
                                   trsvcid)
         self.local.remove_listener(subsystem_nqn, gateway, trtype, traddr,
-                                   trsvcid)
+                                   trsvcid, state)
+
+    def remove_listeners_bulk(self, subsystem_nqn: str, gateways, trtype: str, traddr: str, trsvcid: str):
+        """Removes the listeners of several gateways on the same address from the state data store."""
+        state = self.local.get_state()
+        self.omap.remove_listeners_bulk(subsystem_nqn, gateways, trtype, traddr, trsvcid)
+        self.local.remove_listeners_bulk(subsystem_nqn, gateways, trtype, traddr, trsvcid, state)
 
     def delete_state(self):
         """Deletes state data stores."""
@@ -731,14 +1047,14 @@ class GatewayStateHandler:
         old_req = None
         new_req = None
         try:
-            old_req = json_format.Parse(old_val, pb2.namespace_add_req(), ignore_unknown_fields=True)
+            old_req = GatewayState.parse_namespace_value(old_val)
         except Exception as ex:
             self.logger.exception(f"Got exception parsing {old_val}")
             return (False, None)
         try:
-            new_req = json_format.Parse(new_val, pb2.namespace_add_req(), ignore_unknown_fields=True)
+            new_req = GatewayState.parse_namespace_value(new_val)
         except Exception as ex:
-            self.logger.exeption(f"Got exception parsing {new_val}")
+            self.logger.exception(f"Got exception parsing {new_val}")
             return (False, None)
         if not old_req or not new_req:
             self.logger.debug(f"Failed to parse requests, old: {old_val} -> {old_req}, new: {new_val} -> {new_req}")
@@ -771,15 +1087,16 @@ class GatewayStateHandler:
 
         return (nqn, nsid)
 
-    def get_str_from_bytes(val):
-        val_str = val.decode() if type(val) == type(b'') else val
-        return val_str
+    def get_bytes_from_str(val):
+        val_bytes = val.encode() if type(val) == str else val
+        return val_bytes
 
     def compare_state_values(val1, val2) -> bool:
-        # We sometimes get one value as type bytes and the other as type str, so convert them both to str for the comparison
-        val1_str = GatewayStateHandler.get_str_from_bytes(val1)
-        val2_str = GatewayStateHandler.get_str_from_bytes(val2)
-        return val1_str == val2_str
+        # We sometimes get one value as type bytes and the other as type str, so convert them both to bytes for the comparison.
+        # Binary namespace values aren't necessarily valid UTF-8 so we can't decode them into str.
+        val1_bytes = GatewayStateHandler.get_bytes_from_str(val1)
+        val2_bytes = GatewayStateHandler.get_bytes_from_str(val2)
+        return val1_bytes == val2_bytes
 
     def update(self) -> bool:
         """Checks for updated OMAP state and initiates local update."""
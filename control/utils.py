@@ -7,8 +7,8 @@
 #  Authors: gbregman@ibm.com
 #
 
-import uuid
 import errno
+import re
 import os
 import os.path
 import socket
@@ -38,19 +38,24 @@ class GatewayEnumUtils:
 
         return val
 
+    # enum descriptor -> {value: key}, built the first time an enum is looked up
+    keys_by_value = {}
+
     def get_key_from_value(e_type, val):
-        keyval = None
         try:
-            val_index = e_type.values().index(val)
-            keyval = e_type.keys()[val_index]
-        except ValueError:
-            pass
-        except IndexError:
-            pass
-        return keyval
+            reverse_map = GatewayEnumUtils.keys_by_value[e_type.DESCRIPTOR]
+        except KeyError:
+            reverse_map = {}
+            for key, value in zip(e_type.keys(), e_type.values()):
+                reverse_map.setdefault(value, key)
+            GatewayEnumUtils.keys_by_value[e_type.DESCRIPTOR] = reverse_map
+        return reverse_map.get(val)
 
 class GatewayUtils:
     DISCOVERY_NQN = "nqn.2014-08.org.nvmexpress.discovery"
+    UUID_STRING_LENGTH = len("00000000-0000-0000-0000-000000000000")
+    UUID_RE = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+    STRERROR_OK = os.strerror(0)
 
     # We need to enclose IPv6 addresses in brackets before concatenating a colon and port number to it
     def escape_address_if_ipv6(addr : str) -> str:
@@ -68,6 +73,11 @@ class GatewayUtils:
     def is_discovery_nqn(nqn) -> bool:
         return nqn == GatewayUtils.DISCOVERY_NQN
 
+    def discovery_flags(subsystem_nqn, host_nqn):
+        """Returns whether the subsystem NQN and whether the host NQN are the discovery NQN."""
+        discovery_nqn = GatewayUtils.DISCOVERY_NQN
+        return (subsystem_nqn == discovery_nqn, host_nqn == discovery_nqn)
+
     def is_valid_rev_domain(rev_domain):
         DOMAIN_LABEL_MAX_LEN = 63
 
@@ -87,41 +97,16 @@ class GatewayUtils:
             if not lbl.replace("-", "").isalnum():
                 return (errno.EINVAL, f"domain label {lbl} contains a character which is not [a-z,A-Z,0-9,'-','.']")
 
-        return (0, os.strerror(0))
+        return (0, GatewayUtils.STRERROR_OK)
 
     def is_valid_uuid(uuid_val) -> bool:
-        UUID_STRING_LENGTH = len(str(uuid.uuid4()))
-
-        if len(uuid_val) != UUID_STRING_LENGTH:
-            return False
-
-        uuid_parts = uuid_val.split("-")
-        if len(uuid_parts) != 5:
-            return False
-        if len(uuid_parts[0]) != 8:
-            return False
-        if len(uuid_parts[1]) != 4:
-            return False
-        if len(uuid_parts[2]) != 4:
-            return False
-        if len(uuid_parts[3]) != 4:
-            return False
-        if len(uuid_parts[4]) != 12:
-            return False
-
-        for u in uuid_parts:
-            try:
-                n = int(u, 16)
-            except ValueError:
-                return False
-
-        return True
+        return GatewayUtils.UUID_RE.fullmatch(uuid_val) is not None
 
     def is_valid_nqn(nqn):
         NQN_MIN_LENGTH = 11
         NQN_MAX_LENGTH = 223
         NQN_PREFIX = "nqn."
-        UUID_STRING_LENGTH = len(str(uuid.uuid4()))
+        UUID_STRING_LENGTH = GatewayUtils.UUID_STRING_LENGTH
         NQN_UUID_PREFIX = "nqn.2014-08.org.nvmexpress:uuid:"
         NQN_UUID_PREFIX_LENGTH = len(NQN_UUID_PREFIX)
 
@@ -140,7 +125,7 @@ class GatewayUtils:
             return (errno.EINVAL, f"NQN \"{nqn}\" is too long, maximal length is {NQN_MAX_LENGTH}")
         if GatewayUtils.is_discovery_nqn(nqn):
             # The NQN is technically valid but we will probably reject it later as being a discovery one
-            return (0, os.strerror(0))
+            return (0, GatewayUtils.STRERROR_OK)
 
         if nqn.startswith(NQN_UUID_PREFIX):
             if len(nqn) != NQN_UUID_PREFIX_LENGTH + UUID_STRING_LENGTH:
@@ -148,7 +133,7 @@ class GatewayUtils:
             uuid_part = nqn[NQN_UUID_PREFIX_LENGTH : ]
             if not GatewayUtils.is_valid_uuid(uuid_part):
                 return (errno.EINVAL, f"Invalid NQN \"{nqn}\": UUID is not formatted correctly")
-            return (0, os.strerror(0))
+            return (0, GatewayUtils.STRERROR_OK)
 
         if not nqn.startswith(NQN_PREFIX):
             return (errno.EINVAL, f"Invalid NQN \"{nqn}\", doesn't start with \"{NQN_PREFIX}\"")
@@ -180,7 +165,7 @@ class GatewayUtils:
         if rc[0] != 0:
             return (errno.EINVAL, f"Invalid NQN \"{nqn}\": reverse domain is not formatted correctly: {rc[1]}")
 
-        return (0, os.strerror(0))
+        return (0, GatewayUtils.STRERROR_OK)
 
 class GatewayLogger:
     CEPH_LOG_DIRECTORY = "/var/log/ceph/"
@@ -192,6 +177,8 @@ class GatewayLogger:
     NVME_GATEWAY_LOG_LEVEL_FILE_PATH = "/tmp/nvmeof-gw-loglevel"
     logger = None
     handler = None
+    # the configuration the logger was last set up with
+    config = None
     init_executed = False
 
     def __init__(self, config=None):
@@ -211,7 +198,8 @@ class GatewayLogger:
 
         if GatewayLogger.logger:
             assert self.logger == GatewayLogger.logger
-            if self.handler:
+            # Without a log file handler we only need to set things up again for a new configuration
+            if self.handler or not config or config is GatewayLogger.config:
                 return
 
         logging.raiseExceptions = False
@@ -265,6 +253,7 @@ class GatewayLogger:
         self.logger.info(f"Initialize gateway log level to \"{log_level}\"")
         GatewayLogger.logger = self.logger
         GatewayLogger.handler = self.handler
+        GatewayLogger.config = config
         if not GatewayLogger.init_executed:
             if log_files_enabled:
                 if not logdir_ok:
@@ -973,6 +973,7 @@ class TestDelete:
         assert f"Failure deleting subsystem {subsystem}: Namespace 2 is still using the subsystem"
         caplog.clear()
         cli(["subsystem", "del", "--subsystem", subsystem, "--force"])
+        assert f"Automatically removed namespace 2 from {subsystem}" in caplog.text
         assert f"Deleting subsystem {subsystem}: Successful" in caplog.text
         caplog.clear()
         cli(["subsystem", "del", "--subsystem", subsystem2])
@@ -1,8 +1,15 @@
 import pytest
 import time
+import errno
+import grpc
+import threading
 from control.server import GatewayServer
 from control.cli import main as cli
 from control.cephutils import CephUtils
+from control.proto import gateway_pb2 as pb2
+from control.proto import gateway_pb2_grpc as pb2_grpc
+from control.grpc import GatewayService, SpdkRpcClient, SpdkJsonRpcError
+from spdk.rpc.client import JSONRPCException
 import logging
 import warnings
 
@@ -102,3 +109,321 @@ def test_create_get_subsys(caplog, config):
         assert "No subsystems" not in caplog.text
         for i in range(created_resource_count):
             check_resource_by_index(i, caplog)
+
+def stream_add_req(subsystem, i, nsid=None):
+    return pb2.namespace_add_req(subsystem_nqn=subsystem, rbd_pool_name=pool, rbd_image_name=f"{image}_stream{i}",
+                                 block_size=512, create_image=True, size=16 * 1024 * 1024, force=True, nsid=nsid)
+
+def test_namespace_add_stream(caplog, config):
+    """Adds namespaces over a stream, getting their statuses back in order, failures included."""
+    config.config["gateway"]["group"] = ""
+    config.config["gateway"]["namespace_add_stream_batch_size"] = "3"
+    ceph_utils = CephUtils(config)
+    subsystem = f"{subsystem_prefix}stream"
+    with GatewayServer(config) as gateway:
+        ceph_utils.execute_ceph_monitor_command("{" + f'"prefix":"nvme-gw create", "id": "{gateway.name}", "pool": "{pool}", "group": ""' + "}")
+        gateway.serve()
+        channel = grpc.insecure_channel(f"{config.get('gateway', 'addr')}:{config.getint('gateway', 'port')}")
+        stub = pb2_grpc.GatewayStub(channel)
+        cli(["subsystem", "add", "--subsystem", subsystem])
+
+        # Seven requests make two full batches and a partial one, the third request reuses the second's NSID
+        reqs = [stream_add_req(subsystem, i) for i in range(7)]
+        reqs[1].nsid = 20
+        reqs[2].nsid = 20
+        statuses = list(stub.namespace_add_stream(iter(reqs)))
+        assert len(statuses) == len(reqs)
+        for i, ret in enumerate(statuses):
+            if i == 2:
+                assert ret.status != 0
+            else:
+                assert ret.status == 0, ret.error_message
+        assert statuses[1].nsid == 20
+        nsids = [ret.nsid for i, ret in enumerate(statuses) if i != 2]
+        assert len(set(nsids)) == len(nsids)
+
+        listed = stub.list_namespaces(pb2.list_namespaces_req(subsystem=subsystem))
+        assert sorted(ns.nsid for ns in listed.namespaces) == sorted(nsids)
+        ret = stub.delete_subsystem(pb2.delete_subsystem_req(subsystem_nqn=subsystem, force=True))
+        assert ret.status == 0
+
+def test_namespace_add_batch_rollback(caplog, config):
+    """Namespaces added by a batch whose state write failed are taken out of SPDK again."""
+    config.config["gateway"]["group"] = ""
+    ceph_utils = CephUtils(config)
+    subsystem = f"{subsystem_prefix}batch"
+    with GatewayServer(config) as gateway:
+        ceph_utils.execute_ceph_monitor_command("{" + f'"prefix":"nvme-gw create", "id": "{gateway.name}", "pool": "{pool}", "group": ""' + "}")
+        gateway.serve()
+        channel = grpc.insecure_channel(f"{config.get('gateway', 'addr')}:{config.getint('gateway', 'port')}")
+        stub = pb2_grpc.GatewayStub(channel)
+        cli(["subsystem", "add", "--subsystem", subsystem])
+
+        omap = gateway.gateway_rpc.gateway_state.omap
+        def failing_add_keys(keys_vals):
+            raise RuntimeError("injected OMAP write failure")
+        orig_add_keys = omap._add_keys
+        omap._add_keys = failing_add_keys
+        try:
+            statuses = list(stub.namespace_add_stream(iter([stream_add_req(subsystem, i) for i in range(10, 13)])))
+        finally:
+            omap._add_keys = orig_add_keys
+        assert len(statuses) == 3
+        for ret in statuses:
+            assert ret.status != 0
+            assert "injected OMAP write failure" in ret.error_message
+            assert "isn't persisted" not in ret.error_message
+        assert "Error persisting namespaces on" in caplog.text
+
+        # Neither SPDK nor the state kept the namespaces
+        listed = stub.list_namespaces(pb2.list_namespaces_req(subsystem=subsystem))
+        assert len(listed.namespaces) == 0
+        assert not gateway.gateway_rpc.get_subsystem_namespaces(subsystem)
+
+        # The same images can be added once the state can be written again
+        statuses = list(stub.namespace_add_stream(iter([stream_add_req(subsystem, i) for i in range(10, 13)])))
+        assert all(ret.status == 0 for ret in statuses)
+        ret = stub.delete_subsystem(pb2.delete_subsystem_req(subsystem_nqn=subsystem, force=True))
+        assert ret.status == 0
+
+class FakeSpdkRpcClient(SpdkRpcClient):
+    """SPDK client answering from a list of canned responses, without a socket"""
+
+    def __init__(self, responses):
+        self._logger = logging.getLogger("FakeSpdkRpcClient")
+        self.responses = list(responses)
+        self.sent = []
+        self.flushed = 0
+        self.reconnected = 0
+        self.next_id = 0
+
+    def add_request(self, method, params):
+        self.next_id += 1
+        self.sent.append((self.next_id, method, params))
+        return self.next_id
+
+    def flush(self):
+        self.flushed += 1
+
+    def recv(self):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def reconnect(self):
+        self.reconnected += 1
+        self.responses = []
+
+def test_spdk_batch_call_in_order():
+    client = FakeSpdkRpcClient([{"id": 1, "result": "a"}, {"id": 2, "result": True}, {"id": 3, "result": []}])
+    results = client.batch_call([("bdev_get_bdevs", {}), ("nvmf_subsystem_add_listener", {"nqn": "n"}), ("nvmf_get_subsystems", None)])
+    assert results == ["a", True, []]
+    assert client.flushed == 1
+    assert [method for _, method, _ in client.sent] == ["bdev_get_bdevs", "nvmf_subsystem_add_listener", "nvmf_get_subsystems"]
+
+def test_spdk_batch_call_out_of_order():
+    client = FakeSpdkRpcClient([{"id": 3, "result": 3}, {"id": 1, "result": 1}, {"id": 2, "result": 2}])
+    assert client.batch_call([("m1", {}), ("m2", {}), ("m3", {})]) == [1, 2, 3]
+
+def test_spdk_batch_call_error_entries():
+    client = FakeSpdkRpcClient([{"id": 2, "error": {"code": -17, "message": "File exists"}}, {"id": 1, "result": True}])
+    results = client.batch_call([("bdev_rbd_create", {"name": "b1"}), ("bdev_rbd_create", {"name": "b2"})])
+    assert results[0] is True
+    assert isinstance(results[1], SpdkJsonRpcError)
+    assert results[1].code == -17
+    assert results[1].spdk_message == "File exists"
+    assert "b2" in str(results[1])
+
+def test_spdk_batch_call_reconnects_on_recv_failure():
+    client = FakeSpdkRpcClient([{"id": 1, "result": True}, JSONRPCException("Timeout while waiting for response"),
+                                {"id": 3, "result": True}])
+    with pytest.raises(JSONRPCException):
+        client.batch_call([("m1", {}), ("m2", {}), ("m3", {})])
+    # The response left on the connection must not be seen by the next request
+    assert client.reconnected == 1
+    assert client.responses == []
+
+def test_spdk_batch_call_modify_count():
+    client = FakeSpdkRpcClient([{"id": 1, "result": []}, {"id": 2, "result": True}, {"id": 3, "result": []}])
+    client.batch_call([("nvmf_get_subsystems", None)])
+    assert client.modify_count == 0
+    # A result fetched while the batch was running must not look valid once it's done
+    counts_while_running = []
+    recv = client.recv
+    client.recv = lambda: counts_while_running.append(client.modify_count) or recv()
+    client.batch_call([("nvmf_subsystem_remove_ns", {"nsid": 1}), ("nvmf_get_subsystems", None)])
+    assert counts_while_running and client.modify_count not in counts_while_running
+
+def service_for_execute_once():
+    """A GatewayService with just what execute_grpc_function_once() needs"""
+    service = GatewayService.__new__(GatewayService)
+    service.inflight_requests = {}
+    service.inflight_requests_lock = threading.Lock()
+    service.execute_grpc_function = lambda func, request, context: func(request, context)
+    return service
+
+def run_execute_once_callers(service, func, count):
+    """Calls execute_grpc_function_once() from count threads while the first call is running"""
+    results = [None] * count
+    def caller(i):
+        try:
+            results[i] = service.execute_grpc_function_once("key", func, None, None)
+        except Exception as ex:
+            results[i] = ex
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(count)]
+    threads[0].start()
+    return threads, results
+
+def test_execute_grpc_function_once_shares_result():
+    service = service_for_execute_once()
+    entered = threading.Event()
+    release = threading.Event()
+    calls = 0
+    def func(request, context):
+        nonlocal calls
+        calls += 1
+        entered.set()
+        assert release.wait(10)
+        return ["result"]
+
+    threads, results = run_execute_once_callers(service, func, 5)
+    assert entered.wait(10)
+    for t in threads[1:]:
+        t.start()
+    time.sleep(0.5)     # let the other callers find the running call
+    release.set()
+    for t in threads:
+        t.join(10)
+    assert calls == 1
+    assert all(ret is results[0] for ret in results)
+    assert results[0] == ["result"]
+    assert not service.inflight_requests
+
+    # Once done, the next call runs the function again
+    assert service.execute_grpc_function_once("key", func, None, None) == ["result"]
+    assert calls == 2
+
+def test_execute_grpc_function_once_shares_exception():
+    service = service_for_execute_once()
+    entered = threading.Event()
+    release = threading.Event()
+    def func(request, context):
+        entered.set()
+        assert release.wait(10)
+        raise ValueError("list failed")
+
+    threads, results = run_execute_once_callers(service, func, 4)
+    assert entered.wait(10)
+    for t in threads[1:]:
+        t.start()
+    time.sleep(0.5)     # let the other callers find the running call
+    release.set()
+    for t in threads:
+        t.join(10)
+    assert all(isinstance(ret, ValueError) and str(ret) == "list failed" for ret in results)
+    assert not service.inflight_requests
+
+def test_list_batch(caplog, config):
+    """A batch of list requests returns the same as the individual requests."""
+    config.config["gateway"]["group"] = ""
+    ceph_utils = CephUtils(config)
+    subsystem = f"{subsystem_prefix}listbatch"
+    with GatewayServer(config) as gateway:
+        ceph_utils.execute_ceph_monitor_command("{" + f'"prefix":"nvme-gw create", "id": "{gateway.name}", "pool": "{pool}", "group": ""' + "}")
+        gateway.serve()
+        channel = grpc.insecure_channel(f"{config.get('gateway', 'addr')}:{config.getint('gateway', 'port')}")
+        stub = pb2_grpc.GatewayStub(channel)
+        cli(["subsystem", "add", "--subsystem", subsystem])
+        cli(["namespace", "add", "--subsystem", subsystem, "--rbd-pool", pool, "--rbd-image", f"{image}_listbatch",
+             "--size", "16MB", "--rbd-create-image", "--force"])
+        cli(["host", "add", "--subsystem", subsystem, "--host-nqn", f"{host_prefix}listbatch"])
+        cli(["listener", "add", "--subsystem", subsystem, "--host-name", gateway.gateway_rpc.host_name,
+             "--traddr", "127.0.0.1", "--trsvcid", "5010"])
+
+        reqs = [
+            pb2.list_batch_one_req(list_subsystems=pb2.list_subsystems_req(subsystem_nqn=subsystem)),
+            pb2.list_batch_one_req(list_namespaces=pb2.list_namespaces_req(subsystem=subsystem)),
+            pb2.list_batch_one_req(list_hosts=pb2.list_hosts_req(subsystem=subsystem)),
+            pb2.list_batch_one_req(list_listeners=pb2.list_listeners_req(subsystem=subsystem)),
+            pb2.list_batch_one_req(list_connections=pb2.list_connections_req(subsystem=subsystem)),
+            # A failing request only fails its own result
+            pb2.list_batch_one_req(list_hosts=pb2.list_hosts_req(subsystem=f"{subsystem}nosuch")),
+        ]
+        ret = stub.list_batch(pb2.list_batch_req(requests=reqs))
+        assert ret.status == 0
+        assert [r.WhichOneof("info") for r in ret.results] == ["subsystems", "namespaces", "hosts", "listeners",
+                                                              "connections", "hosts"]
+        assert ret.results[0].subsystems == stub.list_subsystems(reqs[0].list_subsystems)
+        assert ret.results[1].namespaces == stub.list_namespaces(reqs[1].list_namespaces)
+        assert ret.results[2].hosts == stub.list_hosts(reqs[2].list_hosts)
+        assert ret.results[3].listeners == stub.list_listeners(reqs[3].list_listeners)
+        assert ret.results[4].connections == stub.list_connections(reqs[4].list_connections)
+        assert ret.results[5].hosts == stub.list_hosts(reqs[5].list_hosts)
+        assert ret.results[5].hosts.status != 0
+        assert len(ret.results[1].namespaces.namespaces) == 1
+        assert len(ret.results[2].hosts.hosts) == 1
+        assert len(ret.results[3].listeners.listeners) == 1
+
+        # An empty batch has no results
+        ret = stub.list_batch(pb2.list_batch_req())
+        assert ret.status == 0
+        assert len(ret.results) == 0
+
+        ret = stub.delete_subsystem(pb2.delete_subsystem_req(subsystem_nqn=subsystem, force=True))
+        assert ret.status == 0
+
+def next_within(stream, seconds):
+    """Returns the next message of a stream, failing if it took more than seconds to arrive"""
+    start = time.monotonic()
+    ret = next(stream)
+    assert time.monotonic() - start < seconds
+    return ret
+
+def test_watch_connections(caplog, config):
+    """Connection watchers get the connections right away, and again when this gateway changes them."""
+    config.config["gateway"]["group"] = ""
+    # Only a change made by the gateway should wake up the watcher before the test ends
+    config.config["gateway"]["watch_connections_interval"] = "120"
+    config.config["gateway"]["max_connection_watchers"] = "1"
+    try:
+        ceph_utils = CephUtils(config)
+        subsystem = f"{subsystem_prefix}watch"
+        with GatewayServer(config) as gateway:
+            ceph_utils.execute_ceph_monitor_command("{" + f'"prefix":"nvme-gw create", "id": "{gateway.name}", "pool": "{pool}", "group": ""' + "}")
+            gateway.serve()
+            channel = grpc.insecure_channel(f"{config.get('gateway', 'addr')}:{config.getint('gateway', 'port')}")
+            stub = pb2_grpc.GatewayStub(channel)
+            cli(["subsystem", "add", "--subsystem", subsystem])
+            cli(["host", "add", "--subsystem", subsystem, "--host-nqn", f"{host_prefix}watch"])
+            cli(["listener", "add", "--subsystem", subsystem, "--host-name", gateway.gateway_rpc.host_name,
+                 "--traddr", "127.0.0.1", "--trsvcid", "5011"])
+
+            stream = stub.watch_connections(pb2.list_connections_req(subsystem=subsystem))
+            ret = next_within(stream, 60)
+            assert ret.status == 0
+            assert ret.subsystem_nqn == subsystem
+
+            # The only watcher slot is taken
+            ret = next(stub.watch_connections(pb2.list_connections_req(subsystem=subsystem)))
+            assert ret.status == errno.EBUSY
+
+            cli(["host", "del", "--subsystem", subsystem, "--host-nqn", f"{host_prefix}watch"])
+            assert next_within(stream, 60).status == 0
+            cli(["listener", "del", "--subsystem", subsystem, "--host-name", gateway.gateway_rpc.host_name,
+                 "--traddr", "127.0.0.1", "--trsvcid", "5011"])
+            assert next_within(stream, 60).status == 0
+
+            ret = stub.delete_subsystem(pb2.delete_subsystem_req(subsystem_nqn=subsystem))
+            assert ret.status == 0
+            ret = next_within(stream, 60)
+            assert ret.status == errno.ENOENT
+            with pytest.raises(StopIteration):
+                next(stream)
+
+            # The deleted subsystem can't be watched anymore
+            ret = next(stub.watch_connections(pb2.list_connections_req(subsystem=subsystem)))
+            assert ret.status == errno.ENOENT
+    finally:
+        config.config["gateway"].pop("watch_connections_interval", None)
+        config.config["gateway"].pop("max_connection_watchers", None)
@@ -1,8 +1,10 @@
 import pytest
 import time
+import json
 import rados
 import threading
-from control.state import LocalGatewayState, OmapGatewayState, GatewayStateHandler
+from control.state import GatewayState, LocalGatewayState, OmapGatewayState, GatewayStateHandler
+from control.proto import gateway_pb2 as pb2
 
 
 @pytest.fixture
@@ -190,3 +192,96 @@ def test_state_notify_update(config, ioctx, local_state, omap_state):
     assert update_counter == 4
     elapsed = time.time() - start
     assert elapsed < update_interval_sec
+
+
+def subsystem_json(nqn, serial):
+    return json.dumps({"subsystem_nqn": nqn, "serial_number": serial})
+
+
+def namespace_json(nqn, nsid, pool, image):
+    return json.dumps({"subsystem_nqn": nqn, "nsid": nsid, "rbd_pool_name": pool, "rbd_image_name": image})
+
+
+def test_local_state_subsystem_index(local_state):
+    """Confirms the serial number index follows subsystem additions, updates and removals."""
+
+    nqn1 = "nqn.2016-06.io.spdk:cnode1"
+    nqn2 = "nqn.2016-06.io.spdk:cnode2"
+    local_state.add_subsystem(nqn1, subsystem_json(nqn1, "SN1"))
+    local_state.add_subsystem(nqn2, subsystem_json(nqn2, "SN2"))
+    assert local_state.subsystem_by_serial("SN1") == nqn1
+    assert local_state.subsystem_by_serial("SN2") == nqn2
+    assert local_state.subsystem_by_serial("SN3") is None
+
+    # Changing the serial number moves the subsystem in the index
+    local_state.add_subsystem(nqn1, subsystem_json(nqn1, "SN3"))
+    assert local_state.subsystem_by_serial("SN1") is None
+    assert local_state.subsystem_by_serial("SN3") == nqn1
+
+    # Binary values are indexed the same way, and replacing a JSON value with one unindexes the old serial
+    req = pb2.create_subsystem_req(subsystem_nqn=nqn2, serial_number="SN4")
+    local_state.add_subsystem(nqn2, GatewayState.build_binary_value(req))
+    assert local_state.subsystem_by_serial("SN2") is None
+    assert local_state.subsystem_by_serial("SN4") == nqn2
+
+    local_state.remove_subsystem(nqn1)
+    local_state.remove_subsystem(nqn2)
+    assert local_state.subsystem_by_serial("SN3") is None
+    assert local_state.subsystem_by_serial("SN4") is None
+    assert not local_state.nqn_by_serial
+
+
+def test_local_state_namespace_index(local_state):
+    """Confirms the RBD image index follows namespace additions, updates and removals."""
+
+    nqn = "nqn.2016-06.io.spdk:cnode1"
+    local_state.add_subsystem(nqn, subsystem_json(nqn, "SN1"))
+    local_state.add_namespace(nqn, "1", namespace_json(nqn, 1, "rbd", "image1"))
+    req = pb2.namespace_add_req(subsystem_nqn=nqn, nsid=2, rbd_pool_name="rbd", rbd_image_name="image2")
+    local_state.add_namespace(nqn, "2", GatewayState.build_binary_value(req))
+    assert local_state.subsystem_by_image("rbd", "image1") == nqn
+    assert local_state.subsystem_by_image("rbd", "image2") == nqn
+    assert local_state.subsystem_by_image("rbd", "image3") is None
+    assert local_state.namespace_keys() == [GatewayState.build_namespace_key(nqn, "1"),
+                                            GatewayState.build_namespace_key(nqn, "2")]
+
+    # Switching a namespace between the JSON and the binary format keeps the index right
+    req = pb2.namespace_add_req(subsystem_nqn=nqn, nsid=1, rbd_pool_name="rbd", rbd_image_name="image3")
+    local_state.add_namespace(nqn, "1", GatewayState.build_binary_value(req))
+    local_state.add_namespace(nqn, "2", namespace_json(nqn, 2, "rbd", "image4"))
+    assert local_state.subsystem_by_image("rbd", "image1") is None
+    assert local_state.subsystem_by_image("rbd", "image2") is None
+    assert local_state.subsystem_by_image("rbd", "image3") == nqn
+    assert local_state.subsystem_by_image("rbd", "image4") == nqn
+
+    local_state.remove_namespace(nqn, "1")
+    assert local_state.subsystem_by_image("rbd", "image3") is None
+    assert local_state.subsystem_by_image("rbd", "image4") == nqn
+
+    # Removing the subsystem drops its remaining namespaces from the index
+    local_state.remove_subsystem(nqn)
+    assert not local_state.nqn_by_image
+    assert not local_state.namespace_keys()
+
+
+def test_local_state_index_reset(local_state):
+    """Confirms the indexes are rebuilt from the OMAP state on reset."""
+
+    nqn = "nqn.2016-06.io.spdk:cnode1"
+    local_state.add_subsystem(nqn, subsystem_json(nqn, "SN1"))
+    local_state.add_namespace(nqn, "1", namespace_json(nqn, 1, "rbd", "image1"))
+
+    req = pb2.namespace_add_req(subsystem_nqn=nqn, nsid=2, rbd_pool_name="rbd", rbd_image_name="image2")
+    omap_state = {
+        GatewayState.build_subsystem_key(nqn): subsystem_json(nqn, "SN2"),
+        GatewayState.build_namespace_key(nqn, "2"): GatewayState.build_binary_value(req),
+    }
+    local_state.reset(omap_state)
+    assert local_state.subsystem_by_serial("SN1") is None
+    assert local_state.subsystem_by_serial("SN2") == nqn
+    assert local_state.subsystem_by_image("rbd", "image1") is None
+    assert local_state.subsystem_by_image("rbd", "image2") == nqn
+
+    local_state.delete_state()
+    assert not local_state.nqn_by_serial
+    assert not local_state.nqn_by_image